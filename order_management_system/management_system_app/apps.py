@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ManagementSystemAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'management_system_app'
+
+    def ready(self):
+        # обертки, которые считают SQL-запросы для бюджетов эндпоинтов и заголовка Server-Timing,
+        # ставятся на каждое соединение
+        from . import query_budgets, server_timing
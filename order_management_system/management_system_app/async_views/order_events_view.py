@@ -0,0 +1,110 @@
+import asyncio
+
+from django.http import StreamingHttpResponse
+
+from ..events import OrderEvent, broker, read_journal
+from ..models import OrderChange
+from ..filters import parse_order_filters
+from .order_views import AsyncOrderAPIView
+
+
+# поток событий для одного подключения. StreamingHttpResponse вызывает close() при закрытии ответа,
+# в том числе когда клиент отключился, поэтому подписка удаляется сразу, а не при сборке мусора.
+# Пропущенные события после Last-Event-ID берутся из буфера брокера, а если их там нет - из журнала изменений.
+# Подписка оформляется до чтения журнала, поэтому события между ними не теряются, а повторы отбрасываются по номеру
+class OrderEventStream:
+    def __init__(self, filters, last_event_id, keepalive_interval, retry_ms):
+        self.filters = filters
+        self.last_event_id = last_event_id
+        self.keepalive_interval = keepalive_interval
+        self.retry_ms = retry_ms
+        self.subscription = None
+
+    def __aiter__(self):
+        return self.events()
+
+    async def events(self):
+        self.subscription, backlog = await broker.asubscribe(self.last_event_id)
+        try:
+            yield f'retry: {self.retry_ms}\n\n'
+            if backlog is None:
+                backlog = await read_journal(self.load_backlog)
+            if backlog is None:
+                yield self.reset_event(await read_journal(OrderChange.latest_seq))
+                backlog = []
+            for event in backlog:
+                if self.is_new(event) and event.matches(**self.filters):
+                    yield event.encode()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(self.subscription.queue.get(), self.keepalive_interval)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                else:
+                    if self.is_new(event) and event.matches(**self.filters):
+                        yield event.encode()
+                # Экран не успевал читать события или брокер начал буфер заново, часть событий потеряна
+                if self.subscription.lost_events and self.subscription.queue.empty():
+                    self.subscription.lost_events = False
+                    yield self.reset_event(broker.last_event_id)
+        finally:
+            self.close()
+
+    # пропущенные события из журнала изменений, None - если их уже нет или их слишком много:
+    # экрану нужно заново загрузить список заказов
+    def load_backlog(self):
+        if self.last_event_id < 0:
+            return None
+        limit = broker.buffer.maxlen
+        changes = OrderChange.read_since(self.last_event_id, limit)
+        if len(changes) > limit or (changes and changes[0][1] == OrderChange.PRUNED):
+            return None
+        return [OrderEvent.from_change(*change) for change in changes]
+
+    # событие еще не отправлено этому экрану: из журнала и из подписки может прийти одно и то же событие
+    def is_new(self, event):
+        if self.last_event_id is not None and event.id <= self.last_event_id:
+            return False
+        self.last_event_id = event.id
+        return True
+
+    def close(self):
+        if self.subscription is not None:
+            broker.unsubscribe(self.subscription)
+
+    def reset_event(self, event_id):
+        self.last_event_id = event_id
+        return f'id: {event_id}\nevent: reset\ndata: {{}}\n\n'
+
+
+# поток событий об изменении заказов (Server-Sent Events) для экранов кухни и зала вместо опроса order_list:
+# api/v1/orders/events/?status=в%20ожидании или ?table_number=7.
+# Экран сначала загружает список заказов, затем подписывается на события created, status_changed,
+# items_changed, updated и deleted. При переподключении браузер передает заголовок Last-Event-ID
+# (или параметр last_event_id), и экран получает только пропущенные события. Если их уже нет в журнале,
+# приходит событие reset - экрану нужно заново загрузить список заказов.
+# События строятся по журналу изменений, поэтому приходят с задержкой до ORDER_EVENTS_POLL_INTERVAL секунд.
+# Работает через ASGI: соединение держит корутина, а не поток
+class AsyncOrderEventStream(AsyncOrderAPIView):
+    # интервал комментариев-пингов, чтобы прокси не закрывали простаивающее соединение, в секундах
+    keepalive_interval = 15
+    # через сколько миллисекунд браузеру переподключаться после обрыва
+    retry_ms = 3000
+
+    async def get(self, request):
+        filters = parse_order_filters(request.query_params, extra_params=['last_event_id'])
+
+        last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = -1  # некорректный номер: события после него неизвестны, экран получит reset
+
+        response = StreamingHttpResponse(
+            OrderEventStream(filters, last_event_id, self.keepalive_interval, self.retry_ms),
+            content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # nginx не должен буферизовать поток событий
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,129 @@
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from rest_framework import exceptions, serializers
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from ..conditional import aqueryset_etag, etag_matches, not_modified, order_etag, orders_etag
+from ..drf_views.export_orders_api_view import IgnoreClientContentNegotiation
+from ..export import EXPORT_CONTENT_TYPES, aexport_orders, get_export_format
+from ..filters import filter_orders
+from ..models import Order, RevenueLedger
+from ..pagination import OrderKeysetPagination
+from ..renderers import MessagePackRenderer
+from ..serializers import OrderReadSerializer, order_rows
+from ..server_timing import timed
+
+
+# асинхронные версии эндпоинтов чтения для запуска через ASGI (order_management_system/asgi.py).
+# Обработчики - обычные async-представления Django, запросы к БД выполняются через async ORM
+# (aiterator, aaggregate, aget), поэтому ожидание ответа клиентом или базой данных не занимает поток.
+# Ответы совпадают с ответами синхронных эндпоинтов DRF байт в байт, включая ETag
+class AsyncOrderAPIView(View):
+    # форматы ответа выбираются по заголовку Accept так же, как в синхронных эндпоинтах
+    renderer_classes = (JSONRenderer, MessagePackRenderer)
+    content_negotiation_class = DefaultContentNegotiation
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Request из DRF дает тот же интерфейс запроса (query_params, accepted_renderer),
+        # что используют фильтры, пагинация и ETag синхронных эндпоинтов
+        request = Request(request)
+        try:
+            self.renderer, request.accepted_media_type = self.content_negotiation_class().select_renderer(
+                request, [renderer_class() for renderer_class in self.renderer_classes])
+        except exceptions.NotAcceptable as error:
+            return self.render({'detail': error.detail}, status=406)
+        request.accepted_renderer = self.renderer
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except serializers.ValidationError as error:
+            return self.render(error.detail, status=400)
+
+    # формат ответа зависит от Accept, поэтому все ответы получают Vary: Accept, как в DRF:
+    # иначе общий HTTP-кэш может отдать ответ в MessagePack клиенту, который ждет JSON
+    def render(self, data, status=200):
+        with timed('render'):
+            content = self.renderer.render(data)
+        response = HttpResponse(content, status=status, content_type=self.renderer.media_type)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def not_modified(self, etag):
+        response = not_modified(etag)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class AsyncOrderAPIList(AsyncOrderAPIView):
+    async def get(self, request):
+        queryset = filter_orders(Order.objects.all(), request.query_params,
+                                 extra_params=(*OrderKeysetPagination.query_params, 'format'))
+        paginator = OrderKeysetPagination()
+
+        # Условный запрос: ETag считается одним агрегатом через aaggregate, как в OrderAPIList
+        if request.headers.get('If-None-Match'):
+            window = paginator.get_page_window(queryset, request)
+            etag = await aqueryset_etag(queryset if window is None else window, request)
+            if etag_matches(request, etag):
+                return self.not_modified(etag)
+
+        rows = order_rows(queryset)
+        page = await paginator.apaginate_queryset(rows, request)
+        if page is not None:
+            # Пустая первая страница означает, что заказов нет; пустая следующая - что список закончился
+            if not page and not request.query_params.get(OrderKeysetPagination.cursor_query_param):
+                raise serializers.ValidationError({"no orders error": "Заказы не найдены."})
+            response = self.render(paginator.get_paginated_response(OrderReadSerializer(page, many=True).data).data)
+            orders = paginator.rows
+        else:
+            orders = [order async for order in rows.aiterator()]
+            # Если заказы не найдены, выбрасываем ошибку
+            if not orders:
+                raise serializers.ValidationError({"no orders error": "Заказы не найдены."})
+            response = self.render(OrderReadSerializer(orders, many=True).data)
+
+        etag = orders_etag(orders, request)
+        if etag is not None:
+            response['ETag'] = etag
+        return response
+
+
+class AsyncOrderAPIRetrieve(AsyncOrderAPIView):
+    async def get(self, request, pk):
+        try:
+            order = await order_rows(Order.objects.all()).aget(pk=pk)
+        except Order.DoesNotExist:
+            return self.render({"detail": "Заказ не найден."}, status=404)
+
+        etag = order_etag(order.id, order.version, request)
+        if etag_matches(request, etag):
+            return self.not_modified(etag)
+
+        response = self.render(OrderReadSerializer(order).data)
+        response['ETag'] = etag
+        return response
+
+
+class AsyncOrderAPIGetTotalRevenue(AsyncOrderAPIView):
+    async def get(self, request):
+        # Выручка из журнала выручки, как в OrderAPIGetTotalRevenue
+        return JsonResponse({'total_revenue': await RevenueLedger.aget_total_revenue()})
+
+
+class AsyncOrderAPIExport(AsyncOrderAPIView):
+    # формат выгрузки задается параметром format, а не заголовком Accept (как в OrderAPIExport)
+    content_negotiation_class = IgnoreClientContentNegotiation
+    # количество заказов, читаемых из БД и отправляемых клиенту за один раз
+    chunk_size = 2000
+
+    async def get(self, request):
+        export_format = get_export_format(request.query_params)
+        queryset = filter_orders(Order.objects.all(), request.query_params, extra_params=['format'])
+
+        response = StreamingHttpResponse(aexport_orders(queryset, export_format, self.chunk_size),
+                                         content_type=f'{EXPORT_CONTENT_TYPES[export_format]}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
@@ -0,0 +1,138 @@
+import hashlib
+import re
+from operator import attrgetter
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, MD5
+from django.http import Http404, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .serializers import OrderReadSerializer
+
+
+# условные GET-запросы к заказам (ETag / If-None-Match).
+# Каждое изменение заказа увеличивает Order.version, поэтому ETag заказа строится из id и версии,
+# а ETag списка - из хэша пар id:версия всех заказов, из которых собран ответ (в порядке id):
+# любое создание, изменение или удаление заказа, а также выход заказа из выборки и вход в нее меняют хэш.
+# В ETag добавляется формат ответа, чтобы JSON и страница Browsable API не получили одинаковый тег.
+
+def order_etag(order_id, version, request):
+    return f'"{order_id}-{version}-{request.accepted_renderer.format}"'
+
+
+ORDER_ETAG_RE = re.compile(r'^"(\d+)-(\d+)-[\w.-]+"$')
+
+
+# версии заказа из заголовка If-Match: None для If-Match: *, иначе список версий из ETag этого заказа.
+# If-Match сравнивается строгим сравнением, поэтому слабые теги (W/...) не подходят
+def if_match_versions(header, order_id):
+    tags = parse_etags(header)
+    if '*' in tags:
+        return None
+    versions = []
+    for tag in tags:
+        match = ORDER_ETAG_RE.match(tag)
+        if match and int(match.group(1)) == order_id:
+            versions.append(int(match.group(2)))
+    return versions
+
+
+def list_etag(request, digest):
+    if digest is None:
+        return None
+    key = f'{request.get_full_path()}|{digest}'
+    return f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}-{request.accepted_renderer.format}"'
+
+
+# md5(string_agg(id || ':' || version, ',' ORDER BY id)): для пустой выборки - NULL
+def etag_digest():
+    pair = Concat(Cast('id', CharField()), Value(':'), Cast('version', CharField()), output_field=CharField())
+    return MD5(StringAgg(pair, delimiter=',', ordering='id'))
+
+
+def queryset_etag(queryset, request):
+    # Один агрегирующий запрос без загрузки самих заказов, для условного запроса
+    return list_etag(request, queryset.aggregate(digest=etag_digest())['digest'])
+
+
+async def aqueryset_etag(queryset, request):
+    return list_etag(request, (await queryset.aaggregate(digest=etag_digest()))['digest'])
+
+
+def orders_etag(orders, request):
+    # Тот же ETag по уже загруженным заказам, без дополнительного запроса: та же строка, что и в etag_digest
+    if not orders:
+        return None
+    pairs = ','.join(f'{order.id}:{order.version}' for order in sorted(orders, key=attrgetter('id')))
+    return list_etag(request, hashlib.md5(pairs.encode('utf-8')).hexdigest())
+
+
+def etag_matches(request, etag):
+    # If-None-Match сравнивается слабым сравнением, поэтому префикс W/ не учитывается
+    header = request.headers.get('If-None-Match')
+    if not header or etag is None:
+        return False
+    tags = parse_etags(header)
+    return '*' in tags or any(tag.removeprefix('W/') == etag for tag in tags)
+
+
+def not_modified(etag):
+    # Обычный HttpResponse без тела, поэтому подходит и для DRF, и для асинхронных представлений
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+# GET одного заказа с ETag: при совпадении If-None-Match отвечает 304, не вызывая сериализатор,
+# иначе заказ отдается быстрым сериализатором только для чтения
+class ConditionalRetrieveMixin:
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = order_etag(instance.id, instance.version, request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = Response(OrderReadSerializer(instance).data)
+        response['ETag'] = etag
+        return response
+
+
+# PUT/PATCH заказа одним условным запросом UPDATE ... WHERE id=%s [AND version IN (...)] RETURNING ...:
+# заказ не читается перед изменением и не блокируется (SELECT ... FOR UPDATE не нужен).
+# Если передан If-Match и версия заказа уже изменилась, UPDATE не находит строку и клиент получает 412.
+# Сериализатор проверяет данные без экземпляра и изменяет заказы методом update_queryset(queryset)
+class ConditionalUpdateMixin:
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+
+        order_id = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk=order_id)
+
+        header = request.headers.get('If-Match')
+        if header:
+            versions = if_match_versions(header, order_id)
+            if versions is not None:
+                if not versions:
+                    return self.precondition_failed()
+                queryset = queryset.filter(version__in=versions)
+
+        orders = serializer.update_queryset(queryset)
+        if not orders:
+            # Заказа нет или его версия не совпала с If-Match
+            if header:
+                return self.precondition_failed()
+            raise Http404
+
+        order = orders[0]
+        response = Response(self.get_serializer(order).data)
+        response['ETag'] = order_etag(order.id, order.version, request)
+        return response
+
+    def precondition_failed(self):
+        return Response({"version error": "Заказ был изменен или удален, получите его текущую версию."},
+                        status=status.HTTP_412_PRECONDITION_FAILED)
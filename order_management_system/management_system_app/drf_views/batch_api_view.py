@@ -0,0 +1,79 @@
+from django.db import DatabaseError, IntegrityError, transaction
+from rest_framework import generics, status
+from rest_framework.response import Response
+
+from ..idempotency import IdempotentMixin
+from ..models import Order
+from ..serializers import BATCH_OPERATIONS, BatchSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+# пакет операций над заказами одним запросом, например, закрытие стола:
+# {"operations": [{"op": "create", "data": {"table_number": 3, "items": [...]}},
+#                 {"op": "update_items", "id": 12, "data": {"items": [...]}},
+#                 {"op": "update_status", "id": 10, "data": {"status": "оплачено"}}, ...],
+#  "continue_on_error": false}
+# Данные каждой операции проверяются тем же сериализатором, что и в order_create, order_update_items
+# и order_update_status. Операции выполняются по порядку в одной транзакции. По умолчанию первая ошибка
+# откатывает весь пакет (ответ 400, rolled_back: true); с continue_on_error каждая операция выполняется
+# в своей точке сохранения и откатывается только операция с ошибкой (ответ 200).
+# Ошибка БД (например, нарушение ограничения) записывается как ошибка операции: 409 или 500.
+# results - результаты операций по порядку: код ответа и данные заказа (data) или ошибки (errors)
+class OrderAPIBatch(IdempotentMixin, generics.GenericAPIView):
+    serializer_class = BatchSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        continue_on_error = serializer.validated_data['continue_on_error']
+
+        results = []
+        try:
+            with transaction.atomic():
+                for operation in serializer.validated_data['operations']:
+                    if continue_on_error:
+                        # Ошибка БД откатывает точку сохранения операции, пакет продолжается
+                        try:
+                            with transaction.atomic():
+                                result = self.run_operation(operation)
+                        except DatabaseError as exc:
+                            result = self.database_error(exc)
+                    else:
+                        result = self.run_operation(operation)
+                    results.append(result)
+                    if 'errors' in result and not continue_on_error:
+                        raise _Rollback
+        except _Rollback:
+            return Response({'rolled_back': True, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError as exc:
+            # Без continue_on_error ошибка БД откатывает весь пакет, как и любая другая ошибка операции
+            results.append(self.database_error(exc))
+            return Response({'rolled_back': True, 'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'rolled_back': False, 'results': results})
+
+    def database_error(self, exc):
+        if isinstance(exc, IntegrityError):
+            return {'status': status.HTTP_409_CONFLICT, 'errors': {'detail': 'Операция нарушает ограничение БД.'}}
+        return {'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                'errors': {'detail': 'Операция не выполнена из-за ошибки БД.'}}
+
+    def run_operation(self, operation):
+        serializer_class = BATCH_OPERATIONS[operation['op']]
+        serializer = serializer_class(data=operation['data'], context=self.get_serializer_context())
+        if not serializer.is_valid():
+            return {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+
+        if operation['op'] == 'create':
+            serializer.save()
+            return {'status': status.HTTP_201_CREATED, 'data': serializer.data}
+
+        # Изменение одним запросом UPDATE ... RETURNING, как в ConditionalUpdateMixin
+        orders = serializer.update_queryset(Order.objects.filter(pk=operation['id']))
+        if not orders:
+            # Ошибка внутри транзакции: оставшиеся операции с continue_on_error выполняются дальше
+            return {'status': status.HTTP_404_NOT_FOUND, 'errors': {'detail': 'Заказ не найден.'}}
+        return {'status': status.HTTP_200_OK, 'data': serializer_class(orders[0]).data}
@@ -0,0 +1,34 @@
+from django.http import StreamingHttpResponse
+from rest_framework import generics
+from rest_framework.negotiation import BaseContentNegotiation
+
+from ..export import EXPORT_CONTENT_TYPES, export_orders, get_export_format
+from ..filters import filter_orders
+from ..models import Order
+
+
+# формат выгрузки задается параметром format, а не заголовком Accept,
+# поэтому DRF не должен отклонять запросы с Accept: text/csv и т.п.
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class OrderAPIExport(generics.GenericAPIView):
+    content_negotiation_class = IgnoreClientContentNegotiation
+    # количество заказов, читаемых из БД и отправляемых клиенту за один раз
+    chunk_size = 2000
+
+    def get(self, request):
+        export_format = get_export_format(request.query_params)
+
+        # Те же фильтры status и table_number, что и у списка заказов
+        queryset = filter_orders(Order.objects.all(), request.query_params, extra_params=['format'])
+
+        response = StreamingHttpResponse(export_orders(queryset, export_format, self.chunk_size),
+                                         content_type=f'{EXPORT_CONTENT_TYPES[export_format]}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
@@ -1,21 +1,14 @@
-from django.db.models import Sum
 from django.http import JsonResponse
 from rest_framework import generics
 
-from ..models import Order
+from ..models import RevenueLedger
 
 
 class OrderAPIGetTotalRevenue(generics.GenericAPIView):
     def get(self, request):
-        # Фильтруем заказы со статусом "оплачено"
-        paid_orders = Order.objects.filter(status='оплачено')
-
-        # Считаем сумму по столбцу total_price
-        total_revenue = paid_orders.aggregate(total_sum=Sum('total_price'))['total_sum']
-
+        # Берем выручку по оплаченным заказам из журнала выручки вместо суммирования total_price
         # Если заказов нет, total_revenue будет 0
-        if total_revenue is None:
-            total_revenue = 0
+        total_revenue = RevenueLedger.get_total_revenue()
 
         # Возвращаем JSON ответ
         return JsonResponse({'total_revenue': total_revenue})
\ No newline at end of file
@@ -0,0 +1,60 @@
+from rest_framework import generics, serializers, status
+from rest_framework.response import Response
+
+from ..models import OrderChange
+
+
+# инкрементальная синхронизация заказов по журналу изменений:
+# 1) api/v1/changes/ без since возвращает текущий номер журнала (next_since);
+# 2) клиент загружает список заказов (api/v1/order_list/);
+# 3) затем периодически запрашивает api/v1/changes/?since=<next_since>&limit=N и применяет изменения.
+# Изменения, сделанные между шагами 1 и 2, придут повторно - их можно применять по id и version заказа.
+# Удаленный заказ приходит как запись deleted с data = null.
+# Если записи после since уже удалены командой prune_order_changes, возвращается 410 -
+# клиенту нужно заново загрузить список заказов
+class OrderAPIChanges(generics.GenericAPIView):
+    # количество изменений в ответе по умолчанию и максимальное
+    default_limit = 100
+    max_limit = 1000
+
+    def get(self, request):
+        params = request.query_params
+        since = self.get_int_param(params, 'since', None, min_value=0)
+        limit = min(self.get_int_param(params, 'limit', self.default_limit, min_value=1), self.max_limit)
+
+        if since is None:
+            return Response({'changes': [], 'next_since': OrderChange.latest_seq(), 'has_more': False})
+
+        # Берем на одну запись больше, чтобы понять, есть ли еще изменения, без отдельного запроса
+        changes = OrderChange.read_since(since, limit)
+
+        # Метка pruned - всегда самая старая запись журнала: если она идет сразу после since,
+        # то часть изменений после since уже удалена
+        if changes and changes[0][1] == OrderChange.PRUNED:
+            return Response(
+                {"since param error": "Изменения после этого номера удалены, загрузите список заказов заново."},
+                status=status.HTTP_410_GONE,
+            )
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        return Response({
+            'changes': [{'seq': seq, 'action': action, 'order_id': order_id, 'order': data}
+                        for seq, action, order_id, data, event_type in changes],
+            'next_since': changes[-1][0] if changes else since,
+            'has_more': has_more,
+        })
+
+    def get_int_param(self, params, name, default, min_value):
+        value = params.get(name)
+        if value is None:
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            value = min_value - 1
+        if value < min_value:
+            raise serializers.ValidationError(
+                {f"{name} param error": f"Параметр '{name}' должен быть целым числом не меньше {min_value}."}
+            )
+        return value
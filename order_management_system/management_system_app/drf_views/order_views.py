@@ -1,85 +1,180 @@
-from rest_framework import generics, serializers
-from ..models import Order
-from ..serializers import OrderSerializer, OrderUpdateStatusSerializer, OrderUpdateItemsSerializer
-
-
-class OrderAPICreate(generics.CreateAPIView):
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
+from rest_framework import generics, serializers, status
+from rest_framework.response import Response
+
+from ..conditional import ConditionalRetrieveMixin, ConditionalUpdateMixin, etag_matches, not_modified, orders_etag, queryset_etag
+from ..models import Order, ORDER_STATUSES
+from ..order_cache import order_cache
+from ..filters import filter_orders
+from ..idempotency import IdempotentMixin
+from ..pagination import OrderKeysetPagination
+from ..serializers import OrderSerializer, OrderUpdateStatusSerializer, OrderUpdateItemsSerializer, \
+    OrderBulkUpdateStatusSerializer, OrderReadSerializer, order_rows
+
+
+class OrderAPICreate(IdempotentMixin, generics.CreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
 
 
-class OrderAPIList(generics.ListAPIView):
+class OrderAPIBulkCreate(IdempotentMixin, generics.GenericAPIView):
     serializer_class = OrderSerializer
-
-    def get_queryset(self):
-        queryset = Order.objects.all()
-
-        # Допустимые параметры запроса
-        valid_params = ['status', 'table_number']
-
-        # Получаем все параметры запроса
-        request_params = self.request.query_params.keys()
-
-        # Проверяем, есть ли некорректные параметры
-        invalid_params = [param for param in request_params if param not in valid_params]
-        if invalid_params:
+    # максимальное количество заказов в одном запросе
+    max_batch_size = 500
+
+    def post(self, request):
+        # Проверяем, что передан непустой список заказов
+        if not isinstance(request.data, list) or not request.data:
+            raise serializers.ValidationError({"orders": "Передайте непустой список заказов."})
+        if len(request.data) > self.max_batch_size:
             raise serializers.ValidationError(
-                {
-                    "params error": f"Некорректные параметры запроса: {', '.join(invalid_params)}. Допустимые параметры: {', '.join(valid_params)}"}
+                {"orders": f"Можно создать не более {self.max_batch_size} заказов за один запрос."}
             )
 
-        # Получаем значения параметров
-        status = self.request.query_params.get('status')
-        table_number = self.request.query_params.get('table_number')
+        # Все заказы проверяются за один проход, ошибки возвращаются по индексу заказа в списке
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            errors = {str(index): order_errors for index, order_errors in enumerate(serializer.errors) if order_errors}
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Допустимые значения для статуса
-        valid_statuses = ['в ожидании', 'готово', 'оплачено']
+        # Заказы создаются одним bulk_create в одной транзакции: либо все, либо ни одного
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        # Проверяем, не переданы ли оба параметра
-        if status and table_number:
-            raise serializers.ValidationError(
-                {"params error": "Можно искать только по одному параметру: status или table_number."}
-            )
 
-        # Проверяем, что status передан и не пустой
-        if status is not None:  # Параметр присутствует в запросе
-            if status == '':  # Параметр есть, но значение пустое
-                raise serializers.ValidationError(
-                    {"status param error": "Параметр 'status' не может быть пустым."}
-                )
-            if status not in valid_statuses:  # Некорректное значение
-                raise serializers.ValidationError(
-                    {
-                        "status param error": f"Некорректное значение статуса: '{status}'. Допустимые значения: {', '.join(valid_statuses)}"}
-                )
-            # Фильтруем по status, если он корректен
-            queryset = queryset.filter(status=status)
+class OrderAPIList(generics.ListAPIView):
+    # заказы читаются строками values_list без создания экземпляров модели (см. OrderReadSerializer)
+    serializer_class = OrderReadSerializer
+    # пагинация включается параметрами cursor/page_size, без них возвращается весь список
+    pagination_class = OrderKeysetPagination
 
-        # Фильтруем по table_number, если он передан и не пустой
-        if table_number is not None:  # Параметр присутствует в запросе
-            if table_number == '':  # Параметр есть, но значение пустое
+    def get_queryset(self):
+        # Проверяем параметры запроса и фильтруем заказы по status или table_number,
+        # если параметры не заданы, то возвращаются все заказы. Параметр format выбирает формат ответа
+        return filter_orders(Order.objects.all(), self.request.query_params,
+                             extra_params=(*OrderKeysetPagination.query_params, 'format'))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # Для условного запроса ETag считается одним агрегатом по тем же заказам, из которых собирается ответ
+        # (страница или весь список); если у клиента актуальная версия, заказы не загружаются и не сериализуются
+        if request.headers.get('If-None-Match'):
+            window = self.paginator.get_page_window(queryset, request)
+            etag = queryset_etag(queryset if window is None else window, request)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+        # Наличие заказов проверяем по уже полученной выборке, без отдельного запроса exists()
+        rows = order_rows(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            # Пустая первая страница означает, что заказов нет; пустая следующая - что список закончился
+            if not page and not request.query_params.get(OrderKeysetPagination.cursor_query_param):
+                raise serializers.ValidationError({"no orders error": "Заказы не найдены."})
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+            orders = self.paginator.rows
+        else:
+            orders = list(rows)
+            # Если заказы не найдены, выбрасываем ошибку
+            if not orders:
+                raise serializers.ValidationError({"no orders error": "Заказы не найдены."})
+            serializer = self.get_serializer(orders, many=True)
+            response = Response(serializer.data)
+
+        etag = orders_etag(orders, request)
+        if etag is not None:
+            response['ETag'] = etag
+        return response
+
+
+class OrderAPILookup(generics.GenericAPIView):
+    # количество подсказок по умолчанию и максимальное
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        params = request.query_params
+
+        # Введенное значение - это номер заказа или номер стола
+        try:
+            number = int(params.get('q', ''))
+        except ValueError:
+            raise serializers.ValidationError({"q param error": "Параметр 'q' должен быть целым числом."})
+        try:
+            limit = min(int(params.get('limit', self.default_limit)), self.max_limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise serializers.ValidationError({"limit param error": "Параметр 'limit' должен быть положительным целым числом."})
+
+        # Оба условия идут по индексам: по первичному ключу и по номеру стола,
+        # из таблицы читаются только три колонки и не больше limit строк
+        queryset = Order.objects.filter(Q(id=number) | Q(table_number=number))
+        status_param = params.get('status')
+        if status_param:
+            if status_param not in ORDER_STATUSES:
                 raise serializers.ValidationError(
-                    {"table_number param error": "Параметр 'table_number' не может быть пустым."}
+                    {"status param error": f"Некорректное значение статуса: '{status_param}'. Допустимые значения: {', '.join(ORDER_STATUSES)}"}
                 )
-            # Фильтруем по table_number
-            queryset = queryset.filter(table_number=table_number)
+            queryset = queryset.filter(status=status_param)
+        rows = queryset.order_by('-id').values_list('id', 'table_number', 'status')[:limit]
+
+        return Response([{'id': order_id, 'table_number': table_number, 'status': order_status}
+                         for order_id, table_number, order_status in rows])
 
-        # Если заказы не найдены, выбрасываем ошибку
-        if not queryset.exists():
-            raise serializers.ValidationError({"no orders error": "Заказы не найдены."})
 
-        # если параметры не заданы, то возвращаются все заказы
-        return queryset
+# GET заказа через кэш заказов (Order.get_cached), изменение заказа по-прежнему идет напрямую в БД
+class CachedOrderMixin:
+    def get_object(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return super().get_object()
 
+        order = Order.get_cached(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if order is None:
+            raise Http404
+        self.check_object_permissions(self.request, order)
+        return order
 
-class OrderAPIUpdateStatus(generics.RetrieveUpdateAPIView):
+
+class OrderAPIUpdateStatus(IdempotentMixin, CachedOrderMixin, ConditionalRetrieveMixin, ConditionalUpdateMixin,
+                           generics.RetrieveUpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderUpdateStatusSerializer
 
-class OrderAPIUpdateItems(generics.RetrieveUpdateAPIView):
+class OrderAPIBulkUpdateStatus(IdempotentMixin, generics.GenericAPIView):
+    serializer_class = OrderBulkUpdateStatusSerializer
+
+    def post(self, request):
+        # Статус проверяется один раз для всего списка заказов
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))  # убираем повторяющиеся id
+        new_status = serializer.validated_data['status']
+
+        with transaction.atomic():
+            # Один UPDATE для всех заказов, у которых статус действительно меняется
+            updated = Order.objects.filter(id__in=ids).exclude(status=new_status).update(status=new_status)
+            # Id, которых нет в базе данных
+            existing_ids = set(Order.objects.filter(id__in=ids).values_list('id', flat=True))
+
+        return Response({'updated': updated, 'missing_ids': [order_id for order_id in ids if order_id not in existing_ids]})
+
+
+class OrderAPIUpdateItems(IdempotentMixin, CachedOrderMixin, ConditionalRetrieveMixin, ConditionalUpdateMixin,
+                          generics.RetrieveUpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderUpdateItemsSerializer
 
-class OrderAPIDelete(generics.DestroyAPIView):
+class OrderAPIDelete(IdempotentMixin, generics.DestroyAPIView):
     queryset = Order.objects.all()
-    serializer_class = OrderSerializer
\ No newline at end of file
+    serializer_class = OrderSerializer
+
+
+# счетчики попаданий и промахов кэша заказов в текущем процессе
+class OrderAPICacheStats(generics.GenericAPIView):
+    def get(self, request):
+        return Response(order_cache.stats())
@@ -0,0 +1,90 @@
+from datetime import datetime, time
+
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import generics, serializers
+from rest_framework.response import Response
+
+from ..models import RevenueRollup
+
+
+# выручка и количество заказов за период из сводки по часам и столам (RevenueRollup),
+# без чтения таблицы заказов, например: api/v1/revenue/?from=2025-03-07T10:00&to=2025-03-07T22:00&group_by=table
+# from и to - дата или дата со временем (без часового пояса - в часовом поясе TIME_ZONE), учитываются часы,
+# которые начинаются в промежутке [from, to). group_by: hour, day (по умолчанию) или table.
+# Выручка и оплаченные заказы считаются по времени оплаты, количество заказов - по времени создания
+class OrderAPIRevenue(generics.GenericAPIView):
+    group_by_values = ('hour', 'day', 'table')
+
+    def get(self, request):
+        params = request.query_params
+        date_from = self.get_datetime_param(params, 'from')
+        date_to = self.get_datetime_param(params, 'to')
+        group_by = params.get('group_by', 'day')
+        if group_by not in self.group_by_values:
+            raise serializers.ValidationError(
+                {"group_by param error": f"Параметр 'group_by' должен быть одним из: {', '.join(self.group_by_values)}."}
+            )
+
+        queryset = RevenueRollup.objects.all()
+        if date_from is not None:
+            queryset = queryset.filter(bucket__gte=date_from)
+        if date_to is not None:
+            queryset = queryset.filter(bucket__lt=date_to)
+
+        if group_by == 'table':
+            key = 'table_number'
+            queryset = queryset.values(key)
+        else:
+            key = 'bucket'
+            if group_by == 'day':
+                # Сутки считаются в часовом поясе TIME_ZONE
+                queryset = queryset.annotate(day=TruncDay('bucket', tzinfo=timezone.get_current_timezone()))
+                key = 'day'
+            queryset = queryset.values(key)
+
+        # Строки, в которых после удаления заказов остались нули, в отчет не попадают
+        rows = queryset.annotate(
+            total_revenue=Sum('revenue'), total_paid_orders=Sum('paid_orders_count'), total_orders=Sum('orders_count'),
+        ).filter(Q(total_paid_orders__gt=0) | Q(total_orders__gt=0) | ~Q(total_revenue=0)).order_by(key)
+
+        label = 'table_number' if group_by == 'table' else 'bucket'
+        results = []
+        for row in rows:
+            results.append({
+                label: row[key] if group_by == 'table' else timezone.localtime(row[key]),
+                'revenue': float(row['total_revenue']),
+                'paid_orders_count': row['total_paid_orders'],
+                'orders_count': row['total_orders'],
+            })
+
+        return Response({
+            'group_by': group_by,
+            'results': results,
+            'total_revenue': round(sum(result['revenue'] for result in results), 2),
+            'paid_orders_count': sum(result['paid_orders_count'] for result in results),
+            'orders_count': sum(result['orders_count'] for result in results),
+        })
+
+    def get_datetime_param(self, params, name):
+        value = params.get(name)
+        if not value:
+            return None
+
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                date = parse_date(value)
+                parsed = datetime.combine(date, time.min) if date is not None else None
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise serializers.ValidationError(
+                {f"{name} param error": f"Параметр '{name}' должен быть датой или датой со временем в формате ISO 8601."}
+            )
+
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
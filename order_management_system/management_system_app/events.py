@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+
+from .models import OrderChange
+
+logger = logging.getLogger(__name__)
+
+# поля заказа в событиях, в том же порядке и виде, что и в OrderSerializer
+ORDER_EVENT_FIELDS = ('id', 'table_number', 'items', 'total_price', 'status')
+
+# типы событий об изменении заказов (OrderChange.event_type)
+ORDER_CREATED = 'created'
+ORDER_STATUS_CHANGED = 'status_changed'
+ORDER_ITEMS_CHANGED = 'items_changed'
+ORDER_UPDATED = 'updated'
+ORDER_DELETED = 'deleted'
+
+
+# чтение журнала из асинхронного кода. Не в общем потоке sync_to_async (thread_sensitive=True), иначе
+# ожидание БД задержит все асинхронные обращения к ORM в процессе, а в отдельном потоке из пула.
+# Соединение этого потока закрывается сразу: поток пула может долго не понадобиться
+async def read_journal(function, *args):
+    def call():
+        try:
+            return function(*args)
+        finally:
+            connections.close_all()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+class OrderEvent:
+    __slots__ = ('id', 'type', 'order')
+
+    def __init__(self, event_id, event_type, order):
+        self.id = event_id
+        self.type = event_type
+        self.order = order
+
+    # событие по записи журнала изменений: номер события - seq записи, у удаленного заказа есть только id
+    @classmethod
+    def from_change(cls, seq, action, order_id, data, event_type):
+        if data is None:
+            return cls(seq, event_type, {'id': order_id})
+        return cls(seq, event_type, {field: data[field] for field in ORDER_EVENT_FIELDS})
+
+    # фильтр экрана по номеру стола и статусу. Смена статуса отправляется экрану с любым фильтром по статусу,
+    # а удаление - с любым фильтром: так экран узнает, что заказ ушел из его списка
+    def matches(self, status=None, table_number=None):
+        if self.type == ORDER_DELETED:
+            return True
+        if table_number is not None and self.order.get('table_number') != table_number:
+            return False
+        if status is not None and self.type != ORDER_STATUS_CHANGED:
+            return self.order.get('status') == status
+        return True
+
+    def encode(self):
+        data = json.dumps(self.order, ensure_ascii=False, separators=(',', ':'))
+        return f'id: {self.id}\nevent: {self.type}\ndata: {data}\n\n'
+
+
+class Subscription:
+    def __init__(self, loop, max_queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        # подписчик не успевал читать события, часть из них потеряна
+        self.lost_events = False
+
+    def put(self, event):
+        # Вызывается в цикле событий подписчика
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lost_events = True
+
+
+# раздача событий подписчикам внутри процесса. Источник событий - журнал изменений OrderChange:
+# его пишут триггеры PostgreSQL, поэтому в нем есть изменения, сделанные любым процессом и любым способом записи.
+# Пока есть подписчики, один поток процесса опрашивает журнал раз в ORDER_EVENTS_POLL_INTERVAL секунд
+# и раздает новые записи всем подпискам процесса. Номер события - seq записи журнала, он общий для всех
+# процессов, поэтому Last-Event-ID, полученный от одного процесса, подходит и для другого.
+# Последние события хранятся в кольцевом буфере: переподключившийся экран получает пропущенные события
+# из него, а если буфер их уже не содержит - из журнала (см. OrderEventStream)
+class OrderEventBroker:
+    def __init__(self, buffer_size=1000, max_queue_size=1000):
+        self.lock = threading.Lock()
+        self.buffer = deque(maxlen=buffer_size)
+        self.max_queue_size = max_queue_size
+        self.subscriptions = set()
+        # номер последнего прочитанного из журнала события, None - журнал еще не читался
+        self.last_event_id = None
+        # буфер содержит все события после этого номера
+        self.buffer_since = None
+        self.poller = None
+
+    def publish(self, events):
+        with self.lock:
+            for event in events:
+                if len(self.buffer) == self.buffer.maxlen:
+                    self.buffer_since = self.buffer[0].id
+                self.buffer.append(event)
+            if events:
+                self.last_event_id = events[-1].id
+            subscriptions = list(self.subscriptions)
+
+        for subscription in subscriptions:
+            for event in events:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.put, event)
+                except RuntimeError:
+                    # цикл событий подписчика уже закрыт, подписка больше не нужна
+                    self.unsubscribe(subscription)
+                    break
+        return events
+
+    # подписка вместе с пропущенными событиями после last_event_id из буфера.
+    # Если буфер не содержит всех событий после last_event_id, вместо них возвращается None:
+    # их нужно прочитать из журнала. Синхронный метод (читает журнал при запуске опроса), loop - цикл событий
+    # подписчика; из асинхронного кода вызывается через asubscribe
+    def subscribe(self, loop, last_event_id=None):
+        subscription = Subscription(loop, self.max_queue_size)
+        latest = None
+        while True:
+            with self.lock:
+                if self.last_event_id is not None or latest is not None:
+                    self.subscriptions.add(subscription)
+                    self.start_polling(latest)
+                    if last_event_id is None:
+                        return subscription, []
+                    if not self.buffer_since <= last_event_id <= self.last_event_id:
+                        return subscription, None
+                    return subscription, [event for event in self.buffer if event.id > last_event_id]
+            # Журнал читается без self.lock: публикация и другие подписки не ждут БД
+            latest = OrderChange.latest_seq()
+
+    async def asubscribe(self, last_event_id=None):
+        return await read_journal(self.subscribe, asyncio.get_running_loop(), last_event_id)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    # чтение новых записей журнала: True, если прочитаны не все и нужно читать дальше
+    def poll(self):
+        if self.last_event_id is None:
+            latest = OrderChange.latest_seq()
+            with self.lock:
+                if self.last_event_id is None:
+                    self.last_event_id = self.buffer_since = latest
+            return False
+
+        changes = OrderChange.read_since(self.last_event_id, self.buffer.maxlen)
+        if changes and changes[0][1] == OrderChange.PRUNED:
+            # Записи после прочитанного номера уже удалены: буфер начинается заново, подписчики получат reset
+            self.restart(OrderChange.latest_seq())
+            return False
+        self.publish([OrderEvent.from_change(*change) for change in changes[:self.buffer.maxlen]])
+        return len(changes) > self.buffer.maxlen
+
+    def restart(self, last_event_id):
+        with self.lock:
+            self.buffer.clear()
+            self.last_event_id = self.buffer_since = last_event_id
+            for subscription in self.subscriptions:
+                subscription.lost_events = True
+
+    # поток опроса журнала запускается с первой подпиской и завершается, когда подписок не осталось.
+    # Опрос продолжается с последней записи журнала (latest, прочитан до self.lock): события, записанные
+    # до подписки, экран получает из журнала по Last-Event-ID. Вызывается под self.lock;
+    # ORDER_EVENTS_POLL_INTERVAL = 0 отключает поток опроса (так работают тесты, они вызывают poll сами)
+    def start_polling(self, latest):
+        if self.last_event_id is None:
+            self.last_event_id = self.buffer_since = latest
+        if self.poller is not None:
+            return
+        if settings.ORDER_EVENTS_POLL_INTERVAL:
+            self.poller = threading.Thread(target=self.run_poller, args=(settings.ORDER_EVENTS_POLL_INTERVAL,),
+                                           name='order-events-poller', daemon=True)
+            self.poller.start()
+
+    def run_poller(self, interval):
+        try:
+            while True:
+                with self.lock:
+                    if not self.subscriptions:
+                        # Без опроса буфер устаревает: следующий поток начнет с последней записи журнала
+                        self.poller = self.last_event_id = self.buffer_since = None
+                        self.buffer.clear()
+                        return
+                close_old_connections()
+                try:
+                    while self.poll():
+                        pass
+                except DatabaseError:
+                    logger.exception('Не удалось прочитать журнал изменений заказов')
+                time.sleep(interval)
+        finally:
+            # У потока свое соединение с БД, оно закрывается вместе с потоком
+            connections.close_all()
+
+
+broker = OrderEventBroker()
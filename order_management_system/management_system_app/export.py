@@ -0,0 +1,95 @@
+import csv
+import json
+
+from rest_framework import serializers
+
+from .serializers import ORDER_FIELDS
+
+# поля заказа в выгрузке, в том же порядке и виде, что и в OrderSerializer
+EXPORT_FIELDS = ORDER_FIELDS
+
+# форматы выгрузки и их типы содержимого
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+# псевдо-файл для csv.writer: writerow возвращает строку вместо записи в буфер
+class Echo:
+    def write(self, value):
+        return value
+
+
+def encode_ndjson(row):
+    return json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def csv_encoder():
+    writer = csv.writer(Echo())
+
+    def encode_csv(row):
+        order_id, table_number, items, total_price, status = row
+        # Список блюд записывается в одну ячейку в виде JSON
+        return writer.writerow([order_id, table_number, json.dumps(items, ensure_ascii=False), total_price, status])
+
+    return writer.writerow(EXPORT_FIELDS), encode_csv
+
+
+# формат выгрузки задается параметром format, по умолчанию ndjson
+def get_export_format(query_params):
+    export_format = query_params.get('format', 'ndjson')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise serializers.ValidationError(
+            {"format param error": f"Некорректный формат выгрузки: '{export_format}'. "
+                                   f"Допустимые значения: {', '.join(EXPORT_CONTENT_TYPES)}"}
+        )
+    return export_format
+
+
+# кодировщик строк выгрузки: (заголовок или None, функция для одной строки)
+def get_encoder(export_format):
+    if export_format == 'csv':
+        return csv_encoder()
+    return None, encode_ndjson
+
+
+def export_rows(queryset, named=False):
+    return queryset.order_by('id').values_list(*EXPORT_FIELDS, named=named)
+
+
+# потоковая выгрузка заказов: строки читаются из БД порциями через серверный курсор (iterator),
+# без создания экземпляров модели, и отдаются блоками по chunk_size заказов,
+# поэтому расход памяти не зависит от количества выгружаемых заказов
+def export_orders(queryset, export_format, chunk_size=2000):
+    header, encode = get_encoder(export_format)
+    if header is not None:
+        yield header
+
+    batch = []
+    for row in export_rows(queryset).iterator(chunk_size=chunk_size):
+        batch.append(encode(row))
+        if len(batch) >= chunk_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+# та же выгрузка для асинхронного представления: строки читаются через aiterator,
+# пока ответ отдается клиенту, поток обработчика не занят
+async def aexport_orders(queryset, export_format, chunk_size=2000):
+    header, encode = get_encoder(export_format)
+    if header is not None:
+        yield header
+
+    batch = []
+    # named=True: обычный values_list в Django 5.1 выполняет запрос при создании итератора,
+    # то есть вне sync_to_async, и aiterator для него падает с SynchronousOnlyOperation
+    async for row in export_rows(queryset, named=True).aiterator(chunk_size=chunk_size):
+        batch.append(encode(row))
+        if len(batch) >= chunk_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
@@ -0,0 +1,75 @@
+from rest_framework import serializers
+
+from .models import ORDER_STATUSES
+
+
+# проверка параметров запроса status и table_number и фильтрация по ним заказов;
+# используется списком заказов (api/v1/order_list/) и выгрузкой заказов.
+# extra_params - дополнительные параметры, которые допустимы для конкретного эндпоинта
+def filter_orders(queryset, query_params, extra_params=()):
+    return queryset.filter(**parse_order_filters(query_params, extra_params))
+
+
+# проверка параметров запроса status и table_number: возвращает условия фильтрации заказов,
+# например {'status': 'готово'}; используется и там, где фильтруются не запросы к БД, а события
+def parse_order_filters(query_params, extra_params=()):
+    # Допустимые параметры запроса
+    valid_params = ['status', 'table_number', *extra_params]
+
+    # Получаем все параметры запроса
+    request_params = query_params.keys()
+
+    # Проверяем, есть ли некорректные параметры
+    invalid_params = [param for param in request_params if param not in valid_params]
+    if invalid_params:
+        raise serializers.ValidationError(
+            {
+                "params error": f"Некорректные параметры запроса: {', '.join(invalid_params)}. Допустимые параметры: {', '.join(valid_params)}"}
+        )
+
+    # Получаем значения параметров
+    status = query_params.get('status')
+    table_number = query_params.get('table_number')
+
+    # Допустимые значения для статуса
+    valid_statuses = ORDER_STATUSES
+    filters = {}
+
+    # Проверяем, не переданы ли оба параметра
+    if status and table_number:
+        raise serializers.ValidationError(
+            {"params error": "Можно искать только по одному параметру: status или table_number."}
+        )
+
+    # Проверяем, что status передан и не пустой
+    if status is not None:  # Параметр присутствует в запросе
+        if status == '':  # Параметр есть, но значение пустое
+            raise serializers.ValidationError(
+                {"status param error": "Параметр 'status' не может быть пустым."}
+            )
+        if status not in valid_statuses:  # Некорректное значение
+            raise serializers.ValidationError(
+                {
+                    "status param error": f"Некорректное значение статуса: '{status}'. Допустимые значения: {', '.join(valid_statuses)}"}
+            )
+        # Фильтруем по status, если он корректен
+        filters['status'] = status
+
+    # Фильтруем по table_number, если он передан и не пустой
+    if table_number is not None:  # Параметр присутствует в запросе
+        if table_number == '':  # Параметр есть, но значение пустое
+            raise serializers.ValidationError(
+                {"table_number param error": "Параметр 'table_number' не может быть пустым."}
+            )
+        # Проверяем, что table_number - целое число
+        try:
+            table_number = int(table_number)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(
+                {"table_number param error": f"Некорректное значение номера стола: '{table_number}'."}
+            )
+        # Фильтруем по table_number
+        filters['table_number'] = table_number
+
+    # если параметры не заданы, то возвращаются все заказы
+    return filters
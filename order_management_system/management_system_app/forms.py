@@ -2,7 +2,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
 
-from .models import Order
+from .models import Order, ORDER_STATUSES
 
 # форма для добавления заказа через веб-интерфейс
 class AddOrderForm(forms.ModelForm):
@@ -22,17 +22,35 @@ class AddOrderForm(forms.ModelForm):
             }),
         }
 
+# поле ID заказа для форм удаления и изменения статуса: вместо выпадающего списка со всеми заказами
+# вводится номер заказа, подсказки подгружаются из api/v1/orders/lookup/ в элемент datalist
+def order_id_field():
+    return forms.IntegerField(label="ID заказа", min_value=1, widget=forms.NumberInput(attrs={
+        'list': 'order-suggestions',
+        'autocomplete': 'off',
+        'class': 'form-control',
+    }))
+
+# проверка ID заказа одним запросом по первичному ключу,
+# найденный заказ сохраняется в form.order, чтобы представлению не нужно было искать его повторно
+class OrderIdFormMixin:
+    order_lookup_fields = None
+
+    def clean_order_id(self):
+        order_id = self.cleaned_data['order_id']
+        queryset = Order.objects.all()
+        if self.order_lookup_fields:
+            queryset = queryset.only(*self.order_lookup_fields)
+        self.order = queryset.filter(pk=order_id).first()
+        if self.order is None:
+            raise ValidationError(f'Заказ с ID {order_id} не найден.')
+        return order_id
+
 # форма для удаления заказа через веб-интерфейс
-class DeleteOrderForm(forms.Form):
-    order_id = forms.ChoiceField(label="ID заказа")
+class DeleteOrderForm(OrderIdFormMixin, forms.Form):
+    order_lookup_fields = ('id',)
 
-    # Переопределяем метод, чтобы динамически заполнить список вариантов
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Получаем все заказы из базы данных
-        orders = Order.objects.all()
-        # Создаем список вариантов для выпадающего списка
-        self.fields['order_id'].choices = [(order.id, f'{order.id}') for order in orders]
+    order_id = order_id_field()
 
 # форма для просмотра заказа через веб-интерфейс
 class GetOrderForm(forms.Form):
@@ -53,9 +71,16 @@ class GetOrderForm(forms.Form):
 
         return cleaned_data
 
+# форма для фильтрации списка всех заказов через веб-интерфейс
+class OrderListFilterForm(forms.Form):
+    status = forms.ChoiceField(label='Статус заказа', required=False,
+                               choices=[('', 'Все статусы')] + [(status, status) for status in ORDER_STATUSES])
+    table_number = forms.IntegerField(label='Номер стола', required=False, min_value=1)
+
 # форма для изменения статуса заказа через веб-интерфейс
+# заказ не ищется при проверке формы: представление меняет статус одним запросом UPDATE
 class UpdateOrderStatusForm(forms.Form):
-    order_id = forms.ChoiceField(label="ID заказа")
+    order_id = order_id_field()
     status = forms.ChoiceField(
         label="Статус заказа",
         choices=[
@@ -65,13 +90,6 @@ class UpdateOrderStatusForm(forms.Form):
         ]
     )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Получаем все заказы из базы данных
-        orders = Order.objects.all()
-        # Создаем список вариантов для выпадающего списка
-        self.fields['order_id'].choices = [(order.id, f'{order.id}') for order in orders]
-
 # форма для изменения содержимого заказа через веб-интерфейс
 class UpdateOrderItemsForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,128 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import exceptions, serializers, status
+
+from .models import IdempotencyKey
+from .server_timing import timed
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+# запросы, для которых учитывается ключ идемпотентности
+IDEMPOTENT_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# SQL-запросы, которые ключ добавляет к запросу: занять ключ и сохранить ответ
+# (при повторе - попытка занять ключ и чтение сохраненного ответа)
+IDEMPOTENCY_QUERIES = 2
+# заголовки ответа, которые сохраняются вместе с его телом
+STORED_HEADERS = ('Content-Type', 'ETag')
+
+# Ключ занимается одним INSERT ... ON CONFLICT: если ключ уже занят другим запросом, который еще не завершен,
+# PostgreSQL ждет завершения его транзакции по уникальному индексу, после чего INSERT ничего не вставляет
+# и запрос получает сохраненный ответ. Просроченный ключ занимается заново тем же запросом
+CLAIM_SQL = '''
+    INSERT INTO {table} AS k (key, fingerprint, response_headers, expires_at)
+    VALUES (%s, %s, '{{}}', %s)
+    ON CONFLICT (key) DO UPDATE
+       SET fingerprint = EXCLUDED.fingerprint, status_code = NULL, response_body = NULL,
+           response_headers = '{{}}', created_at = now(), expires_at = EXCLUDED.expires_at
+     WHERE k.expires_at <= now()
+    RETURNING id
+'''
+
+
+class IdempotencyKeyMismatch(exceptions.APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Ключ идемпотентности уже использован для другого запроса.'
+    default_code = 'idempotency_key_mismatch'
+
+
+# сохраненный ответ на повтор запроса, передается из initial в handle_exception
+class _Replay(Exception):
+    def __init__(self, record):
+        self.record = record
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+# занимает ключ для текущей транзакции: None, если ключ свободен (или просрочен) и теперь занят этим запросом,
+# иначе - запись ключа с сохраненным ответом
+def claim_key(key, fingerprint):
+    expires_at = timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    with connection.cursor() as cursor:
+        cursor.execute(CLAIM_SQL.format(table=IdempotencyKey._meta.db_table), [key, fingerprint, expires_at])
+        if cursor.fetchone() is not None:
+            return None
+    return IdempotencyKey.objects.get(key=key)
+
+
+# заголовок Idempotency-Key для запросов на запись в DRF-представлениях: первый ответ с ключом сохраняется
+# на IDEMPOTENCY_KEY_TTL секунд, повтор запроса с тем же ключом получает сохраненный ответ байт в байт
+# (с заголовком Idempotent-Replayed: true) без проверки данных и записи в БД. Ключ, изменения заказов
+# и ответ сохраняются в одной транзакции: одновременный повтор ждет ее завершения и получает тот же ответ,
+# а если запрос упал, ключ освобождается вместе с откатом изменений. Ответы 5xx не сохраняются.
+# Тот же ключ с другим методом, путем или телом запроса - ошибка 422
+class IdempotentMixin:
+    idempotency_key = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in IDEMPOTENT_METHODS or IDEMPOTENCY_HEADER not in request.headers:
+            return super().dispatch(request, *args, **kwargs)
+        # Тело запроса читается до DRF: проверка CSRF при сессионной аутентификации читает поток multipart-запроса,
+        # после чего request.body недоступен. Прочитанное тело кэшируется, и DRF разбирает его из кэша
+        request.body
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None or request.method not in IDEMPOTENT_METHODS:
+            return
+
+        if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise serializers.ValidationError(
+                {"idempotency key error": "Заголовок Idempotency-Key должен содержать от 1 до 255 символов."}
+            )
+        fingerprint = request_fingerprint(request)
+        record = claim_key(key, fingerprint)
+        if record is None:
+            self.idempotency_key = key
+            return
+        if record.fingerprint != fingerprint:
+            raise IdempotencyKeyMismatch({"idempotency key error": IdempotencyKeyMismatch.default_detail})
+        raise _Replay(record)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            record = exc.record
+            return HttpResponse(bytes(record.response_body), status=record.status_code,
+                                headers={**record.response_headers, 'Idempotent-Replayed': 'true'})
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.idempotency_key is None:
+            return response
+
+        if response.status_code >= 500:
+            # Ответ не сохраняется: ключ освобождается вместе с изменениями этого запроса
+            transaction.set_rollback(True)
+        else:
+            # Ответ рендерится здесь, а не после представления, чтобы сохранить его тело
+            if hasattr(response, 'render'):
+                with timed('render'):
+                    response.render()
+            IdempotencyKey.objects.filter(key=self.idempotency_key).update(
+                status_code=response.status_code, response_body=response.content,
+                response_headers={header: response[header] for header in STORED_HEADERS if header in response},
+            )
+        return response
@@ -0,0 +1,113 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ...models import Order
+
+
+class _Rollback(Exception):
+    pass
+
+
+# команда заполняет таблицу заказов тестовыми данными (по умолчанию 1 000 000 заказов),
+# вызывает эндпоинты поиска и выручки и по выводу EXPLAIN проверяет, что их запросы идут по индексам.
+# Все данные создаются в транзакции, которая в конце откатывается, поэтому база остается без изменений:
+# python manage.py benchmark_indexes --orders 1000000
+class Command(BaseCommand):
+    help = 'Проверяет по EXPLAIN, что эндпоинты поиска и выручки используют индексы на большом объеме заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Количество создаваемых заказов')
+        parser.add_argument('--tables', type=int, default=50, help='Количество столов в зале')
+        parser.add_argument('--show-plans', action='store_true', help='Вывести планы всех запросов')
+
+    # эндпоинты и параметры запросов, которые проверяются;
+    # scans_orders=False означает, что эндпоинт вообще не должен читать таблицу заказов
+    def get_endpoints(self, tables):
+        table_number = tables // 2
+        return [
+            ('order_list ?status', reverse('order_list'), {'status': 'в ожидании', 'page_size': 100}, True),
+            ('order_list ?status&ordering=status', reverse('order_list'),
+             {'status': 'готово', 'page_size': 100, 'ordering': 'status'}, True),
+            ('order_list ?table_number', reverse('order_list'), {'table_number': table_number}, True),
+            ('get_order ?table_number', reverse('get_order'), {'table_number': table_number}, True),
+            ('get_order ?status', reverse('get_order'), {'status': 'готово'}, True),
+            ('get_total_revenue_by_api', reverse('get_total_revenue_by_api'), {}, False),
+            ('get_total_revenue', reverse('get_total_revenue'), {}, False),
+        ]
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['tables'] < 1:
+            raise CommandError('Количество заказов и столов должно быть больше 0.')
+
+        try:
+            with transaction.atomic():
+                failures = self.run_benchmark(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError('Запросы без индекса: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все проверенные эндпоинты используют индексы.'))
+
+    def run_benchmark(self, options):
+        table = Order._meta.db_table
+
+        started = time.perf_counter()
+        self.seed_orders(options['orders'], options['tables'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {table}')
+        self.stdout.write(f'Создано заказов: {options["orders"]} за {time.perf_counter() - started:.1f} с')
+
+        failures = []
+        client = Client()
+        # тестовый клиент обращается к хосту testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, url, params, scans_orders in self.get_endpoints(options['tables']):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.get(url, params)
+                    elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code != 200:
+                    failures.append(f'{name}: статус ответа {response.status_code}')
+                    continue
+
+                for query in queries.captured_queries:
+                    if not query['sql'].startswith('SELECT'):
+                        continue
+                    plan = self.explain(query['sql'])
+                    reads_orders = table in plan
+                    if not scans_orders and reads_orders:
+                        failures.append(f'{name}: запрос читает таблицу заказов')
+                    elif reads_orders and (f'Seq Scan on {table}' in plan or 'Index' not in plan):
+                        failures.append(f'{name}: {query["sql"]}')
+                    if options['show_plans'] or (reads_orders and 'Index' not in plan):
+                        self.stdout.write(f'{query["sql"]}\n{plan}\n')
+
+                self.stdout.write(f'{name}: {elapsed:.1f} мс, запросов: {len(queries.captured_queries)}')
+        return failures
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def seed_orders(self, orders, tables):
+        # Большая часть истории - оплаченные заказы, рабочий набор кухни - около 2% заказов
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {Order._meta.db_table} (table_number, items, total_price, status)
+                SELECT 1 + g %% %s,
+                       jsonb_build_array(
+                           jsonb_build_object('position', 'Шашлык', 'price', 454.99),
+                           jsonb_build_object('position', 'Картофель фри', 'price', 199.99 + g %% 3)),
+                       654.98 + g %% 3,
+                       CASE g %% 100 WHEN 0 THEN 'в ожидании' WHEN 1 THEN 'готово' ELSE 'оплачено' END
+                  FROM generate_series(1, %s) AS g
+            ''', [tables, orders])
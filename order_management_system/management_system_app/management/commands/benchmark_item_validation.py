@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...models import calculate_total_price
+from ...validators import validate_order_items
+
+
+# прежний способ записи заказа: отдельная проверка items (Order.clean / сериализатор)
+# и отдельный проход по списку в Order.save для расчета total_price
+def legacy_validate_and_total(items):
+    if not items:
+        raise ValueError('Заполните поле заказов')
+    if not isinstance(items, list):
+        raise ValueError('Поле items должно быть списком')
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError('Каждый элемент списка items должен быть словарём.')
+        if len(item) != 2:
+            raise ValueError('Каждый элемент items должен содержать ровно два ключа: "position" и "price".')
+        if 'position' not in item or not isinstance(item['position'], str):
+            raise ValueError('Каждый элемент items должен содержать ключ "position".')
+        if 'price' not in item or not isinstance(item['price'], (int, float)):
+            raise ValueError('Каждый элемент items должен содержать ключ "price".')
+    return items, calculate_total_price(items)
+
+
+# микро-бенчмарк проверки позиций заказа: процессорное время на один заказ
+# до (проверка + отдельный расчет суммы) и после (общий валидатор за один проход):
+# python manage.py benchmark_item_validation --sizes 1 50 5000
+class Command(BaseCommand):
+    help = 'Сравнивает процессорное время проверки items и расчета total_price на один заказ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 50, 5000],
+                            help='Количество позиций в заказе')
+        parser.add_argument('--budget', type=float, default=0.5,
+                            help='Примерное время измерения одного варианта, в секундах')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"позиций":>8} {"до, мкс":>12} {"после, мкс":>12} {"ускорение":>10}')
+        for size in options['sizes']:
+            items = [{'position': f'Блюдо {i}', 'price': 100 + i % 100 + 0.99} for i in range(size)]
+
+            # Оба варианта должны давать одинаковую сумму
+            assert legacy_validate_and_total(items)[1] == validate_order_items(items)[1]
+
+            before = self.measure(legacy_validate_and_total, items, options['budget'])
+            after = self.measure(validate_order_items, items, options['budget'])
+            self.stdout.write(f'{size:>8} {before:>12.2f} {after:>12.2f} {before / after:>9.2f}x')
+
+    def measure(self, function, items, budget):
+        # Подбираем количество повторов так, чтобы измерение заняло около budget секунд
+        repeats = 1
+        while True:
+            started = time.process_time()
+            for _ in range(repeats):
+                function(items)
+            elapsed = time.process_time() - started
+            if elapsed >= budget / 10:
+                break
+            repeats *= 10
+
+        repeats = max(1, int(repeats * budget / 10 / elapsed * 10))
+        started = time.process_time()
+        for _ in range(repeats):
+            function(items)
+        return (time.process_time() - started) / repeats * 1_000_000
@@ -0,0 +1,332 @@
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ...models import Order, OrderItem
+
+
+# меню, из которого собираются позиции тестовых заказов
+MENU = [
+    ('Шашлык', 454.99), ('Картофель фри', 199.99), ('Цезарь с курицей', 389.5), ('Борщ', 290),
+    ('Пельмени', 340), ('Блины с икрой', 590), ('Солянка', 320), ('Греческий салат', 310.5),
+    ('Стейк рибай', 1890), ('Паста карбонара', 470), ('Пицца Маргарита', 520), ('Чизкейк', 280),
+    ('Тирамису', 330), ('Морс', 120), ('Кола', 150), ('Чай', 90), ('Капучино', 210), ('Сок', 160),
+    ('Хачапури', 450), ('Уха', 380), ('Оливье', 260), ('Плов', 410), ('Лимонад', 230), ('Эспрессо', 140),
+]
+
+# Заказы создаются одним INSERT ... SELECT на пачку: позиции выбираются из меню по номеру заказа,
+# total_price считается так же, как в Order.save. Заказы равномерно распределены по последним days дням,
+# оплаченные заказы оплачены через 40 минут после создания
+SEED_ORDERS_SQL = '''
+    INSERT INTO {orders} (table_number, items, total_price, status, version, created_at, paid_at)
+    SELECT 1 + (g * 7919) %% %(tables)s, items.items, items.total,
+           CASE g %% 100 WHEN 0 THEN 'в ожидании' WHEN 1 THEN 'готово' ELSE 'оплачено' END, 1,
+           now() - (%(orders)s - g) * (%(days)s * interval '1 day' / %(orders)s),
+           CASE WHEN g %% 100 > 1
+                THEN now() - (%(orders)s - g) * (%(days)s * interval '1 day' / %(orders)s) + interval '40 minutes'
+           END
+      FROM generate_series(%(start)s, %(stop)s) AS g,
+           LATERAL (SELECT jsonb_agg(jsonb_build_object('position', (%(positions)s)[k],
+                                                        'price', (%(prices)s::numeric[])[k]) ORDER BY i) AS items,
+                           sum(round((%(prices)s::numeric[])[k], 2))::double precision AS total
+                      FROM generate_series(1, 1 + (g * 31) %% 5) AS i,
+                           LATERAL (SELECT 1 + (g * 17 + i * 101) %% cardinality(%(positions)s) AS k) AS menu_item
+           ) AS items
+     ORDER BY g
+'''
+
+SEED_ORDER_ITEMS_SQL = '''
+    INSERT INTO {order_items} (order_id, position, price)
+    SELECT o.id, item ->> 'position', round((item ->> 'price')::numeric, 2)::double precision
+      FROM {orders} o, jsonb_array_elements(o.items) AS item
+     WHERE o.id > %s
+'''
+
+
+# маршрут нагрузочного теста: имя, функция запроса request(client, rng) и ожидаемые коды ответа
+class Route:
+    def __init__(self, name, request, expected_statuses=(200,)):
+        self.name = name
+        self.request = request
+        self.expected_statuses = expected_statuses
+
+
+# команда нагрузочного тестирования всех эндпоинтов API и веб-интерфейса.
+# Создает отдельную тестовую базу (как manage.py test), заполняет ее заказами с реалистичными items,
+# выполняет запросы к каждому маршруту из N параллельных клиентов и выводит пропускную способность,
+# задержки p50/p95/p99 и количество SQL-запросов на запрос. Результат сохраняется в JSON, чтобы сравнивать прогоны:
+# python manage.py benchmark_load --orders 1000000 --clients 16 --output after.json --compare before.json
+# Запросы выполняются тестовым клиентом Django внутри процесса, то есть без HTTP-сервера:
+# измеряются представления, сериализация, шаблоны и работа с БД
+class Command(BaseCommand):
+    help = 'Нагрузочный тест эндпоинтов API и веб-интерфейса на тестовой базе с заданным количеством заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10_000, help='Количество заказов в тестовой базе')
+        parser.add_argument('--tables', type=int, default=50, help='Количество столов в зале')
+        parser.add_argument('--days', type=int, default=90, help='За сколько дней распределены заказы')
+        parser.add_argument('--clients', type=int, default=8, help='Количество параллельных клиентов')
+        parser.add_argument('--requests', type=int, default=200, help='Количество запросов к каждому маршруту')
+        parser.add_argument('--routes', nargs='+', help='Проверить только маршруты с этими именами')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора случайных чисел')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Не удалять тестовую базу после прогона и использовать уже заполненную')
+        parser.add_argument('--output', help='Файл для результатов в формате JSON')
+        parser.add_argument('--compare', help='JSON с результатами предыдущего прогона для сравнения')
+
+    def handle(self, *args, **options):
+        for name in ('orders', 'tables', 'clients', 'requests'):
+            if options[name] < 1:
+                raise CommandError(f'Параметр --{name} должен быть больше 0.')
+        baseline = self.load_results(options['compare']) if options['compare'] else None
+
+        # Запросы идут в отдельную тестовую базу, а ключи кэша получают свой префикс,
+        # чтобы заказы тестовой базы не попали в кэш рабочей
+        caches_settings = {alias: {**config, 'KEY_PREFIX': f'benchmark:{config.get("KEY_PREFIX", "")}'}
+                           for alias, config in settings.CACHES.items()}
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], CACHES=caches_settings):
+                results = self.run_benchmark(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        self.print_results(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def run_benchmark(self, options):
+        self.seed_orders(options)
+        ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+        if len(ids) <= 2 * options['requests']:
+            raise CommandError('Заказов должно быть больше, чем удвоенное количество запросов к маршруту.')
+        # Последние заказы удаляются маршрутами удаления, остальные читаются и изменяются
+        self.order_ids = ids[:-options['requests'] * 2]
+        self.delete_ids = deque(ids[-options['requests'] * 2:])
+
+        routes = self.get_routes(options)
+        if options['routes']:
+            unknown = set(options['routes']) - {route.name for route in routes}
+            if unknown:
+                raise CommandError(f'Неизвестные маршруты: {", ".join(sorted(unknown))}')
+            routes = [route for route in routes if route.name in options['routes']]
+
+        results = {
+            'meta': {
+                'orders': options['orders'], 'tables': options['tables'], 'clients': options['clients'],
+                'requests': options['requests'], 'seed': options['seed'],
+                'django': django.get_version(), 'database': connection.vendor,
+                'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            },
+            'routes': {},
+        }
+        for index, route in enumerate(routes):
+            results['routes'][route.name] = self.run_route(route, options, seed=options['seed'] + index)
+            self.stdout.write(f'{route.name}: готово')
+        return results
+
+    def run_route(self, route, options, seed):
+        latencies = []
+        query_counts = []
+        statuses = Counter()
+        errors = []
+        lock = threading.Lock()
+        requests_per_client = [len(part) for part in self.split(range(options['requests']), options['clients'])]
+
+        def run_client(client_index, requests):
+            rng = random.Random(seed * 1000 + client_index)
+            client = Client()
+            db_connection = connections['default']
+            try:
+                for _ in range(requests):
+                    with CaptureQueriesContext(db_connection) as queries:
+                        started = time.perf_counter()
+                        response = route.request(client, rng)
+                        if response.streaming:
+                            # Потоковый ответ считается выполненным, когда прочитан целиком
+                            b''.join(response.streaming_content)
+                        elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        latencies.append(elapsed)
+                        query_counts.append(len(queries.captured_queries))
+                        statuses[response.status_code] += 1
+                        if response.status_code not in route.expected_statuses and len(errors) < 5:
+                            errors.append(f'{response.status_code}: {response.content[:200]!r}'
+                                          if not response.streaming else str(response.status_code))
+            finally:
+                db_connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['clients']) as executor:
+            futures = [executor.submit(run_client, index, requests)
+                       for index, requests in enumerate(requests_per_client) if requests]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in statuses.items() if status not in route.expected_statuses),
+            'error_samples': errors,
+            'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'latency_ms': self.latency_stats(latencies),
+            'queries': {'mean': round(statistics.fmean(query_counts), 2), 'max': max(query_counts)},
+        }
+
+    def latency_stats(self, latencies):
+        if len(latencies) < 2:
+            latencies = latencies * 2
+        percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'p50': round(percentiles[49], 2), 'p95': round(percentiles[94], 2), 'p99': round(percentiles[98], 2),
+            'mean': round(statistics.fmean(latencies), 2), 'max': round(max(latencies), 2),
+        }
+
+    def split(self, sequence, parts):
+        return [sequence[index::parts] for index in range(parts)]
+
+    def get_routes(self, options):
+        tables = options['tables']
+        order_ids = self.order_ids
+        delete_ids = self.delete_ids
+        statuses = ['в ожидании', 'готово', 'оплачено']
+
+        def order_id(rng):
+            return rng.choice(order_ids)
+
+        def items(rng):
+            return [{'position': position, 'price': price} for position, price in rng.sample(MENU, rng.randint(1, 5))]
+
+        def order_data(rng):
+            return {'table_number': rng.randint(1, tables), 'items': items(rng)}
+
+        def url(name, rng=None):
+            return reverse(name, kwargs={'pk': order_id(rng)}) if rng else reverse(name)
+
+        return [
+            # API
+            Route('order_create', lambda client, rng: client.post(
+                url('order_create'), order_data(rng), content_type='application/json'), (201,)),
+            Route('order_bulk_create', lambda client, rng: client.post(
+                url('order_bulk_create'), [order_data(rng) for _ in range(10)], content_type='application/json'),
+                  (201,)),
+            Route('order_list ?page_size', lambda client, rng: client.get(
+                url('order_list'), {'page_size': 100})),
+            Route('order_list ?status&page_size', lambda client, rng: client.get(
+                url('order_list'), {'status': rng.choice(statuses), 'page_size': 100})),
+            Route('order_list ?table_number&page_size', lambda client, rng: client.get(
+                url('order_list'), {'table_number': rng.randint(1, tables), 'page_size': 100})),
+            Route('order_lookup', lambda client, rng: client.get(
+                url('order_lookup'), {'q': rng.randint(1, tables)})),
+            Route('order_update_status GET', lambda client, rng: client.get(url('order_update_status', rng))),
+            Route('order_update_status PATCH', lambda client, rng: client.patch(
+                url('order_update_status', rng), {'status': rng.choice(statuses)}, content_type='application/json')),
+            Route('order_update_items GET', lambda client, rng: client.get(url('order_update_items', rng))),
+            Route('order_update_items PATCH', lambda client, rng: client.patch(
+                url('order_update_items', rng), {'items': items(rng)}, content_type='application/json')),
+            Route('order_bulk_update_status', lambda client, rng: client.post(
+                url('order_bulk_update_status'), {'ids': rng.sample(order_ids, 10), 'status': rng.choice(statuses)},
+                content_type='application/json')),
+            Route('order_delete', lambda client, rng: client.delete(
+                reverse('order_delete', kwargs={'pk': delete_ids.pop()})), (204,)),
+            Route('order_export ?status', lambda client, rng: client.get(
+                url('order_export'), {'status': 'в ожидании', 'format': 'ndjson'})),
+            Route('get_total_revenue_by_api', lambda client, rng: client.get(url('get_total_revenue_by_api'))),
+            Route('revenue ?group_by=day', lambda client, rng: client.get(
+                url('revenue'), {'group_by': 'day'})),
+            Route('revenue ?group_by=table', lambda client, rng: client.get(
+                url('revenue'), {'group_by': 'table'})),
+            Route('order_changes', lambda client, rng: client.get(
+                url('order_changes'), {'since': 0, 'limit': 100})),
+            Route('async_order_list', lambda client, rng: client.get(
+                url('async_order_list'), {'status': rng.choice(statuses), 'page_size': 100})),
+            Route('async_order_retrieve', lambda client, rng: client.get(url('async_order_retrieve', rng))),
+            # веб-интерфейс
+            Route('home', lambda client, rng: client.get(url('home'))),
+            Route('add_order POST', lambda client, rng: client.post(
+                url('add_order'), {'table_number': rng.randint(1, tables), 'items': json.dumps(items(rng))}),
+                  (302,)),
+            Route('delete_order POST', lambda client, rng: client.post(
+                url('delete_order'), {'order_id': delete_ids.pop()}), (200, 302)),
+            Route('get_order', lambda client, rng: client.get(
+                url('get_order'), {'table_number': rng.randint(1, tables)})),
+            Route('get_all_orders', lambda client, rng: client.get(
+                url('get_all_orders'), {'page': rng.randint(1, 20)})),
+            Route('update_order_status POST', lambda client, rng: client.post(
+                url('update_order_status'), {'order_id': order_id(rng), 'status': rng.choice(statuses)}),
+                  (200, 302)),
+            Route('update_order_items GET', lambda client, rng: client.get(url('update_order_items', rng))),
+            Route('update_order_items POST', lambda client, rng: client.post(
+                url('update_order_items', rng), {'items': json.dumps(items(rng))}), (302,)),
+            Route('get_total_revenue', lambda client, rng: client.get(url('get_total_revenue'))),
+        ]
+
+    def seed_orders(self, options):
+        existing = Order.objects.count()
+        if existing >= options['orders']:
+            self.stdout.write(f'Используется тестовая база с {existing} заказами')
+            return
+
+        started = time.perf_counter()
+        last_id = Order.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        positions = [position for position, _ in MENU]
+        prices = [price for _, price in MENU]
+        sql = SEED_ORDERS_SQL.format(orders=Order._meta.db_table)
+        chunk_size = 100_000
+        with connection.cursor() as cursor:
+            # Пачками, чтобы не держать одну огромную транзакцию и показывать прогресс
+            for start in range(existing + 1, options['orders'] + 1, chunk_size):
+                stop = min(start + chunk_size - 1, options['orders'])
+                cursor.execute(sql, {'tables': options['tables'], 'orders': options['orders'], 'days': options['days'],
+                                     'start': start, 'stop': stop, 'positions': positions, 'prices': prices})
+                self.stdout.write(f'Создано заказов: {stop}')
+            cursor.execute(SEED_ORDER_ITEMS_SQL.format(orders=Order._meta.db_table,
+                                                       order_items=OrderItem._meta.db_table), [last_id])
+            cursor.execute(f'ANALYZE {Order._meta.db_table}')
+            cursor.execute(f'ANALYZE {OrderItem._meta.db_table}')
+        self.stdout.write(f'Тестовая база заполнена за {time.perf_counter() - started:.1f} с')
+
+    def load_results(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def print_results(self, results, baseline=None):
+        baseline_routes = baseline['routes'] if baseline else {}
+        header = f'{"маршрут":<38}{"rps":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>7}{"ошибки":>8}'
+        self.stdout.write(header + ('   Δp95     Δrps' if baseline else ''))
+        for name, route in results['routes'].items():
+            latency = route['latency_ms']
+            line = (f'{name:<38}{route["throughput_rps"]:>9.1f}{latency["p50"]:>9.1f}{latency["p95"]:>9.1f}'
+                    f'{latency["p99"]:>9.1f}{route["queries"]["mean"]:>7.1f}{route["errors"]:>8}')
+            previous = baseline_routes.get(name)
+            if previous:
+                line += (f'{self.change(previous["latency_ms"]["p95"], latency["p95"]):>8}'
+                         f'{self.change(previous["throughput_rps"], route["throughput_rps"]):>9}')
+            style = self.style.ERROR if route['errors'] else (lambda text: text)
+            self.stdout.write(style(line))
+
+    def change(self, before, after):
+        if not before:
+            return '-'
+        return f'{(after - before) / before * 100:+.0f}%'
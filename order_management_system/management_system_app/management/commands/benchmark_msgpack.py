@@ -0,0 +1,80 @@
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from ...parsers import MessagePackParser
+from ...renderers import MessagePackRenderer
+
+DISHES = ['Шашлык', 'Картофель фри', 'Цезарь с курицей', 'Борщ', 'Кола 0.5', 'Чай черный', 'Пицца Маргарита',
+          'Стейк рибай', 'Морс клюквенный', 'Тирамису']
+
+
+# заказы в том виде, в котором их отдает API (OrderSerializer)
+def make_orders(count, items_per_order, seed=0):
+    rng = random.Random(seed)
+    orders = []
+    for order_id in range(1, count + 1):
+        items = [{'position': rng.choice(DISHES), 'price': rng.choice([99, 120, 199.99, 349.5, 454.99, 1250])}
+                 for _ in range(items_per_order)]
+        orders.append({'id': order_id, 'table_number': rng.randint(1, 50), 'items': items,
+                       'total_price': round(sum(item['price'] for item in items), 2),
+                       'status': rng.choice(['в ожидании', 'готово', 'оплачено'])})
+    return orders
+
+
+# сравнение JSON и MessagePack на заказах: размер ответа и процессорное время кодирования (рендерер)
+# и разбора (парсер) для одного заказа и для списка заказов:
+# python manage.py benchmark_msgpack --items 3 20 100 --orders 1 1000
+class Command(BaseCommand):
+    help = 'Сравнивает размер и время кодирования и разбора заказов в JSON и MessagePack'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[3, 20, 100],
+                            help='Количество позиций в заказе')
+        parser.add_argument('--orders', type=int, nargs='+', default=[1, 1000],
+                            help='Количество заказов в ответе')
+        parser.add_argument('--budget', type=float, default=0.5,
+                            help='Примерное время измерения одного варианта, в секундах')
+
+    def handle(self, *args, **options):
+        formats = [('json', JSONRenderer(), JSONParser()), ('msgpack', MessagePackRenderer(), MessagePackParser())]
+
+        self.stdout.write(f'{"заказов":>8} {"позиций":>8} {"формат":>8} {"байт":>10} {"размер":>7} '
+                          f'{"кодирование, мкс":>17} {"разбор, мкс":>12}')
+        for count in options['orders']:
+            for items_per_order in options['items']:
+                orders = make_orders(count, items_per_order)
+                data = orders[0] if count == 1 else orders
+                json_size = None
+                for name, renderer, parser in formats:
+                    content = renderer.render(data)
+                    # Оба формата должны разбираться в те же данные
+                    assert parser.parse(io.BytesIO(content)) == data
+                    json_size = json_size or len(content)
+
+                    encode = self.measure(renderer.render, data, options['budget'])
+                    decode = self.measure(lambda content: parser.parse(io.BytesIO(content)), content, options['budget'])
+                    self.stdout.write(f'{count:>8} {items_per_order:>8} {name:>8} {len(content):>10} '
+                                      f'{len(content) / json_size:>6.0%} {encode:>17.1f} {decode:>12.1f}')
+
+    def measure(self, function, argument, budget):
+        # Подбираем количество повторов так, чтобы измерение заняло около budget секунд
+        repeats = 1
+        while True:
+            started = time.process_time()
+            for _ in range(repeats):
+                function(argument)
+            elapsed = time.process_time() - started
+            if elapsed >= budget / 10:
+                break
+            repeats *= 10
+
+        repeats = max(1, int(repeats * budget / 10 / elapsed * 10))
+        started = time.process_time()
+        for _ in range(repeats):
+            function(argument)
+        return (time.process_time() - started) / repeats * 1_000_000
@@ -0,0 +1,96 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.renderers import JSONRenderer
+
+from ...models import Order
+from ...serializers import OrderReadSerializer, OrderSerializer, order_rows
+
+
+class _Rollback(Exception):
+    pass
+
+
+# бенчмарк чтения списка заказов: загрузка из БД, сериализация и рендеринг JSON
+# через OrderSerializer (экземпляры модели) и через OrderReadSerializer (строки values_list).
+# Для каждого размера сверяется, что ответы совпадают байт в байт.
+# Заказы создаются в транзакции, которая в конце откатывается, поэтому база остается без изменений:
+# python manage.py benchmark_order_serializer --sizes 1000 10000 100000
+class Command(BaseCommand):
+    help = 'Сравнивает время отдачи списка заказов через OrderSerializer и OrderReadSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Количество заказов в списке')
+        parser.add_argument('--repeats', type=int, default=3,
+                            help='Количество повторов, берется лучшее время')
+
+    def handle(self, *args, **options):
+        if min(options['sizes']) < 1 or options['repeats'] < 1:
+            raise CommandError('Количество заказов и повторов должно быть больше 0.')
+
+        try:
+            with transaction.atomic():
+                self.run_benchmark(options)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def run_benchmark(self, options):
+        sizes = sorted(options['sizes'])
+        self.seed_orders(sizes[-1])
+        renderer = JSONRenderer()
+
+        # queryset.all() - новая выборка при каждом вызове, без кэша результатов QuerySet
+        def before(queryset):
+            return renderer.render(OrderSerializer(list(queryset.all()), many=True).data)
+
+        def after(queryset):
+            return renderer.render(OrderReadSerializer(list(order_rows(queryset)), many=True).data)
+
+        self.stdout.write(f'{"заказов":>8} {"до, мс":>10} {"после, мс":>10} {"ускорение":>10}   '
+                          f'{"сериализация до, мс":>20} {"после, мс":>10}')
+        for size in sizes:
+            queryset = Order.objects.order_by('id')[:size]
+            if before(queryset) != after(queryset):
+                raise CommandError(f'Ответы OrderSerializer и OrderReadSerializer различаются ({size} заказов).')
+
+            # Полный путь: запрос к БД, сериализация и рендеринг
+            full_before = self.measure(before, queryset, options['repeats'])
+            full_after = self.measure(after, queryset, options['repeats'])
+
+            # Только сериализация и рендеринг уже загруженных заказов
+            orders, rows = list(queryset), list(order_rows(queryset))
+            serialize_before = self.measure(
+                lambda orders: renderer.render(OrderSerializer(orders, many=True).data), orders, options['repeats'])
+            serialize_after = self.measure(
+                lambda rows: renderer.render(OrderReadSerializer(rows, many=True).data), rows, options['repeats'])
+
+            self.stdout.write(f'{size:>8} {full_before:>10.1f} {full_after:>10.1f} {full_before / full_after:>9.2f}x   '
+                              f'{serialize_before:>20.1f} {serialize_after:>10.1f}')
+
+    def measure(self, function, argument, repeats):
+        best = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            function(argument)
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def seed_orders(self, orders):
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {Order._meta.db_table} (table_number, items, total_price, status)
+                SELECT 1 + g %% 50,
+                       jsonb_build_array(
+                           jsonb_build_object('position', 'Шашлык', 'price', 454.99),
+                           jsonb_build_object('position', 'Картофель фри', 'price', 199.99 + g %% 3),
+                           jsonb_build_object('position', 'Кола', 'price', 120)),
+                       774.98 + g %% 3,
+                       CASE g %% 100 WHEN 0 THEN 'в ожидании' WHEN 1 THEN 'готово' ELSE 'оплачено' END
+                  FROM generate_series(1, %s) AS g
+            ''', [orders])
+        self.stdout.write(f'Создано заказов: {orders} за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from ...export import EXPORT_CONTENT_TYPES, export_orders
+from ...filters import filter_orders
+from ...models import Order
+
+
+# команда выгружает заказы в NDJSON или CSV потоково, с теми же фильтрами, что и api/v1/order_list/:
+# python manage.py export_orders --format csv --status оплачено --output orders.csv
+class Command(BaseCommand):
+    help = 'Выгружает заказы в формате NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(EXPORT_CONTENT_TYPES), default='ndjson', help='Формат выгрузки')
+        parser.add_argument('--status', help='Выгрузить только заказы с этим статусом')
+        parser.add_argument('--table-number', help='Выгрузить только заказы этого стола')
+        parser.add_argument('--output', help='Файл для выгрузки, по умолчанию стандартный вывод')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Количество заказов, читаемых из БД за один раз')
+
+    def handle(self, *args, **options):
+        params = {name: options[option] for name, option in (('status', 'status'), ('table_number', 'table_number'))
+                  if options[option] is not None}
+        try:
+            queryset = filter_orders(Order.objects.all(), params)
+        except serializers.ValidationError as error:
+            raise CommandError(' '.join(str(message) for message in error.detail.values()))
+
+        chunks = export_orders(queryset, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
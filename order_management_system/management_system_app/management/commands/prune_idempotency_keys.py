@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ...models import IdempotencyKey
+
+
+# команда удаляет просроченные ключи идемпотентности вместе с сохраненными ответами
+# (время хранения задается настройкой IDEMPOTENCY_KEY_TTL):
+# python manage.py prune_idempotency_keys
+class Command(BaseCommand):
+    help = 'Удаляет просроченные ключи идемпотентности'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать ключи для удаления, не удаляя их')
+
+    def handle(self, *args, **options):
+        queryset = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+        if options['dry_run']:
+            self.stdout.write(f'Ключей для удаления: {queryset.count()}')
+            return
+
+        deleted, _ = queryset.delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено ключей идемпотентности: {deleted}'))
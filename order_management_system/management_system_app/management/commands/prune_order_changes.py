@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ...models import OrderChange
+
+
+# команда удаляет из журнала изменений заказов записи старше заданного количества дней.
+# Вместо удаленных записей остается метка pruned с номером последней удаленной записи:
+# клиенты, которые синхронизировались раньше нее, получат 410 и заново загрузят список заказов.
+# python manage.py prune_order_changes --days 7
+class Command(BaseCommand):
+    help = 'Удаляет старые записи журнала изменений заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Сколько дней хранить записи журнала')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать записи для удаления, не удаляя их')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('Количество дней не может быть отрицательным.')
+
+        threshold = timezone.now() - timedelta(days=options['days'])
+        with transaction.atomic():
+            # Второй запуск команды ждет первый; писателей и читателей журнала эта блокировка не касается
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [OrderChange._meta.db_table])
+            # Метка pruned должна остаться самой старой записью: граница берется только среди окончательных
+            # записей, незавершенные транзакции получат номера больше нее
+            cutoff = OrderChange.committed().filter(created_at__lt=threshold).exclude(action=OrderChange.PRUNED) \
+                .aggregate(seq=Max('seq'))['seq']
+            if cutoff is None:
+                self.stdout.write('Записей для удаления нет.')
+                return
+
+            queryset = OrderChange.objects.filter(seq__lte=cutoff)
+            if options['dry_run']:
+                self.stdout.write(f'Записей для удаления: {queryset.exclude(action=OrderChange.PRUNED).count()}')
+                return
+
+            # Записи до границы удаляются вместе с прежней меткой pruned,
+            # новая метка получает номер последней удаленной записи
+            deleted, _ = queryset.exclude(action=OrderChange.PRUNED).delete()
+            queryset.delete()
+            OrderChange.objects.create(seq=cutoff, action=OrderChange.PRUNED)
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей журнала изменений: {deleted}'))
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, Sum
+from django.db.models.functions import Cast
+
+from ...models import Order, RevenueLedger, PAID_STATUS
+
+
+# команда пересчитывает журнал выручки с нуля по таблице заказов и сверяет его с сохраненным значением:
+# python manage.py rebuild_revenue_ledger            - пересчитать и сохранить журнал
+# python manage.py rebuild_revenue_ledger --verify   - только сверить, ошибка при расхождении
+class Command(BaseCommand):
+    help = 'Пересчитывает журнал выручки по оплаченным заказам и сверяет его с сохраненным значением'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Только сверить журнал с таблицей заказов, не изменяя его')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Блокируем запись в таблицу заказов, чтобы сумма и журнал были прочитаны согласованно
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {Order._meta.db_table} IN SHARE MODE')
+
+            # Сумма считается так же, как в триггере: с округлением каждого заказа до копеек
+            actual = Order.objects.filter(status=PAID_STATUS).aggregate(
+                total_revenue=Sum(Cast('total_price', output_field=DecimalField(max_digits=16, decimal_places=2))),
+                paid_orders_count=Count('id'),
+            )
+            actual_revenue = actual['total_revenue'] or Decimal('0.00')
+            actual_count = actual['paid_orders_count']
+
+            ledger = RevenueLedger.objects.filter(pk=RevenueLedger.LEDGER_ID).first()
+            stored_revenue = ledger.total_revenue if ledger else Decimal('0.00')
+            stored_count = ledger.paid_orders_count if ledger else 0
+
+            in_sync = ledger is not None and stored_revenue == actual_revenue and stored_count == actual_count
+            if in_sync:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Журнал выручки совпадает с заказами: {actual_revenue} ({actual_count} заказов)'))
+                return
+
+            message = (f'Журнал выручки расходится с заказами: в журнале {stored_revenue} ({stored_count} заказов), '
+                       f'по заказам {actual_revenue} ({actual_count} заказов)')
+            if options['verify']:
+                raise CommandError(message)
+
+            self.stdout.write(self.style.WARNING(message))
+            RevenueLedger.objects.update_or_create(
+                pk=RevenueLedger.LEDGER_ID,
+                defaults={'total_revenue': actual_revenue, 'paid_orders_count': actual_count},
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Журнал выручки пересчитан: {actual_revenue} ({actual_count} заказов)'))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ...models import Order, RevenueRollup, PAID_STATUS
+
+
+# строки сводки, посчитанные по таблице заказов так же, как в триггерах сводки (см. миграцию 0014)
+ROLLUP_SQL = '''
+    SELECT bucket, table_number, sum(orders_count) AS orders_count,
+           sum(paid_orders_count) AS paid_orders_count, sum(revenue) AS revenue
+      FROM (SELECT date_trunc('hour', created_at, 'UTC') AS bucket, table_number,
+                   1 AS orders_count, 0 AS paid_orders_count, 0::numeric AS revenue
+              FROM {orders}
+             UNION ALL
+            SELECT date_trunc('hour', paid_at, 'UTC'), table_number, 0, 1, total_price::numeric(16, 2)
+              FROM {orders}
+             WHERE status = %s AND paid_at IS NOT NULL) AS deltas
+     GROUP BY bucket, table_number
+'''
+
+# строки, которые есть только в одной из сводок; строки с нулевыми значениями не учитываются
+DIFF_SQL = '''
+    SELECT count(*) FROM (
+        (SELECT * FROM ({actual}) AS actual EXCEPT SELECT {columns} FROM {rollup})
+        UNION ALL
+        (SELECT {columns} FROM {rollup}
+          WHERE orders_count <> 0 OR paid_orders_count <> 0 OR revenue <> 0
+         EXCEPT SELECT * FROM ({actual}) AS actual)
+    ) AS diff
+'''
+
+REBUILD_SQL = '''
+    INSERT INTO {rollup} ({columns})
+    {actual}
+'''
+
+
+# команда пересчитывает сводку выручки по часам и столам с нуля по таблице заказов и сверяет ее с сохраненной:
+# python manage.py rebuild_revenue_rollup            - пересчитать и сохранить сводку
+# python manage.py rebuild_revenue_rollup --verify   - только сверить, ошибка при расхождении
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку выручки по часам и столам и сверяет ее с сохраненной'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Только сверить сводку с таблицей заказов, не изменяя ее')
+
+    def handle(self, *args, **options):
+        columns = 'bucket, table_number, orders_count, paid_orders_count, revenue'
+        actual = ROLLUP_SQL.format(orders=Order._meta.db_table)
+        rollup = RevenueRollup._meta.db_table
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Блокируем запись в таблицу заказов, чтобы сводка и заказы были прочитаны согласованно
+            cursor.execute(f'LOCK TABLE {Order._meta.db_table} IN SHARE MODE')
+
+            cursor.execute(DIFF_SQL.format(actual=actual, columns=columns, rollup=rollup), [PAID_STATUS, PAID_STATUS])
+            diff = cursor.fetchone()[0]
+            if not diff:
+                self.stdout.write(self.style.SUCCESS('Сводка выручки совпадает с заказами.'))
+                return
+
+            message = f'Сводка выручки расходится с заказами: строк с расхождением {diff}'
+            if options['verify']:
+                raise CommandError(message)
+
+            self.stdout.write(self.style.WARNING(message))
+            cursor.execute(f'DELETE FROM {rollup}')
+            cursor.execute(REBUILD_SQL.format(rollup=rollup, columns=columns, actual=actual), [PAID_STATUS])
+            self.stdout.write(self.style.SUCCESS(f'Сводка выручки пересчитана: строк {cursor.rowcount}'))
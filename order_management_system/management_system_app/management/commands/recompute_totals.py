@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from ...models import Order, ORDER_STATUSES
+from ...order_cache import order_cache
+
+
+# Итоговая сумма каждого заказа в диапазоне id считается внутри PostgreSQL из jsonb поля items
+# так же, как в Order.save: учитываются словари с числовым ключом price, каждая цена округляется до копеек
+# (половина - от нуля, в Python - validators.round_price), сумма считается без потери точности.
+# Заказы считаются расходящимися, если сохраненная сумма отличается от вычисленной с точностью до копеек.
+TOTALS_SQL = '''
+    SELECT o.id, coalesce(sum(round((e.item ->> 'price')::numeric, 2)), 0) AS total
+      FROM {table} o
+      LEFT JOIN LATERAL jsonb_array_elements(
+                CASE WHEN jsonb_typeof(o.items) = 'array' THEN o.items ELSE '[]'::jsonb END
+           ) AS e(item)
+        ON jsonb_typeof(e.item) = 'object' AND jsonb_typeof(e.item -> 'price') = 'number'
+     WHERE o.id BETWEEN %s AND %s {status_filter}
+     GROUP BY o.id
+    HAVING round(o.total_price::numeric, 2) IS DISTINCT FROM coalesce(sum(round((e.item ->> 'price')::numeric, 2)), 0)
+'''
+
+COUNT_SQL = 'SELECT count(*) FROM ({totals}) AS totals'
+
+UPDATE_SQL = '''
+    UPDATE {table} AS o
+       SET total_price = totals.total::double precision,
+           version = o.version + 1
+      FROM ({totals}) AS totals
+     WHERE o.id = totals.id
+ RETURNING o.id
+'''
+
+
+# команда пересчитывает total_price уже сохраненных заказов по их items одним UPDATE на каждый диапазон id,
+# без загрузки заказов в Python и вызова save() для каждого из них:
+# python manage.py recompute_totals --status оплачено --from-id 1000 --to-id 2000 --dry-run
+class Command(BaseCommand):
+    help = 'Пересчитывает total_price заказов по полю items пакетными запросами UPDATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-id', type=int, help='Начальный id заказа (включительно)')
+        parser.add_argument('--to-id', type=int, help='Конечный id заказа (включительно)')
+        parser.add_argument('--status', choices=ORDER_STATUSES, help='Пересчитать только заказы с этим статусом')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Размер диапазона id, обрабатываемого одним запросом')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать заказы с расходящейся суммой, не изменяя их')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('Размер диапазона должен быть больше 0.')
+
+        # Границы id берем из фильтра, а если они не заданы - из таблицы заказов
+        queryset = Order.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        bounds = queryset.aggregate(min_id=Min('id'), max_id=Max('id'))
+        from_id = options['from_id'] if options['from_id'] is not None else bounds['min_id']
+        to_id = options['to_id'] if options['to_id'] is not None else bounds['max_id']
+        if from_id is None or to_id is None or from_id > to_id:
+            self.stdout.write('Заказы для пересчета не найдены.')
+            return
+
+        totals_sql = TOTALS_SQL.format(table=Order._meta.db_table,
+                                       status_filter='AND o.status = %s' if options['status'] else '')
+        sql = (COUNT_SQL if options['dry_run'] else UPDATE_SQL).format(table=Order._meta.db_table, totals=totals_sql)
+
+        rows = 0
+        for chunk_start in range(from_id, to_id + 1, options['chunk_size']):
+            chunk_end = min(chunk_start + options['chunk_size'] - 1, to_id)
+            params = [chunk_start, chunk_end] + ([options['status']] if options['status'] else [])
+
+            # Каждый диапазон - отдельная короткая транзакция, чтобы не держать блокировки на всю таблицу
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                if options['dry_run']:
+                    rows += cursor.fetchone()[0]
+                else:
+                    # Пересчитанные заказы удаляются из кэша заказов
+                    order_ids = [row[0] for row in cursor.fetchall()]
+                    order_cache.invalidate(order_ids)
+                    rows += len(order_ids)
+
+        if options['dry_run']:
+            self.stdout.write(f'Заказов с расходящейся суммой: {rows}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано заказов: {rows}'))
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+
+# Триггеры пересчитывают журнал выручки в той же транзакции, что и запись в таблицу заказов.
+# Они срабатывают один раз на SQL-оператор и читают только измененные строки (transition tables),
+# поэтому массовый UPDATE статусов обновляет журнал одной записью.
+LEDGER_TRIGGERS_SQL = '''
+CREATE FUNCTION management_system_app_order_revenue_ledger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    revenue_delta numeric := 0;
+    count_delta bigint := 0;
+    rows_revenue numeric;
+    rows_count bigint;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT coalesce(sum(total_price::numeric(16, 2)), 0), count(*)
+          INTO rows_revenue, rows_count
+          FROM old_rows WHERE status = 'оплачено';
+        revenue_delta := revenue_delta - rows_revenue;
+        count_delta := count_delta - rows_count;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT coalesce(sum(total_price::numeric(16, 2)), 0), count(*)
+          INTO rows_revenue, rows_count
+          FROM new_rows WHERE status = 'оплачено';
+        revenue_delta := revenue_delta + rows_revenue;
+        count_delta := count_delta + rows_count;
+    END IF;
+    IF revenue_delta <> 0 OR count_delta <> 0 THEN
+        INSERT INTO management_system_app_revenueledger (id, total_revenue, paid_orders_count)
+        VALUES (1, revenue_delta, count_delta)
+        ON CONFLICT (id) DO UPDATE
+           SET total_revenue = management_system_app_revenueledger.total_revenue + EXCLUDED.total_revenue,
+               paid_orders_count = management_system_app_revenueledger.paid_orders_count + EXCLUDED.paid_orders_count;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER management_system_app_order_revenue_insert
+    AFTER INSERT ON management_system_app_order
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_revenue_ledger();
+
+CREATE TRIGGER management_system_app_order_revenue_update
+    AFTER UPDATE ON management_system_app_order
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_revenue_ledger();
+
+CREATE TRIGGER management_system_app_order_revenue_delete
+    AFTER DELETE ON management_system_app_order
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_revenue_ledger();
+
+INSERT INTO management_system_app_revenueledger (id, total_revenue, paid_orders_count)
+SELECT 1, coalesce(sum(total_price::numeric(16, 2)), 0), count(*)
+  FROM management_system_app_order WHERE status = 'оплачено';
+'''
+
+DROP_LEDGER_TRIGGERS_SQL = '''
+DROP TRIGGER management_system_app_order_revenue_insert ON management_system_app_order;
+DROP TRIGGER management_system_app_order_revenue_update ON management_system_app_order;
+DROP TRIGGER management_system_app_order_revenue_delete ON management_system_app_order;
+DROP FUNCTION management_system_app_order_revenue_ledger();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0008_alter_order_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, help_text='Сумма total_price всех заказов со статусом “оплачено”', max_digits=16)),
+                ('paid_orders_count', models.BigIntegerField(default=0, help_text='Количество заказов со статусом “оплачено”')),
+            ],
+        ),
+        migrations.RunSQL(LEDGER_TRIGGERS_SQL, DROP_LEDGER_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:21
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # индексы строятся конкурентно, чтобы не блокировать запись в таблицу заказов на время миграции
+    atomic = False
+
+    dependencies = [
+        ('management_system_app', '0009_revenueledger'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['table_number'], name='order_table_number_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['status', 'id'], name='order_status_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'оплачено'), _negated=True), fields=['status', 'id'], name='order_open_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Ограничение внешнего ключа с каскадным удалением на стороне БД
+# и перенос позиций уже существующих заказов из поля items
+ORDER_ITEMS_SQL = '''
+ALTER TABLE management_system_app_orderitem
+    ADD CONSTRAINT management_system_app_orderitem_order_id_fk
+    FOREIGN KEY (order_id) REFERENCES management_system_app_order (id)
+    ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED;
+
+INSERT INTO management_system_app_orderitem (order_id, position, price)
+SELECT o.id, coalesce(e.item ->> 'position', ''), round((e.item ->> 'price')::numeric, 2)::double precision
+  FROM management_system_app_order o
+ CROSS JOIN LATERAL jsonb_array_elements(
+           CASE WHEN jsonb_typeof(o.items) = 'array' THEN o.items ELSE '[]'::jsonb END
+       ) WITH ORDINALITY AS e(item, n)
+ WHERE jsonb_typeof(e.item) = 'object' AND jsonb_typeof(e.item -> 'price') = 'number'
+ ORDER BY o.id, e.n;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0010_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.TextField(help_text='Название блюда')),
+                ('price', models.FloatField(help_text='Цена блюда')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='order_items', to='management_system_app.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['position'], name='orderitem_position_idx')],
+            },
+        ),
+        migrations.RunSQL(ORDER_ITEMS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0011_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(db_default=1, default=1, help_text='Версия заказа, увеличивается при каждом изменении заказа'),
+        ),
+    ]
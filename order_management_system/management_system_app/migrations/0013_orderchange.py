@@ -0,0 +1,84 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:41
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+# Триггеры записывают каждое изменение заказов в журнал изменений в той же транзакции.
+# Как и триггеры журнала выручки, они срабатывают один раз на SQL-оператор и читают только измененные
+# строки (transition tables). UPDATE, который не изменил строку (например, тот же статус), не записывается.
+# Перед выдачей номеров берется транзакционная advisory-блокировка: она держится до конца транзакции,
+# поэтому записи журнала становятся видимыми строго в порядке seq.
+# Триггеры журнала срабатывают раньше триггеров выручки (по имени), поэтому блокировки всегда
+# берутся в одном порядке: сначала advisory-блокировка, затем строка журнала выручки.
+ORDER_CHANGES_TRIGGERS_SQL = '''
+CREATE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('management_system_app_orderchange'));
+
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                 'total_price', total_price, 'status', status, 'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT n.id, 'updated', jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                                   'total_price', n.total_price, 'status', n.status,
+                                                   'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER management_system_app_order_changes_insert
+    AFTER INSERT ON management_system_app_order
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_changes();
+
+CREATE TRIGGER management_system_app_order_changes_update
+    AFTER UPDATE ON management_system_app_order
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_changes();
+
+CREATE TRIGGER management_system_app_order_changes_delete
+    AFTER DELETE ON management_system_app_order
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_changes();
+'''
+
+DROP_ORDER_CHANGES_TRIGGERS_SQL = '''
+DROP TRIGGER management_system_app_order_changes_insert ON management_system_app_order;
+DROP TRIGGER management_system_app_order_changes_update ON management_system_app_order;
+DROP TRIGGER management_system_app_order_changes_delete ON management_system_app_order;
+DROP FUNCTION management_system_app_order_changes();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0012_order_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderChange',
+            fields=[
+                ('seq', models.BigAutoField(help_text='Порядковый номер изменения', primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField(help_text='ID измененного заказа', null=True)),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted'), ('pruned', 'pruned')], help_text='Тип изменения', max_length=10)),
+                ('data', models.JSONField(help_text='Заказ после изменения, для удаленного заказа - null', null=True)),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), help_text='Время записи изменения')),
+            ],
+        ),
+        migrations.RunSQL(ORDER_CHANGES_TRIGGERS_SQL, DROP_ORDER_CHANGES_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,150 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:46
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+# Время оплаты ставит триггер BEFORE на каждую строку, поэтому paid_at заполняется при любом способе записи
+# (Order.save, queryset.update(), команды обслуживания). Явно переданное время оплаты сохраняется,
+# а NULL из устаревшего экземпляра заказа не стирает время уже оплаченного заказа.
+PAID_AT_TRIGGER_SQL = '''
+CREATE FUNCTION management_system_app_order_paid_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.status <> 'оплачено' THEN
+        NEW.paid_at := NULL;
+    ELSIF TG_OP = 'UPDATE' AND OLD.status = 'оплачено' THEN
+        NEW.paid_at := coalesce(NEW.paid_at, OLD.paid_at);
+    ELSE
+        NEW.paid_at := coalesce(NEW.paid_at, statement_timestamp());
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER management_system_app_order_paid_at
+    BEFORE INSERT OR UPDATE OF status, paid_at ON management_system_app_order
+    FOR EACH ROW EXECUTE FUNCTION management_system_app_order_paid_at();
+'''
+
+DROP_PAID_AT_TRIGGER_SQL = '''
+DROP TRIGGER management_system_app_order_paid_at ON management_system_app_order;
+DROP FUNCTION management_system_app_order_paid_at();
+'''
+
+# Время создания и оплаты уже существующих заказов неизвестно: берется время миграции.
+# Заполнение paid_at не меняет данные заказов для клиентов, поэтому не записывается в журнал изменений
+BACKFILL_PAID_AT_SQL = '''
+ALTER TABLE management_system_app_order DISABLE TRIGGER management_system_app_order_changes_update;
+UPDATE management_system_app_order SET paid_at = created_at WHERE status = 'оплачено';
+ALTER TABLE management_system_app_order ENABLE TRIGGER management_system_app_order_changes_update;
+'''
+
+# Триггеры сводки, как и триггеры журнала выручки, срабатывают один раз на SQL-оператор и читают только
+# измененные строки (transition tables): новые строки добавляются в сводку, прежние вычитаются.
+# Запрос собирается динамически, потому что в INSERT нет old_rows, а в DELETE - new_rows.
+# Строки сводки изменяются в порядке ключа, чтобы параллельные транзакции не блокировали друг друга навстречу.
+# Триггеры сводки срабатывают после триггеров журнала изменений и журнала выручки (по имени).
+ROLLUP_TRIGGERS_SQL = '''
+CREATE FUNCTION management_system_app_order_revenue_rollup() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed_rows text;
+BEGIN
+    changed_rows := concat_ws(' UNION ALL ',
+        CASE WHEN TG_OP IN ('INSERT', 'UPDATE') THEN 'SELECT 1 AS sign, * FROM new_rows' END,
+        CASE WHEN TG_OP IN ('UPDATE', 'DELETE') THEN 'SELECT -1 AS sign, * FROM old_rows' END);
+
+    EXECUTE 'WITH changed AS (' || changed_rows || ')
+        INSERT INTO management_system_app_revenuerollup AS r
+               (bucket, table_number, orders_count, paid_orders_count, revenue)
+        SELECT bucket, table_number, sum(orders_count), sum(paid_orders_count), sum(revenue)
+          FROM (SELECT date_trunc(''hour'', created_at, ''UTC'') AS bucket, table_number,
+                       sign AS orders_count, 0 AS paid_orders_count, 0::numeric AS revenue
+                  FROM changed
+                 UNION ALL
+                SELECT date_trunc(''hour'', paid_at, ''UTC''), table_number,
+                       0, sign, sign * total_price::numeric(16, 2)
+                  FROM changed
+                 WHERE status = ''оплачено'' AND paid_at IS NOT NULL) AS deltas
+         GROUP BY bucket, table_number
+        HAVING sum(orders_count) <> 0 OR sum(paid_orders_count) <> 0 OR sum(revenue) <> 0
+         ORDER BY bucket, table_number
+        ON CONFLICT (bucket, table_number) DO UPDATE
+           SET orders_count = r.orders_count + EXCLUDED.orders_count,
+               paid_orders_count = r.paid_orders_count + EXCLUDED.paid_orders_count,
+               revenue = r.revenue + EXCLUDED.revenue';
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER management_system_app_order_rollup_insert
+    AFTER INSERT ON management_system_app_order
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_revenue_rollup();
+
+CREATE TRIGGER management_system_app_order_rollup_update
+    AFTER UPDATE ON management_system_app_order
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_revenue_rollup();
+
+CREATE TRIGGER management_system_app_order_rollup_delete
+    AFTER DELETE ON management_system_app_order
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION management_system_app_order_revenue_rollup();
+
+INSERT INTO management_system_app_revenuerollup (bucket, table_number, orders_count, paid_orders_count, revenue)
+SELECT bucket, table_number, sum(orders_count), sum(paid_orders_count), sum(revenue)
+  FROM (SELECT date_trunc('hour', created_at, 'UTC') AS bucket, table_number,
+               1 AS orders_count, 0 AS paid_orders_count, 0::numeric AS revenue
+          FROM management_system_app_order
+         UNION ALL
+        SELECT date_trunc('hour', paid_at, 'UTC'), table_number, 0, 1, total_price::numeric(16, 2)
+          FROM management_system_app_order
+         WHERE status = 'оплачено' AND paid_at IS NOT NULL) AS deltas
+ GROUP BY bucket, table_number;
+'''
+
+DROP_ROLLUP_TRIGGERS_SQL = '''
+DROP TRIGGER management_system_app_order_rollup_insert ON management_system_app_order;
+DROP TRIGGER management_system_app_order_rollup_update ON management_system_app_order;
+DROP TRIGGER management_system_app_order_rollup_delete ON management_system_app_order;
+DROP FUNCTION management_system_app_order_revenue_rollup();
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0013_orderchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), help_text='Время создания заказа'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Время оплаты заказа, только для заказов со статусом “оплачено”', null=True),
+        ),
+        migrations.RunSQL(BACKFILL_PAID_AT_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(PAID_AT_TRIGGER_SQL, DROP_PAID_AT_TRIGGER_SQL),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Начало часа (UTC)')),
+                ('table_number', models.IntegerField(help_text='Номер стола')),
+                ('orders_count', models.BigIntegerField(default=0, help_text='Количество заказов, созданных за час')),
+                ('paid_orders_count', models.BigIntegerField(default=0, help_text='Количество заказов, оплаченных за час')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Сумма total_price заказов, оплаченных за час', max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'table_number'), name='revenuerollup_bucket_table_uniq')],
+            },
+        ),
+        migrations.RunSQL(ROLLUP_TRIGGERS_SQL, DROP_ROLLUP_TRIGGERS_SQL),
+    ]
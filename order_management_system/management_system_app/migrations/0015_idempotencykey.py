@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:04
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0014_order_timestamps_revenuerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='Значение заголовка Idempotency-Key', max_length=255, unique=True)),
+                ('fingerprint', models.CharField(help_text='SHA-256 от метода, пути и тела запроса, выполненного с этим ключом', max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(help_text='Код сохраненного ответа', null=True)),
+                ('response_body', models.BinaryField(help_text='Тело сохраненного ответа', null=True)),
+                ('response_headers', models.JSONField(default=dict, help_text='Заголовки сохраненного ответа (Content-Type, ETag)')),
+                ('created_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), help_text='Время первого запроса с этим ключом')),
+                ('expires_at', models.DateTimeField(help_text='Время, после которого ключ можно использовать заново')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='idempotencykey_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:20
+
+from django.db import migrations
+
+
+# Триггеры журнала изменений больше не берут общую advisory-блокировку: она выстраивала в очередь
+# все транзакции с изменениями заказов до их фиксации. Номера seq по-прежнему выдает последовательность,
+# но транзакции могут фиксироваться не в порядке номеров. Поэтому порядок обеспечивают читатели журнала:
+# перед чтением они ждут завершения транзакций, которые уже записали изменения (см. OrderChange.lock_committed).
+ORDER_CHANGES_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                 'total_price', total_price, 'status', status, 'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT n.id, 'updated', jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                                   'total_price', n.total_price, 'status', n.status,
+                                                   'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+'''
+
+ORDER_CHANGES_LOCKING_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('management_system_app_orderchange'));
+
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                 'total_price', total_price, 'status', status, 'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT n.id, 'updated', jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                                   'total_price', n.total_price, 'status', n.status,
+                                                   'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0015_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ORDER_CHANGES_FUNCTION_SQL, ORDER_CHANGES_LOCKING_FUNCTION_SQL),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+# Триггеры журнала изменений записывают еще и тип события для экранов кухни и зала:
+# поток событий (events.py) строится по журналу, поэтому видит изменения, сделанные любым процессом.
+# Тип изменения заказа определяется так же, как раньше в Python: смена статуса важнее смены позиций
+ORDER_CHANGES_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT id, 'deleted', 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT id, 'created', 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                            'total_price', total_price, 'status', status,
+                                                            'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT n.id, 'updated',
+               CASE WHEN n.status IS DISTINCT FROM o.status THEN 'status_changed'
+                    WHEN n.items IS DISTINCT FROM o.items THEN 'items_changed'
+                    ELSE 'updated' END,
+               jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                  'total_price', n.total_price, 'status', n.status, 'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+'''
+
+ORDER_CHANGES_WITHOUT_EVENT_TYPE_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT id, 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                 'total_price', total_price, 'status', status, 'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, data)
+        SELECT n.id, 'updated', jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                                   'total_price', n.total_price, 'status', n.status,
+                                                   'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0016_orderchange_without_advisory_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderchange',
+            name='event_type',
+            field=models.CharField(blank=True, default='', help_text='Тип события для экранов кухни и зала (см. events.py), у метки pruned - пустой', max_length=20),
+        ),
+        migrations.RunSQL(ORDER_CHANGES_FUNCTION_SQL, ORDER_CHANGES_WITHOUT_EVENT_TYPE_FUNCTION_SQL),
+    ]
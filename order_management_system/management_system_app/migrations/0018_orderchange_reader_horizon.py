@@ -0,0 +1,92 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:10
+
+from django.db import migrations
+
+
+# Читатели журнала изменений больше не берут LOCK TABLE: блокировка SHARE ставила новых писателей в очередь
+# за читателем, который сам ждал долгую транзакцию. Вместо этого транзакция при первой записи в журнал
+# берет разделяемую advisory-блокировку с номером последнего выданного seq (нижней границей своих номеров).
+# Разделяемые advisory-блокировки друг с другом не конфликтуют, а читатели блокировок не берут вовсе -
+# они только смотрят pg_locks и отдают записи не дальше самой младшей границы (см. OrderChange.committed).
+# Ключ блокировки: (1329790976 | старшие биты границы, младшие 31 бит границы), см. ORDER_CHANGES_FLOOR_NAMESPACE
+ORDER_CHANGES_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    floor_seq bigint;
+BEGIN
+    IF coalesce(current_setting('management_system_app.order_changes_floor', true), '') = '' THEN
+        floor_seq := coalesce(pg_sequence_last_value(
+            pg_get_serial_sequence('management_system_app_orderchange', 'seq')), 0);
+        PERFORM pg_advisory_xact_lock_shared((1329790976 | (floor_seq >> 31))::integer,
+                                             (floor_seq & 2147483647)::integer);
+        PERFORM set_config('management_system_app.order_changes_floor', floor_seq::text, true);
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT id, 'deleted', 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT id, 'created', 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                            'total_price', total_price, 'status', status,
+                                                            'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT n.id, 'updated',
+               CASE WHEN n.status IS DISTINCT FROM o.status THEN 'status_changed'
+                    WHEN n.items IS DISTINCT FROM o.items THEN 'items_changed'
+                    ELSE 'updated' END,
+               jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                  'total_price', n.total_price, 'status', n.status, 'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+'''
+
+ORDER_CHANGES_WITHOUT_FLOOR_FUNCTION_SQL = '''
+CREATE OR REPLACE FUNCTION management_system_app_order_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT id, 'deleted', 'deleted', NULL FROM old_rows ORDER BY id;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT id, 'created', 'created', jsonb_build_object('id', id, 'table_number', table_number, 'items', items,
+                                                            'total_price', total_price, 'status', status,
+                                                            'version', version)
+          FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO management_system_app_orderchange (order_id, action, event_type, data)
+        SELECT n.id, 'updated',
+               CASE WHEN n.status IS DISTINCT FROM o.status THEN 'status_changed'
+                    WHEN n.items IS DISTINCT FROM o.items THEN 'items_changed'
+                    ELSE 'updated' END,
+               jsonb_build_object('id', n.id, 'table_number', n.table_number, 'items', n.items,
+                                  'total_price', n.total_price, 'status', n.status, 'version', n.version)
+          FROM new_rows n
+          JOIN old_rows o ON o.id = n.id
+         WHERE (n.*) IS DISTINCT FROM (o.*)
+         ORDER BY n.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management_system_app', '0017_orderchange_event_type'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ORDER_CHANGES_FUNCTION_SQL, ORDER_CHANGES_WITHOUT_FLOOR_FUNCTION_SQL),
+    ]
@@ -1,14 +1,119 @@
+from decimal import Decimal
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Q, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Now
+from django.db.models.sql import UpdateQuery
 from django.core.validators import MinValueValidator
 
+from .order_cache import order_cache
+from .validators import round_price, validate_order_items
+
 # Create your models here.
 
+# допустимые статусы заказа
+ORDER_STATUSES = ['в ожидании', 'готово', 'оплачено']
+
+# статус оплаченного заказа, только такие заказы учитываются в выручке
+PAID_STATUS = 'оплачено'
+
 # дефолтное значение для поля с позициями заказа, которое можно вызвать для каждого экземпляра заказа
 def default_items():
     return [{"position": "Блюдо", "price": 199.99}]
 
 
+# общая стоимость заказа: сумма цен всех позиций, каждая цена округляется до копеек.
+# Сумма считается в Decimal, чтобы совпадать с суммой numeric в SQL (см. команду recompute_totals)
+def calculate_total_price(items):
+    total_price = Decimal(0)
+
+    # Проверяем, что items является списком, иначе сумма равна 0
+    if isinstance(items, list):
+        for order_dict in items:
+            # Проверяем, что каждый объект списка является словарем и содержит ключ 'price'
+            if isinstance(order_dict, dict) and 'price' in order_dict:
+                total_price += round_price(order_dict['price'])
+    return float(total_price)
+
+
+# значения для изменения статуса заказа: версия увеличивается, только если статус действительно меняется
+def status_update_values(status):
+    return {'status': status, 'version': Case(When(status=status, then=F('version')), default=F('version') + 1)}
+
+
+# UPDATE ... RETURNING по queryset: список кортежей со значениями полей fields после изменения.
+# QuerySet.update() в Django не поддерживает RETURNING, поэтому SQL берется у компилятора UpdateQuery,
+# а значения приводятся к python-типам конвертерами полей, как при обычной выборке (например, JSON из items).
+# Это внутренний API ORM: поведение проверено на Django 5.1 (UpdateReturningRowsTestCase),
+# при обновлении Django этот тест нужно прогнать первым
+def update_returning_rows(queryset, values, fields):
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    query.annotations = {}
+    compiler = query.get_compiler(queryset.db)
+    compiler.pre_sql_setup()
+    sql, params = compiler.as_sql()
+
+    connection = connections[queryset.db]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with transaction.mark_for_rollback_on_error(using=queryset.db), connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {columns}', params)
+        rows = cursor.fetchall()
+
+    converters = [(index, field, field.get_db_converters(connection)) for index, field in enumerate(fields)]
+    converters = [converter for converter in converters if converter[2]]
+    if not converters:
+        return rows
+    result = []
+    for row in rows:
+        row = list(row)
+        for index, field, field_converters in converters:
+            for converter in field_converters:
+                row[index] = converter(row[index], field, connection)
+        result.append(tuple(row))
+    return result
+
+
+# queryset заказов: любое массовое изменение через update() увеличивает версию измененных заказов,
+# а изменение и удаление заказов удаляют их из кэша (см. order_cache.py).
+# События для экранов кухни и зала строятся по журналу изменений OrderChange (см. events.py)
+class OrderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Как и QuerySet.update(), возвращает количество измененных строк: тот же запрос UPDATE
+        # возвращает только id измененных заказов, по ним удаляются записи кэша
+        return len(self._update_rows(kwargs, [self.model._meta.pk]))
+
+    # update() одним запросом UPDATE ... RETURNING: возвращает список измененных заказов,
+    # поэтому после изменения не нужен отдельный SELECT для ответа
+    def update_returning(self, **kwargs):
+        fields = self.model._meta.concrete_fields
+        field_names = [field.attname for field in fields]
+        return [self.model.from_db(self.db, field_names, row) for row in self._update_rows(kwargs, fields)]
+
+    # UPDATE ... RETURNING fields с увеличением версии измененных заказов, которые затем удаляются из кэша
+    def _update_rows(self, values, fields):
+        self._not_support_combined_queries('update')
+        if self.query.is_sliced:
+            raise TypeError('Cannot update a query once a slice has been taken.')
+        values.setdefault('version', F('version') + 1)
+
+        rows = update_returning_rows(self, values, fields)
+        self._result_cache = None
+        pk_index = list(fields).index(self.model._meta.pk)
+        order_cache.invalidate([row[pk_index] for row in rows], using=self.db)
+        return rows
+
+    def delete(self):
+        # Для удаления из кэша нужны только id удаляемых заказов
+        with transaction.atomic(using=self.db):
+            order_ids = list(self.values_list('id', flat=True))
+            result = super().delete()
+            order_cache.invalidate(order_ids, using=self.db)
+        return result
+
+
 class Order(models.Model):
     # Поле id создается автоматически
     table_number = models.IntegerField(help_text='Номер стола, например: 1, 2, 3...',
@@ -27,48 +132,281 @@ class Order(models.Model):
     status = models.CharField(default='в ожидании', max_length=50,
                               help_text='Статус заказа: “в ожидании”, “готово”, “оплачено”')
 
+    version = models.PositiveIntegerField(default=1, db_default=1,
+                                          help_text='Версия заказа, увеличивается при каждом изменении заказа')
+
+    created_at = models.DateTimeField(db_default=Now(), help_text='Время создания заказа')
+
+    # время оплаты ставится триггером PostgreSQL при переходе заказа в статус “оплачено” любым способом записи
+    # и сбрасывается, если заказ уходит из этого статуса (см. миграцию 0014)
+    paid_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                   help_text='Время оплаты заказа, только для заказов со статусом “оплачено”')
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # поиск заказов по номеру стола (order_list?table_number=, поиск заказа в веб-интерфейсе)
+            models.Index(fields=['table_number'], name='order_table_number_idx'),
+            # фильтр по статусу и keyset-пагинация с сортировкой по статусу
+            models.Index(fields=['status', 'id'], name='order_status_id_idx'),
+            # неоплаченные заказы - рабочий набор кухни, он намного меньше всей истории заказов
+            models.Index(fields=['status', 'id'], condition=~Q(status=PAID_STATUS), name='order_open_status_id_idx'),
+        ]
+
+    # заказ по id через кэш заказов, None - если заказа нет. В кэше хранятся значения полей заказа,
+    # поэтому подходит любой бэкенд кэша Django; запись удаляется при каждом изменении или удалении заказа
+    @classmethod
+    def get_cached(cls, pk):
+        fields = [field.attname for field in cls._meta.concrete_fields]
+        values = order_cache.get(int(pk), lambda pk: cls.objects.filter(pk=pk).values(*fields).first())
+        if values is None:
+            return None
+        return cls.from_db(cls.objects.db, fields, [values[field] for field in fields])
+
     # переопределение метода clean для валидации поля items
     def clean(self):
         super().clean()  # Вызываем родительский метод clean
 
-        # Проверяем, что items является списком
-        if not isinstance(self.items, list):
-            raise ValidationError({'items': 'Поле items должно быть списком.'})
+        # Проверяем items и сразу получаем общую стоимость заказа, чтобы save не проходил по списку повторно
+        try:
+            items, total_price = validate_order_items(self.items)
+        except ValidationError as error:
+            raise ValidationError({'items': error.messages})
+        self.set_items(items, total_price)
 
-        # Проверяем каждый элемент списка
-        for item in self.items:
-            if not isinstance(item, dict):
-                raise ValidationError({'items': 'Каждый элемент items должен быть словарём.'})
+    # установка уже проверенного списка позиций вместе с посчитанной общей стоимостью
+    def set_items(self, items, total_price):
+        self.items = items
+        self._validated_items = (items, total_price)
 
-            # Проверяем, что в словаре ровно два ключа
-            if len(item) != 2:
-                raise ValidationError({'items': 'Каждый элемент items должен содержать ровно два ключа: "position" и "price".'})
+    # переопределение метода save для пересчёта итоговой суммы заказа
+    def save(self, *args, **kwargs):
+        # Если items уже проверены валидатором, берем посчитанную им сумму,
+        # иначе вычисляем общую сумму заказа на основе элементов items
+        validated_items = getattr(self, '_validated_items', None)
+        if validated_items is not None and validated_items[0] is self.items:
+            self.total_price = validated_items[1]
+        else:
+            self.total_price = calculate_total_price(self.items)
 
-            # Проверяем наличие и тип ключей
-            if 'position' not in item or not isinstance(item['position'], str):
-                raise ValidationError({'items': 'Каждый элемент items должен содержать ключ "position", а значение должно быть в строковом представлении.'})
-            if 'price' not in item or not isinstance(item['price'], (int, float)):
-                raise ValidationError({'items': 'Каждый элемент items должен содержать ключ "price", а значение должно быть в числовом представлении.'})
+        # Позиции заказа пересохраняются, только если сохраняется поле items
+        update_fields = kwargs.get('update_fields')
+        sync_items = update_fields is None or 'items' in update_fields
+        adding = self._state.adding
 
+        # Каждое сохранение существующего заказа увеличивает его версию. Версия увеличивается в самой БД:
+        # экземпляр мог устареть, пока заказ меняли другие запросы, и его версия уже выдана
+        bump_version = not adding and (update_fields is None or update_fields)
+        if bump_version:
+            self.version = F('version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version'}
 
-    # переопределение метода save для пересчёта итоговой суммы заказа
-    def save(self, *args, **kwargs):
-        # Сбрасываем total_price перед вычислением
-        self.total_price = 0.0
-
-        # Проверяем, что self.items является списком и не пуст
-        if isinstance(self.items, list) and self.items:
-            if self.items:
-                for order_dict in self.items:
-                    # Проверяем, что каждый объект списка является словарем и содержит ключ 'price'
-                    if isinstance(order_dict, dict) and 'price' in order_dict:
-                        # Вычисляем общую сумму заказа на основе элементов items
-                        self.total_price += round(float(order_dict['price']), 2)
-            else:
-                self.total_price = 0  # Если items пуст, сумма равна 0
-
-        # Вызываем оригинальный метод save()
-        super().save(*args, **kwargs)
+        with transaction.atomic(using=kwargs.get('using')):
+            # Вызываем оригинальный метод save()
+            super().save(*args, **kwargs)
+            if bump_version:
+                self.refresh_from_db(using=kwargs.get('using'), fields=['version'])
+            if sync_items:
+                self.sync_order_items(replace=not adding)
+
+            if not adding:
+                order_cache.invalidate([self.id], using=kwargs.get('using'))
+
+    def delete(self, *args, **kwargs):
+        order_id = self.id
+        with transaction.atomic(using=kwargs.get('using')):
+            result = super().delete(*args, **kwargs)
+            order_cache.invalidate([order_id], using=kwargs.get('using'))
+        return result
+
+    # синхронизация строк таблицы OrderItem с полем items
+    def sync_order_items(self, replace=True):
+        if replace:
+            # Удаляем прежние позиции одним запросом DELETE
+            OrderItem.objects.filter(order_id=self.id).delete()
+        OrderItem.objects.bulk_create(OrderItem.from_order(self))
+
+    def __str__(self):
+        return f'Стол номер {self.table_number}; заказы: {self.items}'
+
+
+# Позиция заказа: нормализованная копия одного элемента поля Order.items.
+# Строки создаются и заменяются вместе с заказом, поэтому суммы и статистику по блюдам
+# можно считать агрегатами SQL, не разбирая JSON каждого заказа в Python, например:
+# OrderItem.objects.values('position').annotate(count=Count('id'), revenue=Sum('price'))
+class OrderItem(models.Model):
+    # ограничение внешнего ключа создается вручную с ON DELETE CASCADE (см. миграцию 0011),
+    # поэтому удаление заказов выполняется одним запросом DELETE без выборки позиций в Python
+    order = models.ForeignKey(Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='order_items')
+    position = models.TextField(help_text='Название блюда')
+    price = models.FloatField(help_text='Цена блюда')
+
+    class Meta:
+        indexes = [
+            # статистика и поиск по блюдам
+            models.Index(fields=['position'], name='orderitem_position_idx'),
+        ]
+
+    # строки позиций для заказа, в том же порядке, что и в items
+    @classmethod
+    def from_order(cls, order):
+        if not isinstance(order.items, list):
+            return []
+        # Как и при расчете total_price, учитываются только словари с ключом 'price'
+        return [cls(order_id=order.id, position=str(item.get('position', '')), price=float(round_price(item['price'])))
+                for item in order.items if isinstance(item, dict) and 'price' in item]
+
+    def __str__(self):
+        return f'{self.position}: {self.price}'
+
+
+# Журнал выручки: одна строка с суммой и количеством оплаченных заказов.
+# Строка поддерживается триггерами PostgreSQL на таблице заказов (см. миграцию 0009), поэтому
+# она корректируется в той же транзакции при любом способе записи: Order.save, queryset.update()
+# и удалении. Пересчитать журнал с нуля можно командой rebuild_revenue_ledger.
+class RevenueLedger(models.Model):
+    # журнал хранится в единственной строке с этим id
+    LEDGER_ID = 1
+
+    total_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                        help_text='Сумма total_price всех заказов со статусом “оплачено”')
+    paid_orders_count = models.BigIntegerField(default=0,
+                                               help_text='Количество заказов со статусом “оплачено”')
+
+    @classmethod
+    def get_total_revenue(cls):
+        # Читаем выручку одним запросом по первичному ключу
+        total_revenue = cls.objects.filter(pk=cls.LEDGER_ID).values_list('total_revenue', flat=True).first()
+
+        # Если строки журнала еще нет, значит и оплаченных заказов нет
+        if total_revenue is None:
+            return 0
+        return float(total_revenue)
+
+    @classmethod
+    async def aget_total_revenue(cls):
+        # То же для асинхронных представлений
+        try:
+            ledger = await cls.objects.only('total_revenue').aget(pk=cls.LEDGER_ID)
+        except cls.DoesNotExist:
+            return 0
+        return float(ledger.total_revenue)
+
+    def __str__(self):
+        return f'Выручка: {self.total_revenue}; оплаченных заказов: {self.paid_orders_count}'
+
+
+# Журнал изменений заказов (outbox) для инкрементальной синхронизации планшетов (api/v1/changes/?since=<seq>)
+# и потока событий для экранов кухни и зала (см. events.py).
+# Строки добавляются триггерами PostgreSQL на таблице заказов (см. миграцию 0013) в той же транзакции,
+# что и изменение заказа, при любом способе записи, включая SQL-команды обслуживания.
+# Номера seq выдает последовательность без общей блокировки, поэтому транзакции с изменениями заказов
+# могут фиксироваться не в порядке своих номеров. Чтобы клиент, прочитавший seq N, не пропустил запись
+# с меньшим номером, журнал читается только через committed (см. latest_seq и read_since).
+# Старые записи удаляются командой prune_order_changes, вместо них остается одна запись-метка pruned.
+# Старшие 16 бит первого ключа advisory-блокировки, которую берет транзакция при первой записи в журнал
+# (см. миграцию 0018). Второй ключ - младшие 31 бит границы, остальные ее биты - в младших 16 битах первого ключа
+ORDER_CHANGES_FLOOR_NAMESPACE = 0x4F430000
+
+# граница окончательных номеров журнала: самая младшая граница незавершенных транзакций других соединений
+ORDER_CHANGES_HORIZON_SQL = f'''
+SELECT coalesce(min(((classid::bigint & 65535) << 31) | objid::bigint), 9223372036854775807)
+  FROM pg_locks
+ WHERE locktype = 'advisory' AND objsubid = 2 AND (classid::bigint & 4294901760) = {ORDER_CHANGES_FLOOR_NAMESPACE}
+   AND pid IS DISTINCT FROM pg_backend_pid()
+'''
+
+
+class OrderChange(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    PRUNED = 'pruned'
+
+    seq = models.BigAutoField(primary_key=True, help_text='Порядковый номер изменения')
+    order_id = models.BigIntegerField(null=True, help_text='ID измененного заказа')
+    action = models.CharField(max_length=10, choices=[(CREATED, CREATED), (UPDATED, UPDATED),
+                                                      (DELETED, DELETED), (PRUNED, PRUNED)],
+                              help_text='Тип изменения')
+    data = models.JSONField(null=True, help_text='Заказ после изменения, для удаленного заказа - null')
+    event_type = models.CharField(max_length=20, blank=True, default='',
+                                  help_text='Тип события для экранов кухни и зала (см. events.py), '
+                                            'у метки pruned - пустой')
+    created_at = models.DateTimeField(db_default=Now(), help_text='Время записи изменения')
+
+    # записи, номера которых уже окончательны: незавершенные транзакции получат только номера больше этих.
+    # Граница - самая младшая advisory-блокировка писателей из pg_locks (см. миграцию 0018), свои незавершенные
+    # записи читателю видны и так. Одним запросом: снимок данных берется раньше, чем читается pg_locks,
+    # поэтому писатель, которого еще нет в pg_locks, получит номер больше всех видимых записей.
+    # Читатель ничего не ждет и никого не блокирует, записи незавершенных транзакций он отдаст следующим запросом
+    @classmethod
+    def committed(cls):
+        return cls.objects.filter(seq__lte=RawSQL(ORDER_CHANGES_HORIZON_SQL, ()))
+
+    # номер последней окончательной записи журнала, 0 - если таких записей нет
+    @classmethod
+    def latest_seq(cls):
+        return cls.committed().aggregate(seq=models.Max('seq'))['seq'] or 0
+
+    # записи журнала после since по порядку seq: (seq, action, order_id, data, event_type), не больше limit + 1,
+    # чтобы по лишней записи понять, что есть еще изменения
+    @classmethod
+    def read_since(cls, since, limit):
+        return list(cls.committed().filter(seq__gt=since).order_by('seq')
+                    .values_list('seq', 'action', 'order_id', 'data', 'event_type')[:limit + 1])
+
+    def __str__(self):
+        return f'{self.seq}: {self.action} {self.order_id}'
+
+
+# Сводка выручки и количества заказов по часам и столам для отчетов api/v1/revenue/.
+# Строки поддерживаются триггерами PostgreSQL на таблице заказов (см. миграцию 0014) так же,
+# как журнал выручки: в той же транзакции и при любом способе записи. Количество заказов считается
+# по часу создания заказа, выручка и количество оплаченных заказов - по часу оплаты (paid_at).
+# Часы хранятся в UTC, поэтому отчеты по дням можно строить в любом часовом поясе с целым смещением.
+# Пересчитать сводку с нуля можно командой rebuild_revenue_rollup.
+class RevenueRollup(models.Model):
+    bucket = models.DateTimeField(help_text='Начало часа (UTC)')
+    table_number = models.IntegerField(help_text='Номер стола')
+    orders_count = models.BigIntegerField(default=0, help_text='Количество заказов, созданных за час')
+    paid_orders_count = models.BigIntegerField(default=0, help_text='Количество заказов, оплаченных за час')
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0,
+                                  help_text='Сумма total_price заказов, оплаченных за час')
+
+    class Meta:
+        constraints = [
+            # ключ для INSERT ... ON CONFLICT в триггере; по этому же индексу выбирается диапазон часов
+            models.UniqueConstraint(fields=['bucket', 'table_number'], name='revenuerollup_bucket_table_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.bucket}, стол {self.table_number}: {self.revenue} ({self.paid_orders_count} оплачено)'
+
+
+# Ключи идемпотентности (заголовок Idempotency-Key) запросов на запись и сохраненные ответы на них:
+# повтор запроса с тем же ключом получает сохраненный ответ, а сам запрос не выполняется повторно
+# (см. management_system_app/idempotency.py). Запись с ключом создается в той же транзакции, что и изменения
+# заказов, поэтому ключ без ответа другим запросам не виден. Просроченные ключи удаляет команда
+# prune_idempotency_keys, до этого их может занять новый запрос с тем же ключом.
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255, unique=True, help_text='Значение заголовка Idempotency-Key')
+    fingerprint = models.CharField(max_length=64,
+                                   help_text='SHA-256 от метода, пути и тела запроса, выполненного с этим ключом')
+    status_code = models.PositiveSmallIntegerField(null=True, help_text='Код сохраненного ответа')
+    # тело ответа хранится уже отрендеренным: jsonb не сохраняет порядок ключей, а повтор должен совпадать байт в байт
+    response_body = models.BinaryField(null=True, help_text='Тело сохраненного ответа')
+    response_headers = models.JSONField(default=dict,
+                                        help_text='Заголовки сохраненного ответа (Content-Type, ETag)')
+    created_at = models.DateTimeField(db_default=Now(), help_text='Время первого запроса с этим ключом')
+    expires_at = models.DateTimeField(help_text='Время, после которого ключ можно использовать заново')
+
+    class Meta:
+        indexes = [
+            # удаление просроченных ключей
+            models.Index(fields=['expires_at'], name='idempotencykey_expires_idx'),
+        ]
 
     def __str__(self):
-        return f'Стол номер {self.table_number}; заказы: {self.items}'
\ No newline at end of file
+        return f'{self.key}: {self.status_code}'
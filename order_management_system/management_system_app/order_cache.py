@@ -0,0 +1,124 @@
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# сквозной кэш (read-through) поверх кэша Django: значение читается из кэша,
+# а при промахе загружается функцией load и сохраняется в кэш.
+# Бэкенд задается настройкой CACHES (locmem, файловый, Redis, Memcached),
+# алиас и время жизни записей - настройками ORDER_CACHE_ALIAS и ORDER_CACHE_TIMEOUT.
+#
+# Защита от одновременных промахов (stampede): загружает значение только тот запрос, который получил
+# аренду ключа (cache.add), остальные коротко ждут, пока значение появится в кэше.
+# Аренда же защищает от записи устаревшего значения: invalidate удаляет ее вместе со значением,
+# и запрос, прочитавший данные до изменения, не сохраняет их в кэш.
+class ReadThroughCache:
+    def __init__(self, prefix, timeout=300, lease_timeout=5, wait_timeout=0.5, poll_interval=0.01):
+        self.prefix = prefix
+        self.default_timeout = timeout
+        # время жизни аренды, если загружающий запрос упал, не сняв ее, в секундах
+        self.lease_timeout = lease_timeout
+        # сколько ждать значения, загружаемого другим запросом, в секундах
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+        # счетчики в пределах процесса
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'ORDER_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'ORDER_CACHE_TIMEOUT', self.default_timeout)
+
+    def key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def lease_key(self, key):
+        return f'{self.prefix}:{key}:lease'
+
+    # значение из кэша или из load(key); None от load (например, заказа нет) не кэшируется
+    def get(self, key, load):
+        cache = self.cache
+        value = cache.get(self.key(key))
+        if value is not None:
+            self.count(hits=1)
+            return value
+        self.count(misses=1)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            token = uuid.uuid4().hex
+            if cache.add(self.lease_key(key), token, self.lease_timeout):
+                return self.fill(key, load, token)
+
+            # Значение загружает другой запрос: ждем его, пока аренда не снята и не истекло время ожидания
+            time.sleep(self.poll_interval)
+            values = cache.get_many([self.key(key), self.lease_key(key)])
+            if self.key(key) in values:
+                self.count(waits=1)
+                return values[self.key(key)]
+            if time.monotonic() >= deadline:
+                # Не дождались: читаем сами, не заполняя кэш
+                return load(key)
+            if self.lease_key(key) not in values:
+                # Аренда снята без значения (объекта нет или он изменился) - пробуем взять ее сами
+                continue
+
+    def fill(self, key, load, token):
+        cache = self.cache
+        try:
+            value = load(key)
+        except BaseException:
+            self.release(key, token)
+            raise
+
+        # Если за время загрузки ключ был инвалидирован, аренды уже нет и значение может быть устаревшим
+        if cache.get(self.lease_key(key)) == token:
+            if value is not None:
+                cache.set(self.key(key), value, self.timeout)
+            cache.delete(self.lease_key(key))
+        return value
+
+    def release(self, key, token):
+        if self.cache.get(self.lease_key(key)) == token:
+            self.cache.delete(self.lease_key(key))
+
+    # удаление значений и аренд сразу и еще раз после фиксации транзакции:
+    # до фиксации другие запросы видят прежние данные и могут снова положить их в кэш
+    def invalidate(self, keys, using=None):
+        cache_keys = [cache_key for key in keys for cache_key in (self.key(key), self.lease_key(key))]
+        if not cache_keys:
+            return
+        self.cache.delete_many(cache_keys)
+        transaction.on_commit(lambda: self.cache.delete_many(cache_keys), using=using)
+
+    def count(self, hits=0, misses=0, waits=0):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.waits += waits
+
+    # waits - промахи, дождавшиеся значения, загруженного другим запросом
+    def stats(self):
+        with self.lock:
+            requests = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'waits': self.waits,
+                    'hit_ratio': round(self.hits / requests, 4) if requests else None}
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = self.misses = self.waits = 0
+
+
+# кэш заказов для получения одного заказа (см. Order.get_cached)
+order_cache = ReadThroughCache('order')
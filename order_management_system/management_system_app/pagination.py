@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from rest_framework import serializers
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# keyset-пагинация (по курсору) для списка заказов:
+# каждая страница - это один запрос вида WHERE id > <последний id> ORDER BY id LIMIT N,
+# который идет по индексу и не использует OFFSET, поэтому стоимость страницы не зависит от ее номера
+class OrderKeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+
+    # размер страницы по умолчанию и максимально допустимый размер
+    page_size = 100
+    max_page_size = 1000
+
+    # допустимые сортировки: по id или по статусу, а внутри статуса по id
+    orderings = {
+        'id': ('id',),
+        'status': ('status', 'id'),
+    }
+
+    # параметры запроса, которые относятся к пагинации
+    query_params = (cursor_query_param, page_size_query_param, ordering_query_param)
+
+    def get_page_window(self, queryset, request):
+        params = request.query_params
+
+        # Пагинация включается только если в запросе передан курсор или размер страницы,
+        # без них эндпоинт возвращает список целиком, как и раньше
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+        self.cursor = self.decode_cursor(request)
+
+        ordering_fields = self.orderings[self.ordering]
+        if self.cursor is not None:
+            if self.ordering == 'status':
+                # (status, id) > (последний status, последний id)
+                queryset = queryset.filter(status__gte=self.cursor['status']).exclude(
+                    status=self.cursor['status'], id__lte=self.cursor['id'])
+            else:
+                queryset = queryset.filter(id__gt=self.cursor['id'])
+
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница, без отдельного запроса
+        return queryset.order_by(*ordering_fields)[:self.page_size + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_page_window(queryset, request)
+        if window is None:
+            return None
+        return self.set_rows(list(window))
+
+    # то же для асинхронных представлений: записи страницы читаются через async ORM
+    async def apaginate_queryset(self, queryset, request):
+        window = self.get_page_window(queryset, request)
+        if window is None:
+            return None
+        return self.set_rows([order async for order in window.aiterator()])
+
+    def set_rows(self, rows):
+        # rows - все загруженные записи, включая первую запись следующей страницы
+        self.rows = rows
+        self.has_next = len(self.rows) > self.page_size
+        self.page = self.rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            return self.page_size
+
+        # Проверяем, что размер страницы - положительное целое число
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            page_size = 0
+        if page_size < 1:
+            raise serializers.ValidationError(
+                {"page_size param error": "Параметр 'page_size' должен быть положительным целым числом."}
+            )
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, 'id')
+        if ordering not in self.orderings:
+            raise serializers.ValidationError(
+                {
+                    "ordering param error": f"Некорректное значение сортировки: '{ordering}'. Допустимые значения: {', '.join(self.orderings)}"}
+            )
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        # Курсор непрозрачен для клиента: это base64 от JSON с позицией последней записи страницы
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = {'id': int(cursor['id'])}
+            if cursor['ordering'] == 'status':
+                position['status'] = str(cursor['status'])
+            ordering = cursor['ordering']
+        except (ValueError, KeyError, TypeError, UnicodeError, binascii.Error):
+            raise serializers.ValidationError({"cursor param error": "Некорректный курсор."})
+
+        # Курсор, полученный для одной сортировки, нельзя использовать с другой
+        if ordering != self.ordering:
+            raise serializers.ValidationError(
+                {"cursor param error": "Курсор не соответствует параметру сортировки."}
+            )
+        return position
+
+    def encode_cursor(self, order):
+        cursor = {'ordering': self.ordering, 'id': order.id}
+        if self.ordering == 'status':
+            cursor['status'] = order.status
+        return base64.urlsafe_b64encode(
+            json.dumps(cursor, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
@@ -0,0 +1,14 @@
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+# разбор тела запроса в формате MessagePack (Content-Type: application/msgpack), пара к MessagePackRenderer
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as error:
+            raise ParseError(f'MessagePack parse error - {error}')
@@ -0,0 +1,187 @@
+import logging
+import re
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .idempotency import IDEMPOTENCY_HEADER, IDEMPOTENCY_QUERIES, IDEMPOTENT_METHODS
+
+logger = logging.getLogger(__name__)
+
+# бюджеты SQL-запросов эндпоинтов: имя маршрута из urls.py -> допустимое количество запросов на один запрос,
+# либо словарь HTTP-метод -> количество запросов. Маршруты и методы без бюджета не проверяются.
+# Управляющие транзакциями команды (SAVEPOINT, RELEASE) не считаются.
+# Запросы, которые выполняются при чтении потокового ответа (выгрузка, поток событий), не учитываются
+QUERY_BUDGETS = {
+    'home': 0,
+    # веб-интерфейс
+    'add_order': {'GET': 0, 'POST': 2},
+    'delete_order': {'GET': 0, 'POST': 2},
+    'get_order': {'GET': 1},
+    'get_all_orders': {'GET': 2},
+    'update_order_status': {'GET': 0, 'POST': 1},
+    # POST: заказ, UPDATE, новая версия заказа из БД и пересохранение позиций (DELETE и INSERT)
+    'update_order_items': {'GET': 1, 'POST': 5},
+    'get_total_revenue': {'GET': 1},
+    # API
+    'order_create': {'POST': 2},
+    'order_bulk_create': {'POST': 2},
+    # условный запрос с устаревшим ETag: агрегат для ETag и сама выборка
+    'order_list': {'GET': 2},
+    'order_lookup': {'GET': 1},
+    'order_update_status': {'GET': 1, 'PUT': 1, 'PATCH': 1},
+    'order_bulk_update_status': {'POST': 2},
+    'order_update_items': {'GET': 1, 'PUT': 3, 'PATCH': 3},
+    'order_delete': {'DELETE': 2},
+    'order_cache_stats': {'GET': 0},
+    'get_total_revenue_by_api': {'GET': 1},
+    'revenue': {'GET': 1},
+    'order_changes': {'GET': 1},
+    'async_order_list': {'GET': 2},
+    'async_order_retrieve': {'GET': 1},
+    'async_get_total_revenue': {'GET': 1},
+}
+
+# одинаковый запрос, выполненный больше этого количества раз за один запрос, считается проблемой N+1
+REPEATED_QUERY_LIMIT = 2
+# маршруты, которые повторяют одни и те же запросы по замыслу: пакет операций (order_batch)
+# выполняет операции по одной, количество запросов растет вместе с количеством операций
+REPEATED_QUERIES_ALLOWED = {'order_batch'}
+
+TRANSACTION_SQL_RE = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+# списки параметров разной длины (IN (%s, %s, ...), VALUES (...), (...)) приводятся к одному виду
+PARAMS_LIST_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+VALUES_LIST_RE = re.compile(r'\(%s\)(?:\s*,\s*\(%s\))+')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budget(url_name, method):
+    budget = QUERY_BUDGETS.get(url_name)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+# запросы, отправленные в БД за время обработки одного запроса, без управляющих транзакциями команд
+class QueryCounter:
+    def __init__(self):
+        self.queries = []
+
+    def add(self, sql):
+        if not TRANSACTION_SQL_RE.match(sql):
+            self.queries.append(sql)
+
+    # одинаковые с точностью до параметров запросы, выполненные больше limit раз
+    def repeated(self, limit=REPEATED_QUERY_LIMIT):
+        normalized = Counter(VALUES_LIST_RE.sub('(%s)', PARAMS_LIST_RE.sub('%s', sql)) for sql in self.queries)
+        return [(sql, count) for sql, count in normalized.items() if count > limit]
+
+
+# счетчик текущего запроса хранится в контекстной переменной: она переходит в потоки sync_to_async,
+# поэтому учитываются и запросы асинхронных представлений, которые выполняются через другое соединение
+_current_counter = ContextVar('query_budget_counter', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.add(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+# каждое новое соединение с БД сразу получает обертку, которая считает запросы
+connection_created.connect(install_query_counter, dispatch_uid='query_budgets_install_query_counter')
+
+
+# описание нарушений бюджета маршрута url_name для выполненных запросов, пустой список - если их нет;
+# extra - запросы сверх бюджета маршрута, которые добавляет сам запрос (ключ идемпотентности)
+def check_query_budget(url_name, method, counter, extra=0):
+    problems = []
+    budget = get_query_budget(url_name, method)
+    if budget is not None:
+        budget += extra
+    if budget is not None and len(counter.queries) > budget:
+        problems.append(f'{len(counter.queries)} SQL-запросов при бюджете {budget}')
+    if url_name in REPEATED_QUERIES_ALLOWED:
+        return problems
+    for sql, count in counter.repeated(getattr(settings, 'QUERY_BUDGETS_REPEAT_LIMIT', REPEATED_QUERY_LIMIT)):
+        problems.append(f'запрос повторяется {count} раз: {sql}')
+    return problems
+
+
+# middleware проверяет количество SQL-запросов каждого запроса по бюджету его маршрута и ищет повторяющиеся
+# запросы (N+1). Запросы на запись с ключом идемпотентности получают к бюджету IDEMPOTENCY_QUERIES запросов.
+# Режим задается настройкой QUERY_BUDGETS_MODE: 'log' - предупреждение в лог,
+# 'raise' - исключение QueryBudgetExceeded (так работают тесты), пустое значение - проверка выключена.
+# Поддерживает и синхронные, и асинхронные представления, чтобы не переключать асинхронный стек в поток
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = getattr(settings, 'QUERY_BUDGETS_MODE', None)
+        if not mode:
+            return self.get_response(request)
+
+        counter, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        self.check(request, counter, mode)
+        return response
+
+    async def __acall__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGETS_MODE', None)
+        if not mode:
+            return await self.get_response(request)
+
+        counter, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_counter.reset(token)
+        self.check(request, counter, mode)
+        return response
+
+    def start(self):
+        # Соединения, открытые до подключения сигнала, тоже получают обертку
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+        counter = QueryCounter()
+        return counter, _current_counter.set(counter)
+
+    def check(self, request, counter, mode):
+        match = request.resolver_match
+        if match is None or not match.url_name:
+            return
+        extra = 0
+        if request.method in IDEMPOTENT_METHODS and IDEMPOTENCY_HEADER in request.headers:
+            extra = IDEMPOTENCY_QUERIES
+        problems = check_query_budget(match.url_name, request.method, counter, extra)
+        if not problems:
+            return
+
+        message = f'{request.method} {request.path} ({match.url_name}): ' + '; '.join(problems)
+        if mode == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
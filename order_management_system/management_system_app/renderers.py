@@ -0,0 +1,21 @@
+import msgpack
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# MessagePack - компактный двоичный формат с той же структурой данных, что и JSON:
+# числа и короткие строки занимают меньше байт, а разбор не требует поиска кавычек и экранирования.
+# Клиент выбирает формат заголовком Accept: application/msgpack (или параметром ?format=msgpack)
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    # Даты, Decimal, ленивые строки и т.п. кодируются так же, как в JSON-ответах DRF
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder.default, use_bin_type=True)
@@ -1,47 +1,86 @@
+from operator import attrgetter
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
-from .models import Order
+from .models import Order, OrderItem, ORDER_STATUSES, status_update_values
+from .server_timing import TimedSerializerMixin
+from .validators import validate_order_items
+
+
+# проверка поля items общим валидатором: возвращает data вместе с посчитанной общей стоимостью заказа
+def validate_items_data(data):
+    try:
+        items, total_price = validate_order_items(data.get('items'))
+    except DjangoValidationError as error:
+        raise serializers.ValidationError({'items': error.messages})
+    return {**data, 'items': items, 'total_price': total_price}
+
+
+# сериализатор для списка заказов (OrderSerializer(many=True)): создает все заказы одним bulk_create
+class OrderBulkCreateSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    def create(self, validated_data):
+        # total_price уже посчитан при проверке items, Order.save для каждого заказа не вызывается
+        orders = [Order(**attrs) for attrs in validated_data]
+
+        with transaction.atomic():
+            # PostgreSQL возвращает id созданных заказов, по ним создаются позиции заказов
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create([item for order in orders for item in OrderItem.from_order(order)])
+        return orders
 
 
 # сериализатор для передачи модели Order в API представления (получение/добавление/удаление)
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ('id', 'table_number', 'items', 'total_price', 'status')
         # поля, которые создавать/редактировать вручную нельзя
         read_only_fields = ('id', 'total_price', 'status')
+        list_serializer_class = OrderBulkCreateSerializer
 
     def validate(self, data):
+        return validate_items_data(data)
 
-        # Проверяем, что поле items не пустое
-        if not data.get('items'):
-            raise serializers.ValidationError({"items": "Заполните поле заказов"})
+    def create(self, validated_data):
+        # Общая стоимость уже посчитана при проверке items, save не будет проходить по списку повторно
+        total_price = validated_data.pop('total_price')
+        order = Order(**validated_data)
+        order.set_items(order.items, total_price)
+        order.save()
+        return order
 
-        # Проверяем, что items является списком
-        if not isinstance(data.get('items'), list):
-            raise serializers.ValidationError({"items": "Поле items должно быть списком"})
 
-        # Проверяем каждый элемент списка
-        for item in data.get('items', []):
-            if not isinstance(item, dict):
-                raise serializers.ValidationError({'items': 'Каждый элемент списка items должен быть словарём.'})
+# поля заказа в ответах API, в том же порядке, что и в OrderSerializer
+ORDER_FIELDS = ('id', 'table_number', 'items', 'total_price', 'status')
+_get_order_fields = attrgetter(*ORDER_FIELDS)
 
-            # Проверяем, что в словаре ровно два ключа
-            if len(item) != 2:
-                raise serializers.ValidationError(
-                    {'items': 'Каждый элемент items должен содержать ровно два ключа: "position" и "price".'})
 
-            # Проверяем наличие и тип ключей
-            if 'position' not in item or not isinstance(item['position'], str):
-                raise serializers.ValidationError(
-                    {'items': 'Каждый элемент items должен содержать ключ "position", а значение должно быть в строковом представлении.'})
-            if 'price' not in item or not isinstance(item['price'], (int, float)):
-                raise serializers.ValidationError(
-                    {'items': 'Каждый элемент items должен содержать ключ "price", а значение должно быть в числовом представлении.'})
+# строки заказов для OrderReadSerializer: именованные кортежи из values_list вместо экземпляров модели.
+# version нужен для ETag, id и status - для курсора пагинации
+def order_rows(queryset):
+    return queryset.values_list(*ORDER_FIELDS, 'version', named=True)
+
+
+class OrderReadListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    def to_representation(self, data):
+        return [dict(zip(ORDER_FIELDS, _get_order_fields(row))) for row in data]
+
+
+# быстрый сериализатор заказов только для чтения (список, получение заказа): значения полей берутся
+# без полей DRF и их to_representation, поэтому подходят и строки order_rows, и экземпляры Order.
+# JSON-ответ совпадает с ответом OrderSerializer байт в байт: типы значений те же, что после
+# to_representation полей OrderSerializer (int, список из JSONField, float, str), рендерер тот же
+class OrderReadSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    class Meta:
+        list_serializer_class = OrderReadListSerializer
+
+    def to_representation(self, instance):
+        return dict(zip(ORDER_FIELDS, _get_order_fields(instance)))
 
-        return data
 
 # сериализатор для передачи модели Order в API представления (обновление статуса)
-class OrderUpdateStatusSerializer(serializers.ModelSerializer):
+class OrderUpdateStatusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ('id', 'table_number', 'items', 'total_price', 'status')
@@ -66,36 +105,83 @@ class OrderUpdateStatusSerializer(serializers.ModelSerializer):
 
         return data
 
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+
+        # Сохраняем только измененные поля, чтобы не пересохранять позиции заказа
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+    # изменение статуса одним запросом UPDATE ... RETURNING (см. ConditionalUpdateMixin)
+    def update_queryset(self, queryset):
+        return queryset.update_returning(**status_update_values(self.validated_data['status']))
+
+# сериализатор для массового изменения статуса заказов
+class OrderBulkUpdateStatusSerializer(TimedSerializerMixin, serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000,
+                                error_messages={'empty': 'Передайте хотя бы один id заказа.'})
+    status = serializers.ChoiceField(choices=ORDER_STATUSES,
+                                     error_messages={'invalid_choice': 'Заполните поле со статусом заказа допустимыми значениями'})
+
+
 # сериализатор для передачи модели Order в API представления (обновление содержимого)
-class OrderUpdateItemsSerializer(serializers.ModelSerializer):
+class OrderUpdateItemsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ('id', 'table_number', 'items', 'total_price', 'status')
         read_only_fields = ('id', 'table_number', 'total_price', 'status')
 
     def validate(self, data):
+        return validate_items_data(data)
+
+    def update(self, instance, validated_data):
+        # Меняется только содержимое заказа, общая стоимость уже посчитана при проверке items
+        instance.set_items(validated_data['items'], validated_data['total_price'])
+        instance.save(update_fields=['items', 'total_price'])
+        return instance
+
+    # изменение содержимого одним запросом UPDATE ... RETURNING (см. ConditionalUpdateMixin),
+    # позиции заказа пересохраняются только если заказ действительно изменен
+    def update_queryset(self, queryset):
+        with transaction.atomic():
+            orders = queryset.update_returning(items=self.validated_data['items'],
+                                               total_price=self.validated_data['total_price'])
+            for order in orders:
+                order.sync_order_items()
+        return orders
+
+
+# операции пакетного запроса (api/v1/batch/): операция -> сериализатор, который проверяет ее данные
+BATCH_OPERATIONS = {
+    'create': OrderSerializer,
+    'update_items': OrderUpdateItemsSerializer,
+    'update_status': OrderUpdateStatusSerializer,
+}
+
+
+# одна операция пакетного запроса, например: {"op": "update_status", "id": 7, "data": {"status": "оплачено"}}
+class BatchOperationSerializer(TimedSerializerMixin, serializers.Serializer):
+    op = serializers.ChoiceField(choices=list(BATCH_OPERATIONS),
+                                 error_messages={'invalid_choice': f'Допустимые операции: {", ".join(BATCH_OPERATIONS)}'})
+    id = serializers.IntegerField(min_value=1, required=False)
+    data = serializers.DictField()
 
-        if not data.get('items'):
-            raise serializers.ValidationError({"items": "Заполните поле заказов"})
-
-        if not isinstance(data.get('items'), list):
-            raise serializers.ValidationError({"items": "Поле items должно быть списком"})
-
-        for item in data.get('items', []):
-            if not isinstance(item, dict):
-                raise serializers.ValidationError({'items': 'Каждый элемент списка items должен быть словарём.'})
+    def validate(self, data):
+        # Изменять можно только существующий заказ, поэтому для изменений нужен id
+        if data['op'] != 'create' and 'id' not in data:
+            raise serializers.ValidationError({"id": "Укажите id заказа для этой операции."})
+        # Создаваемому заказу id назначает БД
+        if data['op'] == 'create' and 'id' in data:
+            raise serializers.ValidationError({"id": "id не указывается при создании заказа."})
+        return data
 
-            if len(item) != 2:
-                raise serializers.ValidationError(
-                    {'items': 'Каждый элемент items должен содержать ровно два ключа: "position" и "price".'})
 
-            if 'position' not in item or not isinstance(item['position'], str):
-                raise serializers.ValidationError(
-                    {
-                        'items': 'Каждый элемент items должен содержать ключ "position", а значение должно быть в строковом представлении.'})
-            if 'price' not in item or not isinstance(item['price'], (int, float)):
-                raise serializers.ValidationError(
-                    {
-                        'items': 'Каждый элемент items должен содержать ключ "price", а значение должно быть в числовом представлении.'})
+# тело пакетного запроса: операции выполняются по порядку в одной транзакции
+class BatchSerializer(TimedSerializerMixin, serializers.Serializer):
+    # максимальное количество операций в одном запросе
+    max_operations = 100
 
-        return data
\ No newline at end of file
+    operations = BatchOperationSerializer(many=True, allow_empty=False, max_length=max_operations)
+    # False - при первой ошибке откатывается весь пакет, True - откатывается только операция с ошибкой
+    continue_on_error = serializers.BooleanField(default=False)
@@ -0,0 +1,166 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+# фазы в порядке вывода в заголовке Server-Timing
+PHASES = ('resolve', 'db', 'validate', 'serialize', 'render', 'total')
+
+# замеры текущего запроса; None, если запрос не попал в выборку
+_current_timing = ContextVar('server_timing', default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.durations = {}
+        self.db_queries = 0
+
+    def add(self, phase, seconds):
+        self.durations[phase] = self.durations.get(phase, 0) + seconds
+
+    def header(self):
+        parts = []
+        for phase in PHASES:
+            if phase in self.durations:
+                part = f'{phase};dur={self.durations[phase] * 1000:.2f}'
+                if phase == 'db':
+                    part += f';desc="{self.db_queries} queries"'
+                parts.append(part)
+        return ', '.join(parts)
+
+
+# замер фазы запроса, например: with timed('validate'): ...
+# Если запрос не попал в выборку, замер ничего не стоит, кроме чтения контекстной переменной
+@contextmanager
+def timed(phase):
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - started)
+
+
+# время и количество SQL-запросов (execute_wrapper на каждом соединении)
+def time_query(execute, sql, params, many, context):
+    timing = _current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add('db', time.perf_counter() - started)
+        timing.db_queries += 1
+
+
+def install_query_timer(connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='server_timing_install_query_timer')
+
+
+# замер проверки данных и сериализации для сериализаторов DRF
+class TimedSerializerMixin:
+    def is_valid(self, *args, **kwargs):
+        with timed('validate'):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+# middleware замеряет фазы запроса и отдает их в заголовке Server-Timing и строкой лога
+# management_system_app.server_timing: разбор URL, время и количество SQL-запросов, проверку данных
+# и сериализацию в DRF, рендеринг ответа DRF и общее время. Шаблоны, отрисованные функцией render()
+# в представлении, входят в общее время, а не в render.
+# Замеряется доля запросов SERVER_TIMING_SAMPLE_RATE (от 0 до 1), остальные запросы проходят без замеров
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timing, token, started = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish(request, response, timing, started)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timing, token, started = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timing.reset(token)
+        return self.finish(request, response, timing, started)
+
+    def sampled(self):
+        rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def start(self, request):
+        started = time.perf_counter()
+        # Соединения, открытые до подключения сигнала, тоже получают обертку
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+        timing = RequestTiming()
+
+        # Django разбирает URL внутри обработчика, поэтому время разбора замеряется отдельным вызовом resolve
+        try:
+            resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            pass
+        timing.add('resolve', time.perf_counter() - started)
+        return timing, _current_timing.set(timing), started
+
+    # ответ DRF рендерится после представления: время от выхода из представления до конца рендеринга
+    def process_template_response(self, request, response):
+        timing = _current_timing.get()
+        if timing is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda response: timing.add('render', time.perf_counter() - started))
+        return response
+
+    def finish(self, request, response, timing, started):
+        timing.add('total', time.perf_counter() - started)
+        response['Server-Timing'] = timing.header()
+
+        match = request.resolver_match
+        fields = {
+            'method': request.method, 'path': request.path, 'route': match.url_name if match else None,
+            'status': response.status_code, 'db_queries': timing.db_queries,
+            **{f'{phase}_ms': round(timing.durations[phase] * 1000, 2) for phase in PHASES
+               if phase in timing.durations},
+        }
+        logger.info(' '.join(f'{key}={value}' for key, value in fields.items()), extra={'server_timing': fields})
+        return response
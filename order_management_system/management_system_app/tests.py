@@ -1,20 +1,58 @@
-from django.test import TestCase, RequestFactory, Client
+import asyncio
+import csv
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+import msgpack
+from asgiref.sync import sync_to_async
+
+from django.test import TestCase, TransactionTestCase, RequestFactory, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.http import JsonResponse
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
 from .forms import AddOrderForm, DeleteOrderForm, GetOrderForm, UpdateOrderItemsForm, UpdateOrderStatusForm
-from .models import Order
+from .models import IdempotencyKey, Order, OrderChange, OrderItem, RevenueLedger, RevenueRollup, status_update_values, \
+    update_returning_rows
 from .drf_views.get_total_revenue_api_view import OrderAPIGetTotalRevenue
+from .events import OrderEvent, broker, read_journal
+from .order_cache import ReadThroughCache, order_cache
+from .query_budgets import QUERY_BUDGETS, QueryBudgetExceeded
+from .serializers import OrderReadSerializer, OrderSerializer, order_rows
+from .validators import validate_order_items
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection, connections, transaction
+from django.db.models import Count, F, Sum
 from django.urls import reverse
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.core.management.base import CommandError
 
 # Create your tests here.
 
 
+# базовый класс тестов: каждый запрос тестовых клиентов проверяется по бюджету SQL-запросов своего маршрута
+# (query_budgets.py), превышение бюджета или повторяющиеся запросы (N+1) завершают тест ошибкой
+@override_settings(QUERY_BUDGETS_MODE='raise')
+class QueryBudgetTestCase(TestCase):
+    pass
+
+
 # -----------------------------------------------------------------------------
 # Тесты для API
 # -----------------------------------------------------------------------------
-class OrderAPIGetTotalRevenueTestCase(TestCase):
+class OrderAPIGetTotalRevenueTestCase(QueryBudgetTestCase):
     def setUp(self):
         # Создаем тестовые данные
         Order.objects.create(table_number=1, items=
@@ -76,7 +114,366 @@ class OrderAPIGetTotalRevenueTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertJSONEqual(response.content, expected_data)
 
-class OrderAPICreateTestCase(TestCase):
+class ValidateOrderItemsTestCase(QueryBudgetTestCase):
+    def test_valid_items(self):
+        items = [{"position": "Картофель фри", "price": 100}, {"position": "Шашлык", "price": 99.999}]
+
+        validated_items, total_price = validate_order_items(items)
+
+        self.assertIs(validated_items, items)
+        self.assertEqual(total_price, 200)
+
+    def test_invalid_items(self):
+        invalid_items = [
+            [],
+            'кола, картошка',
+            ['Кола'],
+            [{"position": "Кола"}],
+            [{"name": "Кола", "cost": 100}],
+            [{"position": 1, "price": 100}],
+            [{"position": "Кола", "price": "100"}],
+        ]
+        for items in invalid_items:
+            with self.subTest(items=items):
+                with self.assertRaises(ValidationError):
+                    validate_order_items(items)
+
+    def test_total_not_recomputed_on_save(self):
+        # При создании через API и через форму total_price берется из валидатора, save не проходит по items
+        with mock.patch('management_system_app.models.calculate_total_price') as calculate_total_price:
+            response = APIClient().post(reverse('order_create'), format='json', data={
+                'table_number': 1, 'items': [{"position": "Кола", "price": 100}, {"position": "Шашлык", "price": 0.5}]})
+            form = AddOrderForm(data={'table_number': 2, 'items': '[{"position": "Кола", "price": 10}]'})
+            self.assertTrue(form.is_valid())
+            form.save()
+
+        calculate_total_price.assert_not_called()
+        self.assertEqual(response.data['total_price'], 100.5)
+        self.assertEqual(Order.objects.get(table_number=2).total_price, 10)
+
+class RevenueLedgerTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(table_number=1, items=
+        [{"position": "Картофель фри", "price": 100}, {"position": "Шашлык", "price": 200.5}],
+                                          status='в ожидании')
+
+    def test_save_into_and_out_of_paid_status(self):
+        self.order.status = 'оплачено'
+        self.order.save()
+        self.assertEqual(RevenueLedger.get_total_revenue(), 300.5)
+
+        self.order.status = 'готово'
+        self.order.save()
+        self.assertEqual(RevenueLedger.get_total_revenue(), 0)
+
+    def test_paid_order_items_change(self):
+        self.order.status = 'оплачено'
+        self.order.save()
+
+        # Изменение содержимого оплаченного заказа меняет выручку на разницу сумм
+        self.order.items = [{"position": "Шашлык", "price": 50}]
+        self.order.save()
+        self.assertEqual(RevenueLedger.get_total_revenue(), 50)
+
+    def test_queryset_update(self):
+        Order.objects.create(table_number=2, items=[{"position": "Кола", "price": 99.99}])
+
+        Order.objects.all().update(status='оплачено')
+        self.assertEqual(RevenueLedger.get_total_revenue(), 400.49)
+        self.assertEqual(RevenueLedger.objects.get().paid_orders_count, 2)
+
+        Order.objects.filter(id=self.order.id).update(status='готово')
+        self.assertEqual(RevenueLedger.get_total_revenue(), 99.99)
+
+    def test_delete(self):
+        paid_order = Order.objects.create(table_number=2, items=[{"position": "Кола", "price": 99.99}],
+                                          status='оплачено')
+        Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 10}], status='оплачено')
+
+        paid_order.delete()
+        self.assertEqual(RevenueLedger.get_total_revenue(), 10)
+
+        Order.objects.filter(status='оплачено').delete()
+        self.assertEqual(RevenueLedger.get_total_revenue(), 0)
+
+    def test_revenue_is_single_query(self):
+        Order.objects.filter(id=self.order.id).update(status='оплачено')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get_total_revenue_by_api'))
+
+        self.assertJSONEqual(response.content, {'total_revenue': 300.5})
+
+    def test_rebuild_command(self):
+        Order.objects.filter(id=self.order.id).update(status='оплачено')
+        # Портим журнал и проверяем, что сверка это обнаруживает, а пересчет исправляет
+        RevenueLedger.objects.update(total_revenue=1)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_revenue_ledger', '--verify', stdout=StringIO())
+
+        call_command('rebuild_revenue_ledger', stdout=StringIO())
+        self.assertEqual(RevenueLedger.get_total_revenue(), 300.5)
+        call_command('rebuild_revenue_ledger', '--verify', stdout=StringIO())
+
+class RevenueRollupTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('revenue')
+
+    def create_order(self, table_number, price, created_at, paid_at=None):
+        return Order.objects.create(table_number=table_number, items=[{"position": "Кола", "price": price}],
+                                    created_at=created_at, paid_at=paid_at,
+                                    status='оплачено' if paid_at else 'в ожидании')
+
+    def test_paid_at(self):
+        order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.assertIsNotNone(order.created_at)
+        self.assertIsNone(order.paid_at)
+
+        Order.objects.filter(id=order.id).update(status='оплачено')
+        paid_at = Order.objects.get(id=order.id).paid_at
+        self.assertIsNotNone(paid_at)
+
+        # Изменение оплаченного заказа, в том числе из устаревшего экземпляра, не меняет время оплаты
+        order.status = 'оплачено'
+        order.save()
+        self.assertEqual(Order.objects.get(id=order.id).paid_at, paid_at)
+
+        Order.objects.filter(id=order.id).update(**status_update_values('готово'))
+        self.assertIsNone(Order.objects.get(id=order.id).paid_at)
+
+    def test_group_by(self):
+        day = datetime(2025, 3, 7, tzinfo=dt_timezone.utc)
+        self.create_order(1, 100, day + timedelta(hours=9), paid_at=day + timedelta(hours=10, minutes=5))
+        self.create_order(1, 50.5, day + timedelta(hours=10), paid_at=day + timedelta(hours=10, minutes=50))
+        self.create_order(2, 30, day + timedelta(hours=10))
+        # 22:30 UTC - уже 8 марта по московскому времени
+        self.create_order(2, 20, day + timedelta(hours=22), paid_at=day + timedelta(hours=22, minutes=30))
+
+        response = self.client.get(self.url, {'from': '2025-03-07T12:00', 'to': '2025-03-07T14:00',
+                                              'group_by': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(result['bucket'].isoformat(), result['revenue'], result['paid_orders_count'],
+                           result['orders_count']) for result in response.data['results']],
+                         [('2025-03-07T12:00:00+03:00', 0, 0, 1), ('2025-03-07T13:00:00+03:00', 150.5, 2, 2)])
+
+        response = self.client.get(self.url, {'from': '2025-03-07', 'to': '2025-03-09'})
+        self.assertEqual([(result['bucket'].isoformat(), result['revenue'], result['orders_count'])
+                          for result in response.data['results']],
+                         [('2025-03-07T00:00:00+03:00', 150.5, 3), ('2025-03-08T00:00:00+03:00', 20, 1)])
+        self.assertEqual(response.data['total_revenue'], 170.5)
+
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(self.url, {'group_by': 'table'})
+        self.assertNotIn(Order._meta.db_table + '"', queries.captured_queries[0]['sql'])
+        self.assertEqual([(result['table_number'], result['revenue'], result['paid_orders_count'])
+                          for result in response.data['results']], [(1, 150.5, 2), (2, 20, 1)])
+
+    def test_rollup_follows_changes(self):
+        created_at = datetime(2025, 3, 7, 9, tzinfo=dt_timezone.utc)
+        order = self.create_order(1, 100, created_at, paid_at=created_at)
+        self.create_order(2, 10, created_at, paid_at=created_at)
+
+        Order.objects.filter(id=order.id).update(items=[{"position": "Кола", "price": 70}], total_price=70)
+        self.assertEqual(self.client.get(self.url).data['total_revenue'], 80)
+
+        order.delete()
+        response = self.client.get(self.url, {'group_by': 'table'})
+        self.assertEqual([result['table_number'] for result in response.data['results']], [2])
+
+        call_command('rebuild_revenue_rollup', '--verify', stdout=StringIO())
+
+    def test_rebuild_command(self):
+        self.create_order(1, 100, timezone.now(), paid_at=timezone.now())
+        # Портим сводку и проверяем, что сверка это обнаруживает, а пересчет исправляет
+        RevenueRollup.objects.update(revenue=1)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_revenue_rollup', '--verify', stdout=StringIO())
+
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).data['total_revenue'], 100)
+        call_command('rebuild_revenue_rollup', '--verify', stdout=StringIO())
+
+    def test_invalid_params(self):
+        self.assertIn('from param error', self.client.get(self.url, {'from': 'вчера'}).data)
+        self.assertIn('to param error', self.client.get(self.url, {'to': '2025-13-01'}).data)
+        self.assertIn('group_by param error', self.client.get(self.url, {'group_by': 'week'}).data)
+
+class QueryBudgetMiddlewareTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.url = reverse('order_list')
+
+    def test_over_budget(self):
+        with mock.patch.dict(QUERY_BUDGETS, {'order_list': {'GET': 0}}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, '1 SQL-запросов при бюджете 0'):
+                self.client.get(self.url)
+
+            # В режиме log превышение только записывается в лог
+            with self.settings(QUERY_BUDGETS_MODE='log'), \
+                    self.assertLogs('management_system_app.query_budgets', 'WARNING') as logs:
+                self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+            self.assertIn('(order_list)', logs.output[0])
+
+            with self.settings(QUERY_BUDGETS_MODE=''):
+                self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+    def test_repeated_queries(self):
+        # Заказ, который читается отдельным запросом для каждой позиции (N+1)
+        def to_representation(serializer, orders):
+            for _ in range(3):
+                Order.objects.filter(id__in=[orders[0].id, orders[0].id + 1]).exists()
+            return []
+
+        with mock.patch('management_system_app.serializers.OrderReadListSerializer.to_representation',
+                        to_representation), \
+                mock.patch.dict(QUERY_BUDGETS, {'order_list': {'GET': 10}}), \
+                self.assertRaisesMessage(QueryBudgetExceeded, 'запрос повторяется 3 раз'):
+            self.client.get(self.url)
+
+    async def test_async_view(self):
+        with mock.patch.dict(QUERY_BUDGETS, {'async_order_retrieve': {'GET': 0}}):
+            with self.assertRaises(QueryBudgetExceeded):
+                await self.async_client.get(reverse('async_order_retrieve', kwargs={'pk': self.order.id}))
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+
+    def get_phases(self, response):
+        return [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+
+    def test_drf_view(self):
+        with self.assertLogs('management_system_app.server_timing', 'INFO') as logs:
+            response = self.client.get(reverse('order_list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_phases(response), ['resolve', 'db', 'serialize', 'render', 'total'])
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('route=order_list status=200 db_queries=1', logs.output[0])
+        self.assertEqual(logs.records[0].server_timing['db_queries'], 1)
+
+    def test_validate_phase(self):
+        response = APIClient().post(reverse('order_create'), format='json',
+                                    data={'table_number': 2, 'items': [{'position': 'Чай', 'price': 50}]})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('validate', self.get_phases(response))
+
+    async def test_async_view(self):
+        response = await self.async_client.get(reverse('async_order_retrieve', kwargs={'pk': self.order.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_phases(response), ['resolve', 'db', 'serialize', 'render', 'total'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_not_sampled(self):
+        # Запросы, не попавшие в выборку, проходят без заголовка и записи в лог
+        with self.settings(SERVER_TIMING_SAMPLE_RATE=0), self.assertNoLogs('management_system_app.server_timing'):
+            response = self.client.get(reverse('order_list'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+
+
+class OrderItemTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(table_number=1, items=
+        [{"position": "Картофель фри", "price": 100}, {"position": "Шашлык", "price": 200.5}])
+
+    def test_items_created_with_order(self):
+        rows = list(self.order.order_items.order_by('id').values_list('position', 'price'))
+
+        self.assertEqual(rows, [('Картофель фри', 100), ('Шашлык', 200.5)])
+
+    def test_items_replaced_on_update(self):
+        self.order.items = [{"position": "Кола", "price": 99.99}]
+        self.order.save()
+
+        rows = list(self.order.order_items.values_list('position', 'price'))
+        self.assertEqual(rows, [('Кола', 99.99)])
+
+    def test_status_update_keeps_items(self):
+        response = APIClient().patch(reverse('order_update_status', args=[self.order.id]),
+                                     data={'status': 'готово'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.order.order_items.count(), 2)
+
+    def test_items_deleted_with_order(self):
+        Order.objects.filter(id=self.order.id).delete()
+
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_sql_aggregates(self):
+        Order.objects.create(table_number=2, items=[{"position": "Шашлык", "price": 200.5}])
+
+        # Сумма позиций совпадает с total_price заказа
+        total = self.order.order_items.aggregate(total=Sum('price'))['total']
+        self.assertEqual(total, self.order.total_price)
+
+        # Статистика по блюдам считается одним запросом
+        dishes = {row['position']: row['count']
+                  for row in OrderItem.objects.values('position').annotate(count=Count('id'))}
+        self.assertEqual(dishes, {'Картофель фри': 1, 'Шашлык': 2})
+
+    def test_api_shape_unchanged(self):
+        response = APIClient().get(reverse('order_list'))
+
+        self.assertEqual(response.data[0]['items'], self.order.items)
+
+class RecomputeTotalsTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order1 = Order.objects.create(table_number=1, items=
+        [{"position": "Картофель фри", "price": 0.1}, {"position": "Шашлык", "price": 0.2}], status='оплачено')
+        self.order2 = Order.objects.create(table_number=2, items=[{"position": "Кола", "price": 99.99}])
+        self.order3 = Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 50}])
+        # Портим сохраненные суммы, как после ручной правки цен в items
+        Order.objects.filter(id__in=[self.order1.id, self.order2.id]).update(total_price=1)
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command('recompute_totals', '--dry-run', stdout=out)
+
+        self.assertIn('Заказов с расходящейся суммой: 2', out.getvalue())
+        self.order1.refresh_from_db()
+        self.assertEqual(self.order1.total_price, 1)
+
+    def test_recompute(self):
+        out = StringIO()
+        call_command('recompute_totals', '--chunk-size', '1', stdout=out)
+
+        self.assertIn('Пересчитано заказов: 2', out.getvalue())
+        self.assertEqual(list(Order.objects.order_by('id').values_list('total_price', flat=True)), [0.3, 99.99, 50])
+        # Журнал выручки остается согласованным с заказами
+        self.assertEqual(RevenueLedger.get_total_revenue(), 0.3)
+
+    def test_saved_order_is_not_divergent(self):
+        # Цены на границе округления: 0.125 и 1.005 округляются одинаково в Python и в SQL
+        order = Order.objects.create(table_number=4, items=[{"position": "Кола", "price": 0.125},
+                                                            {"position": "Чай", "price": 1.005}])
+        self.assertEqual(order.total_price, 1.14)
+        self.assertEqual(sorted(order.order_items.values_list('price', flat=True)), [0.13, 1.01])
+
+        out = StringIO()
+        call_command('recompute_totals', '--from-id', order.id, '--to-id', order.id, '--dry-run', stdout=out)
+        self.assertIn('Заказов с расходящейся суммой: 0', out.getvalue())
+
+    def test_recompute_with_filters(self):
+        call_command('recompute_totals', '--status', 'в ожидании', stdout=StringIO())
+        call_command('recompute_totals', '--from-id', self.order1.id, '--to-id', self.order1.id, '--dry-run',
+                     stdout=StringIO())
+
+        self.order1.refresh_from_db()
+        self.order2.refresh_from_db()
+        self.assertEqual(self.order1.total_price, 1)
+        self.assertEqual(self.order2.total_price, 99.99)
+
+class OrderAPICreateTestCase(QueryBudgetTestCase):
     def setUp(self):
         # Создаем клиент для выполнения запросов
         self.client = APIClient()
@@ -193,7 +590,198 @@ class OrderAPICreateTestCase(TestCase):
         self.assertNotEqual(order.total_price, 240)
         self.assertNotEqual(order.status, 'оплачено')
 
-class OrderAPIListTestCase(TestCase):
+class OrderAPIBulkCreateTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_bulk_create')
+
+    def test_bulk_create_valid_data(self):
+        valid_data = [
+            {'table_number': 1, 'items': [{'position': 'Кола', 'price': 100}, {'position': 'Шашлык', 'price': 99.99}]},
+            {'table_number': 2, 'items': [{'position': 'Картошка фри', 'price': 150}]},
+        ]
+
+        # Заказы и их позиции создаются фиксированным числом запросов, независимо от количества заказов
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, data=valid_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([order['total_price'] for order in response.data], [199.99, 150])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 3)
+
+        order = Order.objects.get(id=response.data[0]['id'])
+        self.assertEqual(order.status, 'в ожидании')
+        self.assertEqual(order.total_price, 199.99)
+
+    def test_bulk_create_errors_by_index(self):
+        invalid_data = [
+            {'table_number': 1, 'items': [{'position': 'Кола', 'price': 100}]},
+            {'table_number': 2, 'items': []},
+            {'table_number': 3, 'items': [{'position': 'Кола', 'price': '100'}]},
+        ]
+
+        response = self.client.post(self.url, data=invalid_data, format='json')
+
+        # Ни один заказ не создан, ошибки возвращены для второго и третьего заказа
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['errors']), {'1', '2'})
+        self.assertIn('items', response.data['errors']['1'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_bulk_create_not_a_list(self):
+        response = self.client.post(self.url, data={'table_number': 1}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('orders', response.data)
+
+class OrderReadSerializerTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        Order.objects.create(table_number=2, items=
+        [{"position": 'Стейк "рибай"\\ \u2028 \U0001f969', "price": 0.1}, {"position": "", "price": 1e-07}],
+                             status='оплачено')
+        order = Order.objects.create(table_number=3, items=[{"position": "Чай", "price": 33.333}], status='готово')
+        # Значения, которые через API не записать: проверяются типы JSON, которые может вернуть БД
+        Order.objects.filter(id=order.id).update(items=[{"nested": {"list": [1, 2.5, None, True]}}, "строка", 7])
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_same_bytes_as_order_serializer(self):
+        orders = list(Order.objects.order_by('id'))
+        rows = list(order_rows(Order.objects.order_by('id')))
+
+        expected = self.render(OrderSerializer(orders, many=True).data)
+        self.assertEqual(self.render(OrderReadSerializer(rows, many=True).data), expected)
+        # Экземпляры модели (заказ из кэша) сериализуются так же
+        self.assertEqual(self.render(OrderReadSerializer(orders, many=True).data), expected)
+        for order, row in zip(orders, rows):
+            self.assertEqual(self.render(OrderReadSerializer(row).data), self.render(OrderSerializer(order).data))
+
+    def test_endpoints_same_bytes(self):
+        orders = list(Order.objects.order_by('id'))
+
+        response = self.client.get(reverse('order_list'), {'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.render(response.data['results']), self.render(OrderSerializer(orders, many=True).data))
+
+        response = self.client.get(reverse('order_list'), {'status': 'оплачено'})
+        self.assertEqual(response.content, self.render(OrderSerializer(orders[1:2], many=True).data))
+
+        response = self.client.get(reverse('order_update_items', args=[orders[2].id]))
+        self.assertEqual(response.content, self.render(OrderSerializer(orders[2]).data))
+
+    async def test_async_endpoints_same_bytes(self):
+        orders = [order async for order in Order.objects.order_by('id')]
+
+        response = await self.async_client.get(reverse('async_order_list'), {'page_size': 10})
+        self.assertEqual(response.content, b'{"next":null,"results":' +
+                         self.render(OrderSerializer(orders, many=True).data) + b'}')
+
+        response = await self.async_client.get(reverse('async_order_retrieve', kwargs={'pk': orders[1].id}))
+        self.assertEqual(response.content, self.render(OrderSerializer(orders[1]).data))
+
+
+class MessagePackAPITestCase(QueryBudgetTestCase):
+    content_type = 'application/msgpack'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100.5}])
+
+    def post(self, url, data):
+        return self.client.post(url, data=msgpack.packb(data), content_type=self.content_type,
+                                HTTP_ACCEPT=self.content_type)
+
+    def test_create(self):
+        response = self.post(reverse('order_create'), {'table_number': 2, 'items': [{'position': 'Чай', 'price': 50}]})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Content-Type'], self.content_type)
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data['total_price'], 50)
+        self.assertEqual(Order.objects.get(id=data['id']).items, [{'position': 'Чай', 'price': 50}])
+
+    def test_bulk_create_and_errors(self):
+        response = self.post(reverse('order_bulk_create'), [
+            {'table_number': 2, 'items': [{'position': 'Чай', 'price': 50}]},
+            {'table_number': 3, 'items': [{'position': 'Суп', 'price': 250.25}]},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([order['total_price'] for order in msgpack.unpackb(response.content)], [50, 250.25])
+
+        # Ошибки проверки тоже отдаются в MessagePack
+        response = self.post(reverse('order_bulk_create'), [{'table_number': 2, 'items': []}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('items', msgpack.unpackb(response.content)['errors']['0'])
+
+    def test_list_and_retrieve_same_data_as_json(self):
+        for url, params in ((reverse('order_list'), {}), (reverse('order_list'), {'page_size': 1}),
+                            (reverse('order_update_status', args=[self.order.id]), {})):
+            json_response = self.client.get(url, params)
+            response = self.client.get(url, params, HTTP_ACCEPT=self.content_type)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], self.content_type)
+            self.assertEqual(msgpack.unpackb(response.content), json.loads(json_response.content))
+            # ETag зависит от формата ответа
+            self.assertNotEqual(response['ETag'], json_response['ETag'])
+
+    def test_format_query_param(self):
+        # Формат можно выбрать параметром ?format=msgpack вместо заголовка Accept
+        for url, params in ((reverse('order_list'), {}), (reverse('order_list'), {'page_size': 1}),
+                            (reverse('order_update_status', args=[self.order.id]), {})):
+            json_response = self.client.get(url, params)
+            response = self.client.get(url, {**params, 'format': 'msgpack'})
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], self.content_type)
+            self.assertEqual(msgpack.unpackb(response.content), json.loads(json_response.content))
+
+    async def test_async_format_query_param(self):
+        json_response = await self.async_client.get(reverse('async_order_list'))
+        response = await self.async_client.get(reverse('async_order_list'), {'format': 'msgpack'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], self.content_type)
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(json_response.content))
+
+    async def test_async_views(self):
+        for url in (reverse('async_order_list'), reverse('async_order_retrieve', kwargs={'pk': self.order.id})):
+            json_response = await self.async_client.get(url)
+            response = await self.async_client.get(url, headers={'Accept': self.content_type})
+
+            self.assertEqual(response['Content-Type'], self.content_type)
+            self.assertEqual(msgpack.unpackb(response.content), json.loads(json_response.content))
+
+        response = await self.async_client.get(reverse('async_order_list'), headers={'Accept': 'text/csv'})
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+
+    async def test_async_views_vary_on_accept(self):
+        # Ответ зависит от Accept, поэтому HTTP-кэш должен различать ответы по этому заголовку
+        url = reverse('async_order_retrieve', kwargs={'pk': self.order.id})
+        response = await self.async_client.get(url, headers={'Accept': self.content_type})
+        not_modified = await self.async_client.get(url, headers={'Accept': self.content_type,
+                                                                 'If-None-Match': response['ETag']})
+        not_acceptable = await self.async_client.get(url, headers={'Accept': 'text/csv'})
+        bad_request = await self.async_client.get(reverse('async_order_list'), {'status': 'x'})
+
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_acceptable.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+        for response in (response, not_modified, not_acceptable, bad_request,
+                         await self.async_client.get(reverse('async_order_list'))):
+            self.assertEqual(response['Vary'], 'Accept')
+
+    def test_invalid_body(self):
+        response = self.client.post(reverse('order_create'), data=b'\xc1', content_type=self.content_type)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('MessagePack parse error', response.data['detail'])
+
+
+class OrderAPIListTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = APIClient()
         self.url = reverse('order_list')
@@ -268,7 +856,837 @@ class OrderAPIListTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('no orders error', response.data)  # Проверяем, что ошибка связана с отсутствием заказов
 
-class OrderAPIUpdateStatusTestCase(TestCase):
+class OrderAPIListPaginationTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_list')
+        statuses = ['готово', 'в ожидании', 'оплачено', 'в ожидании', 'готово']
+        self.orders = [
+            Order.objects.create(table_number=i + 1, items=[{"position": "Шашлык", "price": 100}], status=order_status)
+            for i, order_status in enumerate(statuses)
+        ]
+
+    def collect_pages(self, params):
+        # Проходим по всем страницам, следуя ссылке next
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(order['id'] for order in response.data['results'])
+            if response.data['next'] is None:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_paginate_by_id(self):
+        ids = self.collect_pages({'page_size': 2})
+
+        self.assertEqual(ids, sorted(order.id for order in self.orders))
+
+    def test_paginate_by_status(self):
+        ids = self.collect_pages({'page_size': 2, 'ordering': 'status'})
+
+        expected = [order.id for order in sorted(self.orders, key=lambda order: (order.status, order.id))]
+        self.assertEqual(ids, expected)
+
+    def test_paginate_with_filter(self):
+        ids = self.collect_pages({'page_size': 1, 'status': 'готово'})
+
+        self.assertEqual(ids, [self.orders[0].id, self.orders[4].id])
+
+    def test_page_is_single_query(self):
+        # Страница выбирается одним запросом, без отдельной проверки exists()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'page_size': 2})
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'не курсор'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cursor param error', response.data)
+
+    def test_cursor_with_other_ordering(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        next_url = response.data['next'] + '&ordering=status'
+
+        response = self.client.get(next_url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cursor param error', response.data)
+
+    def test_invalid_page_size(self):
+        response = self.client.get(self.url, {'page_size': 0})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('page_size param error', response.data)
+
+    def test_no_orders_found(self):
+        response = self.client.get(self.url, {'page_size': 2, 'table_number': 999})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('no orders error', response.data)
+
+class OrderAPIConditionalGetTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.order1 = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.order2 = Order.objects.create(table_number=2, items=[{"position": "Кола", "price": 100}])
+        self.list_url = reverse('order_list')
+        self.order_url = reverse('order_update_status', kwargs={'pk': self.order1.id})
+
+    def test_retrieve_not_modified(self):
+        response = self.client.get(self.order_url)
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{self.order1.id}-1-json"')
+
+        # Совпадающий ETag: 304 без тела ответа, заказ берется из кэша заказов без запросов и без сериализации
+        with self.assertNumQueries(0), \
+                mock.patch('management_system_app.serializers.OrderUpdateStatusSerializer.to_representation') as to_representation:
+            response = self.client.get(self.order_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        to_representation.assert_not_called()
+
+        # После изменения заказа ETag меняется
+        self.client.patch(self.order_url, {'status': 'готово'}, format='json')
+        response = self.client.get(reverse('order_update_items', kwargs={'pk': self.order1.id}),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"{self.order1.id}-2-json"')
+
+    def test_stale_instance_save_gets_new_version(self):
+        stale = Order.objects.get(id=self.order1.id)
+        etag = self.client.get(self.order_url)['ETag']
+        self.client.patch(self.order_url, {'status': 'готово'}, format='json')
+
+        # Экземпляр загружен до изменения статуса: его сохранение не должно повторно выдать версию 2
+        stale.items = [{"position": "Чай", "price": 50}]
+        stale.save()
+        self.assertEqual(stale.version, 3)
+        self.order1.refresh_from_db()
+        self.assertEqual(self.order1.version, 3)
+
+        response = self.client.get(self.order_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"{self.order1.id}-3-json"')
+
+    def test_list_not_modified(self):
+        etag = self.client.get(self.list_url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=f'W/{etag}, "other"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Фильтр входит в ETag
+        self.assertNotEqual(self.client.get(self.list_url, {'table_number': 1})['ETag'], etag)
+
+    def test_page_not_modified(self):
+        # ETag страницы считается по ее заказам, поэтому ответ на обычный запрос - по-прежнему один запрос
+        with self.assertNumQueries(1):
+            etag = self.client.get(self.list_url, {'page_size': 1})['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Изменение заказа, попавшего на страницу, меняет ETag
+        Order.objects.filter(id=self.order1.id).update(status='готово')
+        response = self.client.get(self.list_url, {'page_size': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_changes_on_every_write(self):
+        etags = [self.client.get(self.list_url)['ETag']]
+
+        Order.objects.filter(id=self.order1.id).update(status='готово')
+        etags.append(self.client.get(self.list_url)['ETag'])
+        Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 100}])
+        etags.append(self.client.get(self.list_url)['ETag'])
+        self.order2.delete()
+        etags.append(self.client.get(self.list_url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 4)
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_list_etag_order_leaves_and_enters(self):
+        # B (меньший id) входит в выборку, A выходит, C остается: количество, максимальный id
+        # и сумма версий заказов выборки не меняются, а ETag меняется
+        order_b = Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 100}])
+        order_a = Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 100}])
+        Order.objects.filter(id=order_a.id).update(status='готово')
+        Order.objects.create(table_number=3, status='готово', items=[{"position": "Кола", "price": 100}])
+        params = {'status': 'готово'}
+        etag = self.client.get(self.list_url, params)['ETag']
+
+        Order.objects.filter(id=order_a.id).update(status='оплачено')
+        Order.objects.filter(id=order_b.id).update(status='готово')
+
+        response = self.client.get(self.list_url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.list_url, params, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+class UpdateReturningRowsTestCase(QueryBudgetTestCase):
+    # update_returning_rows использует внутренний API ORM (UpdateQuery), тест фиксирует его поведение
+    def setUp(self):
+        self.order1 = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.order2 = Order.objects.create(table_number=2, items=[{"position": "Чай", "price": 50}])
+        self.fields = [Order._meta.get_field(name) for name in ('id', 'items', 'status', 'version')]
+
+    def test_returns_converted_values_after_update(self):
+        queryset = Order.objects.filter(table_number__in=[1, 2]).exclude(id=self.order2.id)
+        with self.assertNumQueries(1):
+            rows = update_returning_rows(queryset, {'status': 'готово', 'version': F('version') + 1}, self.fields)
+
+        # Значения после изменения, JSON уже разобран
+        self.assertEqual(rows, [(self.order1.id, [{"position": "Кола", "price": 100}], 'готово', 2)])
+        self.assertEqual(Order.objects.get(id=self.order2.id).status, 'в ожидании')
+
+    def test_filter_on_related_rows(self):
+        # Фильтр по связанной таблице: компилятор переносит условие в подзапрос id IN (...)
+        queryset = Order.objects.filter(order_items__position='Чай')
+        rows = update_returning_rows(queryset, {'table_number': 7}, self.fields[:1])
+
+        self.assertEqual(rows, [(self.order2.id,)])
+        self.assertEqual(update_returning_rows(Order.objects.filter(id=0), {'table_number': 7}, self.fields), [])
+
+
+    def test_update_returns_row_count(self):
+        # update() не создает экземпляры заказов и возвращает из БД только id для кэша
+        with CaptureQueriesContext(connection) as queries, mock.patch.object(Order, 'from_db') as from_db:
+            updated = Order.objects.filter(table_number__in=[1, 2]).update(status='готово')
+
+        self.assertEqual(updated, 2)
+        from_db.assert_not_called()
+        self.assertTrue(queries[-1]['sql'].endswith('RETURNING "id"'))
+        self.assertEqual(list(Order.objects.order_by('id').values_list('status', 'version')),
+                         [('готово', 2), ('готово', 2)])
+
+
+class OrderCacheTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        cache.clear()
+        order_cache.reset_stats()
+        self.client = APIClient()
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.url = reverse('order_update_status', kwargs={'pk': self.order.id})
+
+    def get_table_number(self):
+        return self.client.get(self.url).data['table_number']
+
+    def test_hits_and_misses(self):
+        self.client.get(self.url)
+        # Повторное чтение заказа, в том числе другим представлением, берется из кэша без запросов
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('order_update_items', kwargs={'pk': self.order.id}))
+            Client().get(reverse('update_order_items', kwargs={'pk': self.order.id}))
+        self.assertEqual(response.data['items'], [{"position": "Кола", "price": 100}])
+
+        self.assertEqual(self.client.get(reverse('order_cache_stats')).data,
+                         {'hits': 2, 'misses': 1, 'waits': 0, 'hit_ratio': 0.6667})
+
+        # Несуществующий заказ не кэшируется
+        self.assertEqual(self.client.get(reverse('order_update_status', kwargs={'pk': 999999})).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_invalidation_on_every_write(self):
+        self.get_table_number()
+
+        # Изменение в обход ORM не видно, пока запись не удалена из кэша
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE management_system_app_order SET table_number = 77 WHERE id = %s', [self.order.id])
+        self.assertEqual(self.get_table_number(), 1)
+
+        self.order.table_number = 2
+        self.order.save(update_fields=['table_number'])
+        self.assertEqual(self.get_table_number(), 2)
+
+        Order.objects.filter(id=self.order.id).update(table_number=3)
+        self.assertEqual(self.get_table_number(), 3)
+
+        self.client.patch(reverse('order_update_items', kwargs={'pk': self.order.id}), format='json',
+                          data={'items': [{"position": "Чай", "price": 50}]})
+        self.assertEqual(self.client.get(self.url).data['total_price'], 50)
+
+        Order.objects.filter(id=self.order.id).update(total_price=0)
+        self.client.get(self.url)
+        call_command('recompute_totals', stdout=StringIO())
+        self.assertEqual(self.client.get(self.url).data['total_price'], 50)
+
+        Order.objects.filter(id=self.order.id).delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_instance_delete(self):
+        self.get_table_number()
+        self.order.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalidation_during_load(self):
+        test_cache = ReadThroughCache('test')
+
+        # Значение изменилось, пока его загружали: устаревшее значение не сохраняется в кэш
+        def load(key):
+            test_cache.invalidate([key])
+            return 'old'
+        self.assertEqual(test_cache.get(1, load), 'old')
+        self.assertEqual(test_cache.get(1, lambda key: 'new'), 'new')
+        self.assertEqual(test_cache.get(1, lambda key: 'newer'), 'new')
+
+    def test_stampede(self):
+        test_cache = ReadThroughCache('test', wait_timeout=5)
+        loads = []
+
+        def load(key):
+            loads.append(key)
+            time.sleep(0.1)
+            return 'value'
+
+        # Одновременные промахи по одному ключу загружают значение один раз
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            values = list(executor.map(lambda _: test_cache.get(1, load), range(8)))
+        self.assertEqual(values, ['value'] * 8)
+        self.assertEqual(loads, [1])
+        self.assertEqual(test_cache.stats()['waits'], 7)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location, self.settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                        'orders': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                   'LOCATION': location}},
+                ORDER_CACHE_ALIAS='orders'):
+            self.assertEqual(self.get_table_number(), 1)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.get_table_number(), 1)
+
+            self.order.table_number = 2
+            self.order.save()
+            self.assertEqual(self.get_table_number(), 2)
+
+class OrderAPIConditionalUpdateTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.status_url = reverse('order_update_status', kwargs={'pk': self.order.id})
+        self.items_url = reverse('order_update_items', kwargs={'pk': self.order.id})
+
+    def test_update_with_current_version(self):
+        etag = self.client.get(self.status_url)['ETag']
+
+        # Один запрос UPDATE ... RETURNING, без чтения заказа перед изменением
+        with self.assertNumQueries(1):
+            response = self.client.patch(self.status_url, {'status': 'готово'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'готово')
+        self.assertEqual(response['ETag'], f'"{self.order.id}-2-json"')
+
+        response = self.client.put(self.items_url, {'items': [{"position": "Чай", "price": 50.5}]},
+                                   format='json', HTTP_IF_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_price'], 50.5)
+        self.assertEqual(list(self.order.order_items.values_list('position', flat=True)), ['Чай'])
+
+    def test_stale_version(self):
+        etag = self.client.get(self.status_url)['ETag']
+        self.client.patch(self.status_url, {'status': 'готово'}, format='json')
+
+        # Заказ изменен другим официантом: 412, изменения не применяются
+        response = self.client.put(self.items_url, {'items': [{"position": "Чай", "price": 50}]},
+                                   format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertIn('version error', response.data)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.total_price, self.order.version), (100, 2))
+        self.assertEqual(self.order.order_items.get().position, 'Кола')
+
+        # Слабый тег и тег другого заказа не подходят
+        response = self.client.patch(self.status_url, {'status': 'оплачено'}, format='json',
+                                     HTTP_IF_MATCH=f'W/"{self.order.id}-2-json", "{self.order.id + 1}-2-json"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_missing_order(self):
+        url = reverse('order_update_status', kwargs={'pk': self.order.id + 100})
+
+        response = self.client.patch(url, {'status': 'готово'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.patch(url, {'status': 'готово'}, format='json', HTTP_IF_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_same_status_keeps_version(self):
+        response = self.client.patch(self.status_url, {'status': 'в ожидании'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], f'"{self.order.id}-1-json"')
+
+class OrderAPIExportTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_export')
+        self.order1 = Order.objects.create(table_number=1, items=[{"position": "Шашлык", "price": 100}],
+                                           status='оплачено')
+        self.order2 = Order.objects.create(table_number=2, items=[{"position": "Кола, 0.5", "price": 99.99}])
+
+    def test_export_ndjson(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        # Каждая строка совпадает с представлением заказа в API
+        self.assertEqual(rows, self.client.get(reverse('order_list')).json())
+
+    def test_export_csv_with_filter(self):
+        response = self.client.get(self.url, {'format': 'csv', 'table_number': 2})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        header, *rows = csv.reader(b''.join(response.streaming_content).decode().splitlines())
+        self.assertEqual(header, ['id', 'table_number', 'items', 'total_price', 'status'])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][:2] + rows[0][3:], [str(self.order2.id), '2', '99.99', 'в ожидании'])
+        self.assertEqual(json.loads(rows[0][2]), self.order2.items)
+
+    def test_export_invalid_params(self):
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('format param error', response.data)
+
+        response = self.client.get(self.url, {'status': 'готов'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status param error', response.data)
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command('export_orders', '--status', 'оплачено', '--chunk-size', '1', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.order1.id])
+
+        with self.assertRaises(CommandError):
+            call_command('export_orders', '--table-number', 'один', stdout=StringIO())
+
+class AsyncOrderAPITestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order1 = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        self.order2 = Order.objects.create(table_number=2, items=[{"position": "Чай", "price": 50}], status='оплачено')
+
+    async def test_list_matches_sync_endpoint(self):
+        for params in ({}, {'status': 'оплачено'}, {'page_size': 1}):
+            response = await self.async_client.get(reverse('async_order_list'), params)
+            sync_response = await sync_to_async(APIClient().get)(reverse('order_list'), params)
+
+            # Тело ответа совпадает с синхронным эндпоинтом (ссылка next ведет на свой эндпоинт)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content.replace(b'/api/v1/async/', b'/api/v1/'), sync_response.content)
+
+        # ETag списка зависит от URL, поэтому проверяем его по ответу самого асинхронного эндпоинта
+        etag = response['ETag']
+        response = await self.async_client.get(reverse('async_order_list'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await self.async_client.get(reverse('async_order_list'), {'page_size': 1},
+                                               headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_list_errors(self):
+        response = await self.async_client.get(reverse('async_order_list'), {'status': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status param error', response.json())
+
+        response = await self.async_client.get(reverse('async_order_list'), {'table_number': 99})
+        self.assertEqual(response.json(), {'no orders error': 'Заказы не найдены.'})
+
+    async def test_retrieve(self):
+        url = reverse('async_order_retrieve', kwargs={'pk': self.order1.id})
+        response = await self.async_client.get(url)
+        sync_response = await sync_to_async(APIClient().get)(
+            reverse('order_update_status', kwargs={'pk': self.order1.id}))
+
+        self.assertEqual(response.content, sync_response.content)
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.get(reverse('async_order_retrieve', kwargs={'pk': self.order2.id + 1}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_total_revenue(self):
+        response = await self.async_client.get(reverse('async_get_total_revenue'))
+
+        self.assertEqual(response.json(), {'total_revenue': 50.0})
+
+    async def test_export(self):
+        response = await self.async_client.get(reverse('async_order_export'), {'format': 'csv'})
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0], ['id', 'table_number', 'items', 'total_price', 'status'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.order1.id, self.order2.id])
+
+        response = await self.async_client.get(reverse('async_order_export'), {'format': 'xml'})
+        self.assertIn('format param error', response.json())
+
+class OrderEventsTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        # Брокер общий для всех тестов: начинаем с последней записи журнала
+        broker.restart(None)
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+
+    def published_events(self, action):
+        # События строятся по журналу изменений: опрос журнала до и после действия
+        broker.poll()
+        last_event_id = broker.last_event_id
+        action()
+        broker.poll()
+        return [(event.type, event.order['id']) for event in broker.buffer if event.id > last_event_id]
+
+    def test_every_write_path_publishes_events(self):
+        client = APIClient()
+        status_url = reverse('order_update_status', args=[self.order.id])
+
+        events = self.published_events(lambda: client.post(reverse('order_create'), format='json', data={
+            'table_number': 2, 'items': [{"position": "Чай", "price": 50}]}))
+        self.assertEqual(events, [('created', Order.objects.latest('id').id)])
+
+        events = self.published_events(lambda: client.patch(status_url, {'status': 'готово'}, format='json'))
+        self.assertEqual(events, [('status_changed', self.order.id)])
+
+        events = self.published_events(lambda: client.put(reverse('order_update_items', args=[self.order.id]),
+                                                          {'items': [{"position": "Чай", "price": 5}]}, format='json'))
+        self.assertEqual(events, [('items_changed', self.order.id)])
+
+        events = self.published_events(lambda: client.post(reverse('order_bulk_update_status'), format='json',
+                                                           data={'ids': [self.order.id], 'status': 'оплачено'}))
+        self.assertEqual(events, [('status_changed', self.order.id)])
+
+        events = self.published_events(lambda: client.post(reverse('order_bulk_create'), format='json', data=[
+            {'table_number': 3, 'items': [{"position": "Чай", "price": 1}]}]))
+        self.assertEqual([event_type for event_type, order_id in events], ['created'])
+
+        events = self.published_events(lambda: client.delete(reverse('order_delete', args=[self.order.id])))
+        self.assertEqual(events, [('deleted', self.order.id)])
+
+        events = self.published_events(lambda: Order.objects.filter(table_number=3).delete())
+        self.assertEqual([event_type for event_type, order_id in events], ['deleted'])
+
+    def test_web_writes_publish_events(self):
+        events = self.published_events(lambda: self.client.post(reverse('update_order_items', args=[self.order.id]), {
+            'items': '[{"position": "Чай", "price": 5}]'}))
+        self.assertEqual(events, [('items_changed', self.order.id)])
+        self.assertEqual(broker.buffer[-1].order, {'id': self.order.id, 'table_number': 1,
+                                                   'items': [{"position": "Чай", "price": 5}], 'total_price': 5,
+                                                   'status': 'в ожидании'})
+
+        events = self.published_events(lambda: self.client.post(reverse('delete_order'), {'order_id': self.order.id}))
+        self.assertEqual(events, [('deleted', self.order.id)])
+        self.assertEqual(broker.buffer[-1].order, {'id': self.order.id})
+
+    def test_rolled_back_changes_are_not_published(self):
+        broker.poll()
+        last_event_id = broker.last_event_id
+        with transaction.atomic():
+            Order.objects.filter(id=self.order.id).update(status='готово')
+            transaction.set_rollback(True)
+        broker.poll()
+
+        self.assertEqual(broker.last_event_id, last_event_id)
+
+    def test_pruned_changes_restart_buffer(self):
+        broker.poll()
+        Order.objects.filter(id=self.order.id).update(status='готово')
+        OrderChange.objects.filter(seq__gt=broker.last_event_id).delete()
+        OrderChange.objects.create(action=OrderChange.PRUNED)
+
+        broker.poll()
+        self.assertEqual(broker.last_event_id, OrderChange.latest_seq())
+        self.assertEqual(list(broker.buffer), [])
+
+
+@override_settings(ORDER_EVENTS_POLL_INTERVAL=0)
+class OrderEventStreamTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        broker.restart(None)
+
+    async def close_response(self, response):
+        # ASGI-обработчик закрывает ответ после отключения клиента. Сигнал request_finished закрыл бы
+        # соединение с БД, в транзакции которого идет тест, поэтому он отключается, как в тестовом клиенте
+        request_finished.disconnect(close_old_connections)
+        try:
+            await sync_to_async(response.close)()
+        finally:
+            request_finished.connect(close_old_connections)
+
+    async def read_event(self, stream):
+        return await asyncio.wait_for(anext(stream), 1)
+
+    def event(self, event_type, order_id, status):
+        return OrderEvent(broker.last_event_id + 1, event_type, {'id': order_id, 'table_number': 1, 'status': status})
+
+    async def test_stream_filters_and_resume(self):
+        response = await self.async_client.get(reverse('order_events'), {'status': 'готово'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            self.assertEqual(await self.read_event(stream), b'retry: 3000\n\n')
+
+            broker.publish([self.event('created', 1, 'в ожидании')])
+            broker.publish([self.event('created', 2, 'готово')])
+            broker.publish([OrderEvent(broker.last_event_id + 1, 'deleted', {'id': 1})])
+
+            # Заказ с другим статусом пропускается, удаление приходит экрану с любым фильтром
+            first, second = await self.read_event(stream), await self.read_event(stream)
+            self.assertEqual(first.decode('utf-8'),
+                             f'id: {broker.last_event_id - 1}\nevent: created\n'
+                             f'data: {{"id":2,"table_number":1,"status":"готово"}}\n\n')
+            self.assertIn(b'event: deleted', second)
+        finally:
+            await self.close_response(response)
+        # Поток закрывается вместе с ответом, и подписка удаляется
+        self.assertEqual(broker.subscriptions, set())
+
+        # Переподключение с Last-Event-ID: только пропущенные события из буфера
+        response = await self.async_client.get(reverse('order_events'),
+                                               headers={'Last-Event-ID': str(broker.last_event_id - 1)})
+        stream = response.streaming_content
+        try:
+            await self.read_event(stream)
+            self.assertIn(b'event: deleted', await self.read_event(stream))
+        finally:
+            await self.close_response(response)
+
+
+# Журнал читается в отдельном потоке со своим соединением с БД (events.read_journal),
+# поэтому записи журнала должны быть зафиксированы, а не оставаться в транзакции теста
+@override_settings(ORDER_EVENTS_POLL_INTERVAL=0)
+class OrderEventStreamBacklogTestCase(TransactionTestCase):
+    def setUp(self):
+        broker.restart(None)
+
+    async def read_event(self, stream):
+        return await asyncio.wait_for(anext(stream), 1)
+
+    async def test_journal_read_does_not_block_async_orm(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_read():
+            started.set()
+            release.wait(timeout=5)
+            return 1
+
+        read = asyncio.ensure_future(read_journal(slow_read))
+        self.assertTrue(await asyncio.to_thread(started.wait, 5))
+        # Пока журнал читается, асинхронные обращения к ORM выполняются
+        self.assertEqual(await asyncio.wait_for(Order.objects.acount(), 1), 0)
+        release.set()
+        self.assertEqual(await read, 1)
+
+    async def test_stream_backlog_from_changes(self):
+        last_event_id = await sync_to_async(OrderChange.latest_seq)()
+        order = await Order.objects.acreate(table_number=5, items=[{"position": "Кола", "price": 100}])
+
+        # Буфер брокера не содержит событий после Last-Event-ID (например, его выдал другой процесс):
+        # пропущенные события читаются из журнала изменений
+        with mock.patch.object(broker, 'last_event_id', None):
+            response = await self.async_client.get(reverse('order_events'), {'table_number': 5},
+                                                   headers={'Last-Event-ID': str(last_event_id)})
+        stream = response.streaming_content
+        try:
+            await self.read_event(stream)
+            event = (await self.read_event(stream)).decode('utf-8')
+            self.assertIn(f'event: created\ndata: {{"id":{order.id},"table_number":5,', event)
+
+            # То же событие из подписки не отправляется повторно
+            seq = int(event.split('\n')[0].removeprefix('id: '))
+            broker.publish([OrderEvent(seq, 'created', {'id': order.id, 'table_number': 5, 'status': 'готово'}),
+                            OrderEvent(seq + 1, 'deleted', {'id': order.id})])
+            self.assertEqual(await self.read_event(stream), f'id: {seq + 1}\nevent: deleted\n'
+                                                            f'data: {{"id":{order.id}}}\n\n'.encode('utf-8'))
+        finally:
+            await sync_to_async(response.close)()
+
+    async def test_stream_reset_for_pruned_event_id(self):
+        # Записи журнала после Last-Event-ID удалены командой prune_order_changes
+        await OrderChange.objects.acreate(action=OrderChange.PRUNED)
+        response = await self.async_client.get(reverse('order_events'), headers={'Last-Event-ID': '0'})
+        stream = response.streaming_content
+        try:
+            await self.read_event(stream)
+            self.assertIn(b'event: reset', await self.read_event(stream))
+        finally:
+            await sync_to_async(response.close)()
+
+        response = await self.async_client.get(reverse('order_events'), headers={'Last-Event-ID': 'x'})
+        stream = response.streaming_content
+        try:
+            await self.read_event(stream)
+            self.assertIn(b'event: reset', await self.read_event(stream))
+        finally:
+            await sync_to_async(response.close)()
+
+        response = await self.async_client.get(reverse('order_events'), {'status': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(ORDER_EVENTS_POLL_INTERVAL=0.01)
+class OrderEventPollerTestCase(TransactionTestCase):
+    def setUp(self):
+        broker.restart(None)
+
+    async def test_changes_from_other_connections_are_streamed(self):
+        response = await self.async_client.get(reverse('order_events'))
+        stream = response.streaming_content
+        try:
+            await asyncio.wait_for(anext(stream), 5)
+            poller = broker.poller
+
+            # Заказ создается другим соединением с БД, как если бы запрос обработал другой процесс
+            def create_order():
+                try:
+                    return Order.objects.create(table_number=6, items=[{"position": "Кола", "price": 100}])
+                finally:
+                    connections.close_all()
+            order = await asyncio.to_thread(create_order)
+
+            event = (await asyncio.wait_for(anext(stream), 5)).decode('utf-8')
+            self.assertIn(f'event: created\ndata: {{"id":{order.id},"table_number":6,', event)
+        finally:
+            await sync_to_async(response.close)()
+        # Без подписок поток опроса завершается и закрывает свое соединение с БД
+        await asyncio.to_thread(poller.join, 5)
+        self.assertFalse(poller.is_alive())
+        self.assertIsNone(broker.poller)
+
+
+class OrderChangesTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_changes')
+        self.since = self.client.get(self.url).data['next_since']
+
+    def test_changes_from_every_write_path(self):
+        self.client.post(reverse('order_create'), format='json', data={
+            'table_number': 2, 'items': [{"position": "Чай", "price": 50}]})
+        order = Order.objects.get()
+        # Изменение статуса через веб-интерфейс (queryset.update) и повторная установка того же статуса
+        Client().post(reverse('update_order_status'), {'order_id': order.id, 'status': 'готово'})
+        Client().post(reverse('update_order_status'), {'order_id': order.id, 'status': 'готово'})
+        self.client.delete(reverse('order_delete', args=[order.id]))
+
+        response = self.client.get(self.url, {'since': self.since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = response.data['changes']
+        self.assertEqual([(change['action'], change['order_id']) for change in changes],
+                         [('created', order.id), ('updated', order.id), ('deleted', order.id)])
+        self.assertEqual(changes[1]['order'], {'id': order.id, 'table_number': 2, 'items': [{"position": "Чай", "price": 50}],
+                                               'total_price': 50, 'status': 'готово', 'version': 2})
+        # Удаленный заказ приходит без данных
+        self.assertIsNone(changes[2]['order'])
+        self.assertEqual(response.data['next_since'], changes[2]['seq'])
+        self.assertFalse(response.data['has_more'])
+
+        response = self.client.get(self.url, {'since': response.data['next_since']})
+        self.assertEqual(response.data['changes'], [])
+
+    def test_limit(self):
+        Order.objects.bulk_create([Order(table_number=n, items=[], total_price=0) for n in range(1, 4)])
+
+        response = self.client.get(self.url, {'since': self.since, 'limit': 2})
+        self.assertEqual(len(response.data['changes']), 2)
+        self.assertTrue(response.data['has_more'])
+
+        response = self.client.get(self.url, {'since': response.data['next_since'], 'limit': 2})
+        self.assertEqual(len(response.data['changes']), 1)
+        self.assertFalse(response.data['has_more'])
+
+        self.assertIn('since param error', self.client.get(self.url, {'since': -1}).data)
+        self.assertIn('limit param error', self.client.get(self.url, {'since': 0, 'limit': 'x'}).data)
+
+    def test_prune(self):
+        orders = Order.objects.bulk_create([Order(table_number=n, items=[], total_price=0) for n in range(1, 4)])
+        seqs = list(OrderChange.objects.filter(seq__gt=self.since).order_by('seq').values_list('seq', flat=True))
+        # Две первые записи старше срока хранения
+        OrderChange.objects.filter(seq__in=seqs[:2]).update(created_at=timezone.now() - timedelta(days=10))
+
+        out = StringIO()
+        call_command('prune_order_changes', '--days', '7', stdout=out)
+        self.assertIn('Удалено записей журнала изменений: 2', out.getvalue())
+
+        # Клиент, синхронизированный до удаленных записей, должен загрузить заказы заново
+        response = self.client.get(self.url, {'since': seqs[0]})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        response = self.client.get(self.url, {'since': seqs[1]})
+        self.assertEqual([change['order_id'] for change in response.data['changes']], [orders[2].id])
+
+class OrderChangesConcurrencyTestCase(TransactionTestCase):
+    def read_changes(self, since):
+        try:
+            return APIClient().get(reverse('order_changes'), {'since': since}).data
+        finally:
+            connections.close_all()
+
+    def wait_for_reader(self, reader):
+        # Читатель либо уже ответил, либо ждет блокировку - в обоих случаях следующий писатель приходит после него
+        with connection.cursor() as cursor:
+            for _ in range(500):
+                if reader.done():
+                    return
+                cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                if cursor.fetchone()[0]:
+                    return
+                time.sleep(0.01)
+        raise AssertionError('Чтение журнала не завершилось.')
+
+    def test_commit_out_of_seq_order(self):
+        order1 = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        order2 = Order.objects.create(table_number=2, items=[{"position": "Кола", "price": 100}])
+        since = OrderChange.latest_seq()
+        written, commit = threading.Event(), threading.Event()
+
+        def slow_writer():
+            # Транзакция получает меньший номер seq, но фиксируется последней
+            try:
+                with transaction.atomic():
+                    Order.objects.filter(id=order1.id).update(status='готово')
+                    written.set()
+                    commit.wait(timeout=10)
+            finally:
+                connections.close_all()
+
+        def late_writer():
+            try:
+                Order.objects.filter(id=order2.id).update(status='готово')
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            writer = executor.submit(slow_writer)
+            self.assertTrue(written.wait(timeout=10))
+
+            reader = executor.submit(self.read_changes, since)
+            self.wait_for_reader(reader)
+            # Писатель, пришедший после читателя, не ждет ни его, ни незавершенную транзакцию
+            executor.submit(late_writer).result(timeout=5)
+
+            # Читатель не ждет незавершенную транзакцию и не отдает seq второго изменения без первого
+            data = reader.result(timeout=5)
+            self.assertEqual(data['changes'], [])
+            self.assertEqual(data['next_since'], since)
+            self.assertEqual(OrderChange.latest_seq(), since)
+
+            commit.set()
+            writer.result()
+
+        data = self.read_changes(since)
+        changes = [(change['seq'], change['order_id']) for change in data['changes']]
+        self.assertEqual([order_id for seq, order_id in changes], [order1.id, order2.id])
+        self.assertEqual(changes, sorted(changes))
+        self.assertEqual(data['next_since'], changes[-1][0])
+
+
+class OrderAPIUpdateStatusTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = APIClient()
         # Создаем тестовый заказ
@@ -332,7 +1750,352 @@ class OrderAPIUpdateStatusTestCase(TestCase):
         self.assertEqual(self.order.table_number, 4)  # Поле table_number не изменилось
         self.assertEqual(self.order.status, 'готово')  # Поле status изменилось
 
-class OrderAPIUpdateItemsTestCase(TestCase):
+class OrderAPIBulkUpdateStatusTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_bulk_update_status')
+        self.order1 = Order.objects.create(table_number=1, items=[{"position": "Шашлык", "price": 100}])
+        self.order2 = Order.objects.create(table_number=2, items=[{"position": "Шашлык", "price": 200}])
+        self.order3 = Order.objects.create(table_number=3, items=[{"position": "Шашлык", "price": 300}],
+                                           status='оплачено')
+
+    def test_bulk_update_status(self):
+        ids = [self.order1.id, self.order2.id, self.order3.id, 999999]
+
+        response = self.client.post(self.url, data={'ids': ids, 'status': 'оплачено'}, format='json')
+
+        # Изменились только два заказа, третий уже был оплачен
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': 2, 'missing_ids': [999999]})
+        self.assertEqual(Order.objects.filter(status='оплачено').count(), 3)
+        self.assertEqual(RevenueLedger.get_total_revenue(), 600)
+
+    def test_bulk_update_invalid_status(self):
+        response = self.client.post(self.url, data={'ids': [self.order1.id], 'status': 'доставка'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('status', response.data)
+        self.order1.refresh_from_db()
+        self.assertEqual(self.order1.status, 'в ожидании')
+
+    def test_bulk_update_empty_ids(self):
+        response = self.client.post(self.url, data={'ids': [], 'status': 'готово'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
+
+class OrderAPIBatchTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_batch')
+        self.order1 = Order.objects.create(table_number=5, items=[{"position": "Шашлык", "price": 100}])
+        self.order2 = Order.objects.create(table_number=5, items=[{"position": "Шашлык", "price": 200}])
+        self.order3 = Order.objects.create(table_number=5, items=[{"position": "Шашлык", "price": 300}])
+
+    def close_table_operations(self):
+        return [
+            {'op': 'create', 'data': {'table_number': 5, 'items': [{'position': 'Чай', 'price': 50}]}},
+            {'op': 'update_items', 'id': self.order1.id, 'data': {'items': [{'position': 'Суп', 'price': 150}]}},
+            {'op': 'update_status', 'id': self.order1.id, 'data': {'status': 'оплачено'}},
+            {'op': 'update_status', 'id': self.order2.id, 'data': {'status': 'оплачено'}},
+            {'op': 'update_status', 'id': self.order3.id, 'data': {'status': 'оплачено'}},
+        ]
+
+    def test_batch(self):
+        response = self.client.post(self.url, data={'operations': self.close_table_operations()}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['rolled_back'])
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 200, 200, 200, 200])
+        created = response.data['results'][0]['data']
+        self.assertEqual(created['total_price'], 50)
+        self.assertEqual(response.data['results'][1]['data']['total_price'], 150)
+        self.assertEqual(response.data['results'][2]['data']['status'], 'оплачено')
+
+        self.assertEqual(Order.objects.filter(table_number=5).count(), 4)
+        self.assertEqual(Order.objects.get(id=created['id']).order_items.count(), 1)
+        self.assertEqual(RevenueLedger.get_total_revenue(), 650)
+
+    def test_rollback_on_error(self):
+        operations = self.close_table_operations()
+        operations.insert(3, {'op': 'update_status', 'id': 999999, 'data': {'status': 'оплачено'}})
+
+        response = self.client.post(self.url, data={'operations': operations}, format='json')
+
+        # Выполнение остановлено на ошибке, изменения предыдущих операций отменены
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.data['rolled_back'])
+        self.assertEqual([result['status'] for result in response.data['results']], [201, 200, 200, 404])
+        self.assertEqual(Order.objects.count(), 3)
+        self.order1.refresh_from_db()
+        self.assertEqual((self.order1.status, self.order1.total_price), ('в ожидании', 100))
+        self.assertEqual(RevenueLedger.get_total_revenue(), 0)
+
+    def test_validation_error(self):
+        operations = [
+            {'op': 'update_status', 'id': self.order1.id, 'data': {'status': 'оплачено'}},
+            {'op': 'create', 'data': {'table_number': 5, 'items': []}},
+        ]
+
+        response = self.client.post(self.url, data={'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('items', response.data['results'][1]['errors'])
+        self.assertFalse(Order.objects.filter(status='оплачено').exists())
+
+    def test_continue_on_error(self):
+        operations = [
+            {'op': 'update_status', 'id': self.order1.id, 'data': {'status': 'оплачено'}},
+            {'op': 'update_items', 'id': self.order2.id, 'data': {'items': [{'position': 'Суп', 'price': '1'}]}},
+            {'op': 'update_status', 'id': 999999, 'data': {'status': 'оплачено'}},
+            {'op': 'update_status', 'id': self.order3.id, 'data': {'status': 'готово'}},
+        ]
+
+        response = self.client.post(self.url, data={'operations': operations, 'continue_on_error': True},
+                                    format='json')
+
+        # Откатываются только операции с ошибками
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['rolled_back'])
+        self.assertEqual([result['status'] for result in response.data['results']], [200, 400, 404, 200])
+        self.assertEqual(list(Order.objects.order_by('id').values_list('status', 'total_price')),
+                         [('оплачено', 100), ('в ожидании', 200), ('готово', 300)])
+
+    def test_continue_on_error_database_error(self):
+        # Сумма оплаченного заказа не помещается в numeric(16, 2) журнала выручки: триггер падает в БД
+        order = Order.objects.create(table_number=5, items=[{"position": "Банкет", "price": 1e15}])
+        operations = [
+            {'op': 'update_status', 'id': self.order1.id, 'data': {'status': 'оплачено'}},
+            {'op': 'update_status', 'id': order.id, 'data': {'status': 'оплачено'}},
+            {'op': 'update_status', 'id': self.order2.id, 'data': {'status': 'оплачено'}},
+        ]
+
+        response = self.client.post(self.url, data={'operations': operations, 'continue_on_error': True},
+                                    format='json')
+
+        # Откатывается только операция с ошибкой, остальные выполняются в той же транзакции
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['rolled_back'])
+        self.assertEqual([result['status'] for result in response.data['results']], [200, 500, 200])
+        self.assertIn('detail', response.data['results'][1]['errors'])
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'в ожидании')
+        self.assertEqual(RevenueLedger.get_total_revenue(), 300)
+
+        # Без continue_on_error ошибка БД откатывает весь пакет
+        operations = [{'op': 'update_status', 'id': self.order3.id, 'data': {'status': 'оплачено'}},
+                      {'op': 'update_status', 'id': order.id, 'data': {'status': 'оплачено'}}]
+        response = self.client.post(self.url, data={'operations': operations}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.data['rolled_back'])
+        self.assertEqual([result['status'] for result in response.data['results']], [200, 500])
+        self.order3.refresh_from_db()
+        self.assertEqual(self.order3.status, 'в ожидании')
+        self.assertEqual(RevenueLedger.get_total_revenue(), 300)
+
+    def test_invalid_request(self):
+        cases = [
+            ({'operations': []}, 'operations'),
+            ({'operations': [{'op': 'create', 'id': self.order1.id, 'data': {}}]}, 'operations'),
+            ({'operations': [{'op': 'delete', 'id': self.order1.id, 'data': {}}]}, 'operations'),
+            ({'operations': [{'op': 'update_status', 'data': {'status': 'готово'}}]}, 'operations'),
+            ({'operations': [{'op': 'create', 'data': {}}] * 101}, 'operations'),
+        ]
+        for data, field in cases:
+            response = self.client.post(self.url, data=data, format='json')
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(field, response.data)
+        self.assertEqual(Order.objects.filter(status='в ожидании').count(), 3)
+
+
+class IdempotencyKeyTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('order_create')
+        self.data = {'table_number': 4, 'items': [{'position': 'Чай', 'price': 50}]}
+
+    def post(self, key, data=None, url=None):
+        return self.client.post(url or self.url, data=data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_create(self):
+        response = self.post('key-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+        # Повтор не проверяет данные и не создает заказ: попытка занять ключ и чтение ответа
+        # (точки сохранения появляются только внутри транзакции теста)
+        with CaptureQueriesContext(connection) as queries:
+            replay = self.post('key-1')
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 2)
+
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.content, response.content)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OrderItem.objects.count(), 1)
+
+        # Другой ключ - новый заказ
+        self.assertEqual(self.post('key-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_for_other_request(self):
+        self.post('key-1')
+
+        for response in (self.post('key-1', data={'table_number': 5, 'items': self.data['items']}),
+                         self.post('key-1', url=reverse('order_bulk_create'), data=[self.data])):
+            self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+            self.assertIn('idempotency key error', response.data)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_replay_error_response(self):
+        data = {'table_number': 4, 'items': []}
+        response = self.post('key-1', data=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with mock.patch('management_system_app.serializers.OrderSerializer.validate') as validate:
+            replay = self.post('key-1', data=data)
+        self.assertEqual(replay.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(replay.content, response.content)
+        validate.assert_not_called()
+
+    def test_replay_update_and_delete(self):
+        order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+        url = reverse('order_update_status', args=[order.id])
+
+        response = self.client.patch(url, data={'status': 'оплачено'}, format='json', HTTP_IDEMPOTENCY_KEY='pay')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        replay = self.client.patch(url, data={'status': 'оплачено'}, format='json', HTTP_IDEMPOTENCY_KEY='pay')
+        self.assertEqual(replay.content, response.content)
+        self.assertEqual(replay['ETag'], response['ETag'])
+        order.refresh_from_db()
+        self.assertEqual(order.version, 2)
+        self.assertEqual(RevenueLedger.get_total_revenue(), 100)
+
+        url = reverse('order_delete', args=[order.id])
+        self.assertEqual(self.client.delete(url, HTTP_IDEMPOTENCY_KEY='del').status_code, status.HTTP_204_NO_CONTENT)
+        replay = self.client.delete(url, HTTP_IDEMPOTENCY_KEY='del')
+        self.assertEqual(replay.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_expired_key(self):
+        self.post('key-1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        # Просроченный ключ занимается заново
+        response = self.post('key-1', data={'table_number': 5, 'items': self.data['items']})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+        IdempotencyKey.objects.create(key='key-2', fingerprint='', expires_at=timezone.now() - timedelta(days=1))
+        call_command('prune_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['key-1'])
+
+    def test_failed_request_releases_key(self):
+        with mock.patch('management_system_app.serializers.OrderSerializer.create', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            self.post('key-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post('key-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+
+    # бюджеты запросов посчитаны для анонимных запросов, а здесь добавляются чтение сессии и пользователя
+    @override_settings(QUERY_BUDGETS_MODE='')
+    def test_session_multipart_request(self):
+        # Проверка CSRF для пользователя с сессией читает multipart-тело раньше, чем DRF вызывает initial
+        client = APIClient(enforce_csrf_checks=True)
+        client.force_login(User.objects.create_user('waiter'))
+        client.cookies['csrftoken'] = 'a' * 32
+        data = {'csrfmiddlewaretoken': 'a' * 32, 'ids': [1], 'status': 'готово'}
+
+        response = client.post(reverse('order_bulk_update_status'), data=data, HTTP_IDEMPOTENCY_KEY='form')
+        replay = client.post(reverse('order_bulk_update_status'), data=data, HTTP_IDEMPOTENCY_KEY='form')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay.content, response.content)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+
+    def test_invalid_key(self):
+        response = self.post('x' * 256)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('idempotency key error', response.data)
+        self.assertFalse(Order.objects.exists())
+
+
+# одновременные запросы с одним ключом выполняются в разных соединениях, поэтому нужны настоящие транзакции
+class IdempotencyKeyConcurrencyTestCase(TransactionTestCase):
+    def test_concurrent_requests(self):
+        create = OrderSerializer.create
+
+        claimed = threading.Event()
+
+        def create_when_second_waits(serializer, validated_data):
+            # Первый запрос занял ключ: запускаем второй и продолжаем, только когда он ждет блокировку ключа
+            claimed.set()
+            with connection.cursor() as cursor:
+                for _ in range(500):
+                    cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                    if cursor.fetchone()[0]:
+                        break
+                    time.sleep(0.01)
+                else:
+                    raise AssertionError('Второй запрос не ждет блокировку ключа.')
+            return create(serializer, validated_data)
+
+        def post():
+            try:
+                return APIClient().post(reverse('order_create'), format='json', HTTP_IDEMPOTENCY_KEY='key-1',
+                                        data={'table_number': 4, 'items': [{'position': 'Чай', 'price': 50}]})
+            finally:
+                connections.close_all()
+
+        with mock.patch('management_system_app.serializers.OrderSerializer.create', create_when_second_waits), \
+                ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(post)
+            self.assertTrue(claimed.wait(timeout=10))
+            second = executor.submit(post)
+            responses = [first.result(), second.result()]
+
+        self.assertEqual([response.status_code for response in responses], [201, 201])
+        self.assertEqual(responses[0].content, responses[1].content)
+        self.assertNotIn('Idempotent-Replayed', responses[0])
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OrderAPILookupTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.order1 = Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 100}])
+        self.order2 = Order.objects.create(table_number=3, items=[{"position": "Кола", "price": 100}], status='готово')
+        self.order3 = Order.objects.create(table_number=self.order1.id, items=[{"position": "Кола", "price": 100}])
+        self.url = reverse('order_lookup')
+
+    def test_lookup_by_id_and_table(self):
+        response = self.client.get(self.url, {'q': self.order1.id})
+
+        # Заказ с таким id и заказы стола с таким номером, новые первыми
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data], [self.order3.id, self.order1.id])
+        self.assertEqual(response.data[1], {'id': self.order1.id, 'table_number': 3, 'status': 'в ожидании'})
+
+    def test_lookup_status_and_limit(self):
+        response = self.client.get(self.url, {'q': 3, 'status': 'готово'})
+        self.assertEqual([row['id'] for row in response.data], [self.order2.id])
+
+        response = self.client.get(self.url, {'q': 3, 'limit': 1})
+        self.assertEqual(len(response.data), 1)
+
+    def test_lookup_invalid_params(self):
+        self.assertIn('q param error', self.client.get(self.url, {'q': 'abc'}).data)
+        self.assertIn('limit param error', self.client.get(self.url, {'q': 3, 'limit': 0}).data)
+        self.assertIn('status param error', self.client.get(self.url, {'q': 3, 'status': 'x'}).data)
+
+class OrderAPIUpdateItemsTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = APIClient()
         self.order = Order.objects.create(
@@ -398,7 +2161,7 @@ class OrderAPIUpdateItemsTestCase(TestCase):
                          [{"position": "Шаурма", "price": 199.99},
                       {"position": "Минералка", "price": 100}])  # Поле items изменилось
 
-class OrderAPIDeleteTestCase(TestCase):
+class OrderAPIDeleteTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = APIClient()
         self.order = Order.objects.create(
@@ -428,7 +2191,7 @@ class OrderAPIDeleteTestCase(TestCase):
 # -----------------------------------------------------------------------------
 # Тесты для веб-интерфейса
 # -----------------------------------------------------------------------------
-class AddOrderTestCase(TestCase):
+class AddOrderTestCase(QueryBudgetTestCase):
     def setUp(self):
         # Создаем клиент для выполнения запросов
         self.client = Client()
@@ -475,7 +2238,7 @@ class AddOrderTestCase(TestCase):
         self.assertTemplateUsed(response, 'orders_crud_web_inter/add_order.html')
         self.assertFormError(response.context['form'], 'items', 'Обязательное поле.')
 
-class DeleteOrderTestCase(TestCase):
+class DeleteOrderTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = Client()
         # Создаем тестовые заказы
@@ -516,7 +2279,24 @@ class DeleteOrderTestCase(TestCase):
         # Проверяем, что произошло перенаправление
         self.assertRedirects(response, reverse('delete_order'))
 
-class GetAllOrdersTestCase(TestCase):
+    def test_form_checks_order_by_primary_key(self):
+        # Форма не загружает список заказов, а проверяет ID одним запросом
+        with self.assertNumQueries(0):
+            DeleteOrderForm()
+        with self.assertNumQueries(1):
+            form = DeleteOrderForm(data={'order_id': self.order2.id})
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.order.id, self.order2.id)
+
+    def test_post_missing_order(self):
+        response = self.client.post(self.url, data={'order_id': self.order2.id + 100})
+
+        # Форма возвращается с ошибкой, заказы не удаляются
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['form'].is_valid())
+        self.assertEqual(Order.objects.count(), 2)
+
+class GetAllOrdersTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = Client()
         self.order1 = Order.objects.create(
@@ -547,7 +2327,58 @@ class GetAllOrdersTestCase(TestCase):
         self.assertContains(response, 4)
         self.assertContains(response, 14)
 
-class GetOrderTestCase(TestCase):
+    def test_pagination_and_filters(self):
+        for table_number in range(1, 61):
+            Order.objects.create(table_number=100 + table_number, items=[{"position": "Кола", "price": 100}])
+
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context['orders']), 50)
+        self.assertEqual(response.context['orders'].paginator.count, 62)
+
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(len(response.context['orders']), 12)
+
+        response = self.client.get(self.url, {'table_number': 14, 'status': 'в ожидании'})
+        self.assertEqual([order.id for order in response.context['orders']], [self.order2.id])
+
+    def test_rows_cached_by_version(self):
+        cache.clear()
+        self.client.get(self.url)
+
+        # Изменение в обход ORM без смены версии: строка берется из кэша
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE management_system_app_order SET table_number = 77 WHERE id = %s', [self.order1.id])
+        self.assertNotContains(self.client.get(self.url), '<td>77</td>')
+
+        # Изменение через ORM увеличивает версию, и строка перерисовывается
+        Order.objects.filter(id=self.order1.id).update(table_number=78)
+        self.assertContains(self.client.get(self.url), '<td>78</td>')
+
+class OrderVersionTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.order = Order.objects.create(table_number=1, items=[{"position": "Кола", "price": 100}])
+
+    def test_version_increments_on_every_write(self):
+        self.assertEqual(self.order.version, 1)
+
+        self.order.items = [{"position": "Кола", "price": 200}]
+        self.order.save()
+        self.assertEqual(self.order.version, 2)
+
+        self.order.status = 'готово'
+        self.order.save(update_fields=['status'])
+        Order.objects.filter(id=self.order.id).update(status='оплачено')
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.version, 4)
+
+    def test_bulk_create_version(self):
+        response = APIClient().post(reverse('order_bulk_create'), format='json',
+                                    data=[{'table_number': 2, 'items': [{'position': 'Кола', 'price': 1}]}])
+
+        self.assertEqual(Order.objects.get(id=response.data[0]['id']).version, 1)
+
+class GetOrderTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = Client()
 
@@ -654,7 +2485,7 @@ class GetOrderTestCase(TestCase):
         self.assertFormError(response.context['form'], None,
                              'Заполните хотя бы одно поле: номер стола или статус заказа.')
 
-class GetTotalRevenueTestCase(TestCase):
+class GetTotalRevenueTestCase(QueryBudgetTestCase):
     def setUp(self):
         # Создаем клиент для выполнения запросов
         self.client = Client()
@@ -730,7 +2561,7 @@ class GetTotalRevenueTestCase(TestCase):
         # Проверяем, что выручка 0 отображается на странице
         self.assertContains(response, '0')
 
-class UpdateOrderItemsTestCase(TestCase):
+class UpdateOrderItemsTestCase(QueryBudgetTestCase):
     def setUp(self):
         # Создаем клиент для выполнения запросов
         self.client = Client()
@@ -797,7 +2628,7 @@ class UpdateOrderItemsTestCase(TestCase):
         self.assertTemplateUsed(response, 'orders_crud_web_inter/update_order_items.html')
         self.assertFormError(response.context['form'], 'items', 'Обязательное поле.')
 
-class UpdateOrderStatusTestCase(TestCase):
+class UpdateOrderStatusTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.client = Client()
 
@@ -840,4 +2671,25 @@ class UpdateOrderStatusTestCase(TestCase):
         self.assertEqual(self.order1.status, 'готово')  # Проверяем, что статус обновлен
 
         # Проверяем, что произошло перенаправление
-        self.assertRedirects(response, reverse('update_order_status'))
\ No newline at end of file
+        self.assertRedirects(response, reverse('update_order_status'))
+
+    def test_post_is_single_update(self):
+        # Форма не обращается к базе данных, статус меняется одним запросом UPDATE
+        with self.assertNumQueries(0):
+            UpdateOrderStatusForm()
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, data={'order_id': self.order2.id, 'status': 'готово'})
+        self.assertEqual(response.status_code, 302)
+        self.order2.refresh_from_db()
+        self.assertEqual((self.order2.status, self.order2.version), ('готово', 2))
+
+        # Тот же статус не увеличивает версию заказа
+        self.client.post(self.url, data={'order_id': self.order2.id, 'status': 'готово'})
+        self.order2.refresh_from_db()
+        self.assertEqual(self.order2.version, 2)
+
+    def test_post_missing_order(self):
+        response = self.client.post(self.url, data={'order_id': self.order2.id + 100, 'status': 'готово'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('order_id', response.context['form'].errors)
@@ -1,8 +1,15 @@
 from django.urls import path
 
+from .async_views.order_events_view import AsyncOrderEventStream
+from .async_views.order_views import AsyncOrderAPIList, AsyncOrderAPIRetrieve, AsyncOrderAPIGetTotalRevenue, \
+    AsyncOrderAPIExport
+from .drf_views.batch_api_view import OrderAPIBatch
+from .drf_views.export_orders_api_view import OrderAPIExport
 from .drf_views.get_total_revenue_api_view import OrderAPIGetTotalRevenue
+from .drf_views.order_changes_api_view import OrderAPIChanges
+from .drf_views.revenue_api_view import OrderAPIRevenue
 from .drf_views.order_views import OrderAPIList, OrderAPICreate, OrderAPIUpdateStatus, OrderAPIDelete, \
-    OrderAPIUpdateItems
+    OrderAPIUpdateItems, OrderAPIBulkCreate, OrderAPIBulkUpdateStatus, OrderAPILookup, OrderAPICacheStats
 from .views import HomeView
 from .web_interface_views.add_order_view import AddOrder
 from .web_interface_views.delete_order_view import DeleteOrder
@@ -28,15 +35,51 @@ urlpatterns = [
 # urls для API:
 # -----------------------------------------------------------------------------
     path('api/v1/order_create/', OrderAPICreate.as_view(), name='order_create'),
+    # создание списка заказов одним запросом, тело запроса - список заказов в формате order_create
+    path('api/v1/orders/bulk_create/', OrderAPIBulkCreate.as_view(), name='order_bulk_create'),
 
     # следующий запрос возвращает как все заказы, так и по параметрам status и table_number,
     # если они переданы в запрос, например:
     # api/v1/order_list/?table_number=7, или api/v1/order_list/?status=в%20ожидании
+    # постраничный вывод включается параметрами page_size и cursor (курсор берется из поля next ответа),
+    # сортировка задается параметром ordering=id|status, например:
+    # api/v1/order_list/?page_size=50&ordering=status
     path('api/v1/order_list/', OrderAPIList.as_view(), name='order_list'),
 
+    # подсказки для выбора заказа: заказ с id=q и последние заказы стола q (id, номер стола и статус), например:
+    # api/v1/orders/lookup/?q=7&status=готово&limit=10
+    path('api/v1/orders/lookup/', OrderAPILookup.as_view(), name='order_lookup'),
+
     path('api/v1/order_update_status/<int:pk>/', OrderAPIUpdateStatus.as_view(), name='order_update_status'),
+    # изменение статуса списка заказов одним запросом, тело запроса: {"ids": [1, 2, 3], "status": "оплачено"}
+    path('api/v1/orders/bulk_update_status/', OrderAPIBulkUpdateStatus.as_view(), name='order_bulk_update_status'),
     path('api/v1/order_update_items/<int:pk>/', OrderAPIUpdateItems.as_view(), name='order_update_items'),
+    # пакет операций create / update_items / update_status в одной транзакции, например:
+    # {"operations": [{"op": "update_status", "id": 7, "data": {"status": "оплачено"}}], "continue_on_error": false}
+    path('api/v1/batch/', OrderAPIBatch.as_view(), name='order_batch'),
+    # попадания и промахи кэша заказов (GET order_update_status и order_update_items) в текущем процессе
+    path('api/v1/orders/cache_stats/', OrderAPICacheStats.as_view(), name='order_cache_stats'),
     path('api/v1/order_delete/<int:pk>/', OrderAPIDelete.as_view(), name='order_delete'),
+    # потоковая выгрузка заказов в NDJSON или CSV с фильтрами status и table_number, например:
+    # api/v1/orders/export/?format=csv&status=оплачено
+    path('api/v1/orders/export/', OrderAPIExport.as_view(), name='order_export'),
     path('api/v1/get_total_revenue/', OrderAPIGetTotalRevenue.as_view(), name='get_total_revenue_by_api'),
+    # выручка и количество заказов за период по часам, дням или столам, например:
+    # api/v1/revenue/?from=2025-03-07&to=2025-03-08&group_by=hour
+    path('api/v1/revenue/', OrderAPIRevenue.as_view(), name='revenue'),
+    # журнал изменений заказов для инкрементальной синхронизации: изменения с номером больше since, например:
+    # api/v1/changes/?since=1500&limit=100
+    path('api/v1/changes/', OrderAPIChanges.as_view(), name='order_changes'),
+# -----------------------------------------------------------------------------
+# асинхронные версии эндпоинтов чтения (для запуска через ASGI), параметры и ответы те же:
+# -----------------------------------------------------------------------------
+    path('api/v1/async/order_list/', AsyncOrderAPIList.as_view(), name='async_order_list'),
+    path('api/v1/async/orders/<int:pk>/', AsyncOrderAPIRetrieve.as_view(), name='async_order_retrieve'),
+    path('api/v1/async/orders/export/', AsyncOrderAPIExport.as_view(), name='async_order_export'),
+    path('api/v1/async/get_total_revenue/', AsyncOrderAPIGetTotalRevenue.as_view(),
+         name='async_get_total_revenue'),
+    # поток событий об изменении заказов (Server-Sent Events) с фильтрами status и table_number, например:
+    # api/v1/orders/events/?status=в%20ожидании
+    path('api/v1/orders/events/', AsyncOrderEventStream.as_view(), name='order_events'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,48 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.exceptions import ValidationError
+
+CENT = Decimal('0.01')
+
+
+# цена позиции, округленная до копеек, как ее округляет PostgreSQL: round(numeric, 2), половина - от нуля.
+# Округляется десятичная запись цены (та же, что хранится в jsonb), а не двоичное значение float,
+# поэтому суммы из Python совпадают с суммами, посчитанными в SQL (см. команду recompute_totals)
+def round_price(price):
+    return Decimal(repr(float(price))).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+# общая проверка поля items для модели, сериализаторов и форм.
+# За один проход по списку проверяет каждую позицию и считает общую стоимость заказа,
+# возвращает (items, total_price), при ошибке выбрасывает django ValidationError
+def validate_order_items(items):
+    # Проверяем, что items не пустое и является списком
+    if not items:
+        raise ValidationError('Заполните поле заказов.', code='empty')
+    if not isinstance(items, list):
+        raise ValidationError('Поле items должно быть списком.', code='invalid')
+
+    total_price = Decimal(0)
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValidationError('Каждый элемент items должен быть словарём.', code='invalid_item')
+
+        # Проверяем, что в словаре ровно два ключа
+        if len(item) != 2:
+            raise ValidationError('Каждый элемент items должен содержать ровно два ключа: "position" и "price".',
+                                  code='invalid_item')
+
+        # Проверяем наличие и тип ключей
+        position = item.get('position')
+        if not isinstance(position, str):
+            raise ValidationError('Каждый элемент items должен содержать ключ "position", '
+                                  'а значение должно быть в строковом представлении.', code='invalid_position')
+        price = item.get('price')
+        if not isinstance(price, (int, float)):
+            raise ValidationError('Каждый элемент items должен содержать ключ "price", '
+                                  'а значение должно быть в числовом представлении.', code='invalid_price')
+
+        # Общая стоимость считается в том же проходе, каждая цена округляется до копеек
+        total_price += round_price(price)
+
+    return items, float(total_price)
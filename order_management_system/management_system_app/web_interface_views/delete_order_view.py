@@ -1,8 +1,7 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.views import View
 
 from ..forms import DeleteOrderForm
-from ..models import Order
 
 class DeleteOrder(View):
     def get(self, request):
@@ -15,9 +14,7 @@ class DeleteOrder(View):
     def post(self, request):
         form = DeleteOrderForm(request.POST)
         if form.is_valid():
-            order_id = form.cleaned_data['order_id']  # Получаем ID заказа
-            order = get_object_or_404(Order, id=order_id)  # Находим заказ
-            order.delete()  # Удаляем заказ
+            form.order.delete()  # Удаляем заказ, найденный формой при проверке ID
             return redirect('delete_order')
         return render(request, 'orders_crud_web_inter/delete_order.html',
                       {'header': 'Удаление заказа',
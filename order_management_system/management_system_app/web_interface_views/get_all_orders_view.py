@@ -1,13 +1,36 @@
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect
 from django.views import View
 
+from ..forms import OrderListFilterForm
 from ..models import Order
 
 
 class GetAllOrders(View):
+    # количество заказов на одной странице
+    paginate_by = 50
+
     def get(self, request):
-        orders = Order.objects.all()  # Получаем все заказы
+        form = OrderListFilterForm(request.GET or None)
+
+        orders = Order.objects.order_by('-id')  # Получаем заказы, новые сверху
+        # Фильтруем по статусу и номеру стола, если они переданы
+        if form.is_bound and form.is_valid():
+            if form.cleaned_data['status']:
+                orders = orders.filter(status=form.cleaned_data['status'])
+            if form.cleaned_data['table_number']:
+                orders = orders.filter(table_number=form.cleaned_data['table_number'])
+
+        # Отображаем только одну страницу заказов
+        page = Paginator(orders, self.paginate_by).get_page(request.GET.get('page'))
+
+        # Параметры фильтра сохраняются в ссылках на другие страницы
+        filter_params = request.GET.copy()
+        filter_params.pop('page', None)
+
         return render(request, 'orders_crud_web_inter/get_all_orders.html',
                       {'header': 'Отображение всех заказов',
                        'title': 'Order Management System',
-                       'orders': orders})
\ No newline at end of file
+                       'form': form,
+                       'orders': page,
+                       'filter_query': filter_params.urlencode()})
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404
 from django.views import View
 
 from ..forms import UpdateOrderItemsForm
@@ -7,8 +8,10 @@ from ..models import Order
 
 class UpdateOrderItems(View):
     def get(self, request, pk):
-        # Получаем заказ по ID или возвращаем 404, если заказ не найден
-        order = get_object_or_404(Order, id=pk)
+        # Получаем заказ по ID через кэш заказов или возвращаем 404, если заказ не найден
+        order = Order.get_cached(pk)
+        if order is None:
+            raise Http404
 
         # Передаем заказ в форму для предзаполнения данных
         form = UpdateOrderItemsForm(instance=order)
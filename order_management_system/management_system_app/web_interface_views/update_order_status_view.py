@@ -1,8 +1,8 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.views import View
 
 from ..forms import UpdateOrderStatusForm
-from ..models import Order
+from ..models import Order, status_update_values
 
 
 class UpdateOrderStatus(View):
@@ -19,11 +19,11 @@ class UpdateOrderStatus(View):
             order_id = form.cleaned_data['order_id']  # Получаем ID заказа
             status = form.cleaned_data['status']  # Получаем новый статус
 
-            # Находим заказ и обновляем его статус
-            order = get_object_or_404(Order, id=order_id)
-            if order.status != status:
-                Order.objects.filter(id=order_id).update(status=status)
-            return redirect('update_order_status')
+            # Статус меняется одним запросом UPDATE без предварительного SELECT,
+            # версия заказа увеличивается, только если статус действительно изменился
+            if Order.objects.filter(id=order_id).update(**status_update_values(status)):
+                return redirect('update_order_status')
+            form.add_error('order_id', f'Заказ с ID {order_id} не найден.')
         return render(request, 'orders_crud_web_inter/update_order_status.html',
                       {'header': 'Изменение статуса заказа',
                        'title': 'Order Management System',
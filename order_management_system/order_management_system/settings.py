@@ -29,7 +29,7 @@ SECRET_KEY = env('SECRET_KEY')
 
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env('DEBUG', default=False)
+DEBUG = env.bool('DEBUG', default=False)
 
 ALLOWED_HOSTS = []
 
@@ -52,7 +52,25 @@ INSTALLED_APPS = [
 # django-crispy-forms
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
+# Django REST framework: кроме JSON, API принимает и отдает MessagePack
+# (Content-Type / Accept: application/msgpack), см. management_system_app/renderers.py и parsers.py
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'management_system_app.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'management_system_app.parsers.MessagePackParser',
+    ],
+}
+
 MIDDLEWARE = [
+    # первым, чтобы общее время запроса включало все остальные middleware
+    'management_system_app.server_timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,8 +78,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'management_system_app.query_budgets.QueryBudgetMiddleware',
 ]
 
+# проверка бюджетов SQL-запросов эндпоинтов (management_system_app/query_budgets.py):
+# log - предупреждение в лог, raise - исключение, пустое значение - проверка выключена.
+# По умолчанию включена в режиме отладки
+QUERY_BUDGETS_MODE = env('QUERY_BUDGETS_MODE', default='log' if DEBUG else '')
+
+# доля запросов (от 0 до 1), для которых замеряются фазы обработки: заголовок Server-Timing
+# и строка лога management_system_app.server_timing (management_system_app/server_timing.py)
+SERVER_TIMING_SAMPLE_RATE = env.float('SERVER_TIMING_SAMPLE_RATE', default=1.0 if DEBUG else 0.01)
+
 ROOT_URLCONF = 'order_management_system.urls'
 
 TEMPLATES = [
@@ -99,6 +127,24 @@ DATABASES = {
     }
 }
 
+# кэш задается строкой CACHE_URL, например locmemcache:// (по умолчанию), filecache:///var/tmp/oms_cache
+# или redis://127.0.0.1:6379/1
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# кэш заказов для получения одного заказа (management_system_app/order_cache.py):
+# алиас кэша из CACHES и время жизни записи в секундах
+ORDER_CACHE_ALIAS = env('ORDER_CACHE_ALIAS', default='default')
+ORDER_CACHE_TIMEOUT = env('ORDER_CACHE_TIMEOUT', default=300, cast=int)
+
+# интервал опроса журнала изменений заказов для потока событий api/v1/orders/events/ в секундах
+# (management_system_app/events.py), 0 - опрос выключен
+ORDER_EVENTS_POLL_INTERVAL = env.float('ORDER_EVENTS_POLL_INTERVAL', default=1.0)
+
+# сколько секунд хранится ответ на запрос с заголовком Idempotency-Key (management_system_app/idempotency.py)
+IDEMPOTENCY_KEY_TTL = env('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators